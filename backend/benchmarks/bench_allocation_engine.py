@@ -0,0 +1,110 @@
+"""
+Benchmark for the vectorized concurrency allocation engine.
+
+Times the NumPy core (allocation_engine.allocate) on its own and the full
+ConcurrencyAllocator._compute_allocations path (array build + result entries)
+for growing numbers of simulated clients. No DB or SSH required.
+Run with: python benchmarks/bench_allocation_engine.py [--sizes 100 1000 10000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ConcurrencyAllocationSettings, PartnerConfig, SSHConfig
+from services.allocation_engine import allocate
+from services.concurrency_allocator import ConcurrencyAllocator
+
+
+def _simulate_fleet(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    priorities = rng.integers(1, 5, n)
+    max_concurrency = rng.integers(5, 200, n)
+    active = rng.integers(0, 20, n)
+    queued = rng.integers(0, 10, n)
+    remaining = np.where(rng.random(n) < 0.8, rng.integers(1, 10_000, n), 0)
+
+    partners = [
+        PartnerConfig(
+            id=f"c{i}",
+            partnerName=f"Client{i}",
+            dbHost="localhost",
+            dbName="sim",
+            dbUsername="sim",
+            dbPassword="sim",
+            sshConfig=SSHConfig(enabled=False),
+            priority=int(priorities[i]),
+            maxConcurrency=int(max_concurrency[i]),
+        )
+        for i in range(n)
+    ]
+    snapshots = {
+        f"c{i}": {
+            "activeCalls": int(active[i]),
+            "queuedCalls": int(queued[i]),
+            "remainingCalls": int(remaining[i]),
+        }
+        for i in range(n)
+    }
+    return partners, snapshots
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    allocator = ConcurrencyAllocator(MagicMock(), MagicMock())
+    weights = np.array([40.0, 30.0, 20.0, 10.0])
+
+    print(f"{'clients':>8}  {'engine ms':>10}  {'_compute_allocations ms':>24}")
+    for n in args.sizes:
+        partners, snapshots = _simulate_fleet(n, seed=n)
+        settings = ConcurrencyAllocationSettings(globalMaxConcurrency=max(200, n * 30))
+        available = settings.globalMaxConcurrency - sum(
+            s["activeCalls"] + s["queuedCalls"] for s in snapshots.values()
+        )
+
+        demand = sorted(
+            (p for p in partners if allocator._has_demand(snapshots[p.id])),
+            key=lambda p: p.priority,
+        )
+        priorities = np.array([p.priority for p in demand])
+        max_conc = np.array([p.maxConcurrency for p in demand])
+        in_flight = np.array(
+            [snapshots[p.id]["activeCalls"] + snapshots[p.id]["queuedCalls"] for p in demand]
+        )
+        remaining = np.array([snapshots[p.id]["remainingCalls"] for p in demand])
+
+        engine_ms = _time(
+            lambda: allocate(
+                priorities, max_conc, in_flight, remaining, weights, available,
+                settings.minConcurrencyPerClient,
+            ),
+            args.repeat,
+        )
+        full_ms = _time(
+            lambda: allocator._compute_allocations(partners, snapshots, settings, available),
+            args.repeat,
+        )
+        print(f"{n:>8}  {engine_ms:>10.2f}  {full_ms:>24.2f}")
+
+
+if __name__ == "__main__":
+    main()
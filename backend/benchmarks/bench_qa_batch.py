@@ -0,0 +1,112 @@
+"""
+Offline throughput benchmark for the QA job queue.
+
+Runs a job of synthetic calls (transcript already present, so no
+transcription requests) through QAJobQueue against the local fake OpenRouter
+endpoint at several LLM concurrency and scoring batch sizes. Job state lives
+in InMemoryDB; partner DB saves and the summary email are mocked out.
+Run with: python benchmarks/bench_qa_batch.py [--calls 200] [--latency 0.5] [--concurrency 1 4 8 16] [--scoring-batch 1 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openrouter import start_fake_openrouter
+
+
+def _calls(n: int):
+    return [
+        {
+            "id": i,
+            "tenantId": 1,
+            "duration": 120 + i % 300,
+            "endReason": "customer-ended-call",
+            "summary": "Candidate confirmed interest and availability.",
+            "transcript": "Agent: Hello. Candidate: Hi, I'm interested in the role. " * 20,
+        }
+        for i in range(n)
+    ]
+
+
+async def _run(service_cls, partner, calls, concurrency, rpm, scoring_batch):
+    from services.in_memory_db import InMemoryDB
+    from services.llm_rate_limiter import LLMRateLimiter
+    from services.qa_job_queue import QAJobQueue
+
+    ssh = MagicMock()
+    ssh.execute_batch_updates = AsyncMock()
+    ssh.execute_batch_queries = AsyncMock(return_value=[[]])
+    email = MagicMock()
+    email.send_qa_report_email = AsyncMock()
+    db = InMemoryDB()
+    await db.partner_configs.insert_one(partner.model_dump(mode="json"))
+    service = service_cls(
+        db, ssh, email,
+        llm_concurrency=concurrency, limiter=LLMRateLimiter(requests_per_minute=rpm),
+        scoring_batch_size=scoring_batch,
+    )
+    service._get_qa_report_recipients = AsyncMock(return_value=None)
+    queue = QAJobQueue(db, service, workers=concurrency * scoring_batch)
+
+    t0 = time.perf_counter()
+    await queue.start()
+    try:
+        job = await queue.enqueue(partner, [c["id"] for c in calls], calls_data=calls)
+        while True:
+            progress = await queue.get_progress(job.id)
+            if progress["status"] == "completed":
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await queue.stop()
+    elapsed = time.perf_counter() - t0
+    return elapsed, progress["completed"], ssh.execute_batch_updates.await_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QA job queue throughput benchmark")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM seconds per request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--rpm", type=int, default=0, help="requests-per-minute limit (0 = off)")
+    parser.add_argument("--scoring-batch", type=int, nargs="+", default=[1, 5], help="calls per scoring request")
+    args = parser.parse_args()
+
+    server, base_url, stats = start_fake_openrouter(args.latency)
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "fake")
+
+    # Import after the base URL points at the stand-in
+    from models import PartnerConfig, SSHConfig
+    from services.qa_analysis_service import QAAnalysisService
+
+    partner = PartnerConfig(
+        id="bench", partnerName="Bench", dbHost="localhost", dbName="bench",
+        dbUsername="bench", dbPassword="bench", sshConfig=SSHConfig(enabled=False),
+    )
+    calls = _calls(args.calls)
+
+    print(f"{'workers':>8} {'batch':>6} {'seconds':>9} {'calls/s':>9} {'scored':>7} "
+          f"{'saves':>6} {'reqs':>5} {'peak':>5}")
+    try:
+        for scoring_batch in args.scoring_batch:
+            for concurrency in args.concurrency:
+                stats["peak_in_flight"] = 0
+                requests_before = stats["requests"]
+                elapsed, scored, saves = asyncio.run(
+                    _run(QAAnalysisService, partner, calls, concurrency, args.rpm, scoring_batch)
+                )
+                print(f"{concurrency:>8} {scoring_batch:>6} {elapsed:>9.2f} {scored / elapsed:>9.1f} "
+                      f"{scored:>7} {saves:>6} {stats['requests'] - requests_before:>5} "
+                      f"{stats['peak_in_flight']:>5}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
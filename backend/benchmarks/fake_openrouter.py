@@ -0,0 +1,104 @@
+"""
+Local stand-in for the OpenRouter chat completions endpoint.
+
+Answers POST .../chat/completions with an OpenAI-shaped response after a
+fixed latency: a canned transcript for audio requests, QA score JSON for
+everything else, keyed by call id when the prompt scores several calls.
+Uses only the standard library, so QA throughput can be benchmarked
+offline:
+
+    python benchmarks/fake_openrouter.py --port 8089 --latency 1.5
+    OPENROUTER_BASE_URL=http://127.0.0.1:8089/api/v1 ...
+
+or started in-process with start_fake_openrouter().
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+FAKE_TRANSCRIPT = (
+    "Agent: Hi, this is Ava calling about the warehouse associate role. "
+    "Candidate: Hi, yes, I applied last week. Agent: Great, do you have a minute?"
+)
+FAKE_SCORES = {
+    "voiceQuality": 8,
+    "latency": 7,
+    "conversationQuality": 8,
+    "notes": "Clear audio, brief pause before the second question.",
+}
+
+
+def _make_handler(latency: float, stats: dict):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            content = (body.get("messages") or [{}])[-1].get("content")
+            is_audio = isinstance(content, list)
+
+            with stats["lock"]:
+                stats["requests"] += 1
+                stats["in_flight"] += 1
+                stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+            try:
+                time.sleep(latency)
+            finally:
+                with stats["lock"]:
+                    stats["in_flight"] -= 1
+
+            if is_audio:
+                text = FAKE_TRANSCRIPT
+            else:
+                call_keys = re.findall(r"^### Call (\S+)$", content or "", re.MULTILINE)
+                text = json.dumps({key: FAKE_SCORES for key in call_keys} if call_keys else FAKE_SCORES)
+            payload = json.dumps({
+                "id": f"fake-{stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": text},
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_openrouter(latency: float = 1.0, port: int = 0) -> Tuple[ThreadingHTTPServer, str, dict]:
+    """Start the stand-in on a background thread. Returns (server, base_url, stats)."""
+    stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(latency, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v1", stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenRouter chat completions endpoint")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per completion")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_fake_openrouter(args.latency, args.port)
+    print(f"Fake OpenRouter listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
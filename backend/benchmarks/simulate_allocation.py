@@ -0,0 +1,75 @@
+"""
+Replay or simulate concurrency allocation offline and report policy metrics.
+
+Synthetic fleet (no external services):
+    python benchmarks/simulate_allocation.py --clients 10000 --ticks 30
+Replay stored allocation_runs + dashboard_snapshots (read-only):
+    python benchmarks/simulate_allocation.py --mongo-url mongodb://... --db-name recruitment_admin --hours 24
+
+Prints utilization, starvation per tier, limit churn and allocator runtime.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ConcurrencyAllocationSettings
+from services.allocation_simulator import load_recorded_trace, simulate, synthetic_trace
+
+
+async def _load_trace(args, settings):
+    if not args.mongo_url:
+        return synthetic_trace(args.clients, args.ticks, settings.globalMaxConcurrency, args.seed)
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        until = datetime.now(timezone.utc)
+        return await load_recorded_trace(client[args.db_name], until - timedelta(hours=args.hours), until)
+    finally:
+        client.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline concurrency allocation simulator")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--global-max", type=int, default=None,
+                        help="globalMaxConcurrency (default: 20 x clients for synthetic runs)")
+    parser.add_argument("--mongo-url", default=None, help="replay stored runs from this MongoDB")
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "recruitment_admin"))
+    parser.add_argument("--hours", type=float, default=24, help="replay window ending now")
+    parser.add_argument("--predictive", action="store_true", help="enable predictiveAllocation")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    settings = ConcurrencyAllocationSettings(
+        globalMaxConcurrency=args.global_max or max(200, args.clients * 20),
+        predictiveAllocation=args.predictive,
+    )
+    trace = await _load_trace(args, settings)
+    report = await simulate(trace, settings)
+
+    if args.json:
+        print(json.dumps(report.model_dump(), indent=2))
+        return
+
+    print(f"clients={report.clients} ticks={report.ticks} globalMax={report.globalMax}")
+    print(f"utilization        {report.utilization:.2%}")
+    print("starvation         " + "  ".join(f"{t}={v:.2%}" for t, v in report.starvation.items()))
+    print(f"limit changes      {report.limitChanges} ({report.limitChangesPerTick}/tick, "
+          f"total delta {report.totalLimitDelta})")
+    print(f"peak limit sum     {report.peakLimitSum}")
+    print(f"cycle ms           {report.cycleMs}")
+    print(f"compute ms         {report.computeMs}")
+    print(f"status             {report.statusCounts}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
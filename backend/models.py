@@ -163,6 +163,7 @@ class DashboardSnapshot(BaseModel):
     utilizationPercent: float = 0.0
     alertLevel: AlertLevel = AlertLevel.NORMAL
     alertMessage: Optional[str] = None
+    alertRule: Optional[str] = None  # id of the rule in services.alert_rules that set alertLevel
     snapshotTime: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     snapshotTimeEST: Optional[datetime] = None
     dataFetchTimeMs: int = 0
@@ -185,6 +186,7 @@ class AlertLog(BaseModel):
     partnerId: str
     alertLevel: AlertLevel
     alertMessage: str
+    alertRule: Optional[str] = None
     isDismissed: bool = False
     dismissedBy: Optional[str] = None
     dismissedAt: Optional[datetime] = None
@@ -254,12 +256,28 @@ class ConcurrencyAllocationSettings(BaseModel):
     tierWeights: TierWeights = Field(default_factory=TierWeights)
     minConcurrencyPerClient: int = Field(default=2, ge=1)
     allocationIntervalSeconds: int = Field(default=60, ge=10)
+    predictiveAllocation: bool = False  # allocate against forecast next-interval demand
+    forecastWindow: int = Field(default=10, ge=2, le=60)  # snapshots per partner used by the forecast
+    forecastAlpha: float = Field(default=0.5, gt=0, le=1)  # EWMA smoothing factor
+    incrementalAllocation: bool = False  # re-balance a partner's tier as soon as its snapshot lands
+    incrementalDemandThreshold: int = Field(default=10, ge=1)  # in-flight change that triggers it
+    minLimitDelta: int = Field(default=0, ge=0)  # skip limit changes smaller than this (0 = off)
+    limitCooldownSeconds: int = Field(default=0, ge=0)  # min time between changes per partner (0 = off)
+    maxLimitStep: int = Field(default=0, ge=0)  # max change per partner per run (0 = off)
 
 class ConcurrencyAllocationSettingsUpdate(BaseModel):
     globalMaxConcurrency: Optional[int] = Field(default=None, ge=1)
     tierWeights: Optional[TierWeights] = None
     minConcurrencyPerClient: Optional[int] = Field(default=None, ge=1)
     allocationIntervalSeconds: Optional[int] = Field(default=None, ge=10)
+    predictiveAllocation: Optional[bool] = None
+    forecastWindow: Optional[int] = Field(default=None, ge=2, le=60)
+    forecastAlpha: Optional[float] = Field(default=None, gt=0, le=1)
+    incrementalAllocation: Optional[bool] = None
+    incrementalDemandThreshold: Optional[int] = Field(default=None, ge=1)
+    minLimitDelta: Optional[int] = Field(default=None, ge=0)
+    limitCooldownSeconds: Optional[int] = Field(default=None, ge=0)
+    maxLimitStep: Optional[int] = Field(default=None, ge=0)
 
 # Allocation Run Audit Log
 class AllocationRunEntry(BaseModel):
@@ -272,6 +290,8 @@ class AllocationRunEntry(BaseModel):
     newLimit: int
     remainingContacts: int
     activeCalls: int
+    forecastDemand: Optional[float] = None
+    targetLimit: Optional[int] = None  # computed limit when damping wrote a different one
     syncedToPartner: bool = False
     syncError: Optional[str] = None
 
@@ -282,8 +302,9 @@ class AllocationRun(BaseModel):
     globalMax: int
     totalInFlight: int
     availableSlots: int
-    status: str  # "normal" | "saturated" | "no_active_clients"
+    status: str  # "normal" | "saturated" | "no_active_clients" | "incremental"
     allocations: List[AllocationRunEntry] = []
+    phaseMs: Dict[str, float] = {}  # wall time per cycle phase (loadSettings, ..., write)
 
 # Campaign Models
 class Campaign(BaseModel):
@@ -343,6 +364,10 @@ class QACallResponse(BaseModel):
     vmBeepAt: Optional[str] = None
     qaAnalysis: Optional[QAAnalysisData] = None
 
+class QACallPage(BaseModel):
+    calls: List[QACallResponse]
+    nextCursor: Optional[str] = None  # pass back as `cursor`; None on the last page
+
 class QAReviewRequest(BaseModel):
     humanVoiceQuality: int = Field(ge=1, le=10)
     humanLatency: int = Field(ge=1, le=10)
@@ -368,6 +393,24 @@ class QAAnalyzeRequest(BaseModel):
     callIds: Optional[List[int]] = None
     maxAnalyze: Optional[int] = None
     date: Optional[str] = None
+    force: bool = False  # re-analyze calls that already have AI scores
+
+class QAJob(BaseModel):
+    """One QA analysis submission; per-call state lives in qa_job_calls."""
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    partnerId: str
+    partnerName: str
+    reportDate: Optional[str] = None
+    legacy: bool = False  # calls fetched from the partner DB by ID
+    status: str = "queued"  # "queued" | "completed"
+    total: int = 0  # calls queued by this job
+    skipped: int = 0  # calls already queued/running under another job
+    alreadyScored: int = 0  # calls skipped because they already have AI scores
+    completed: int = 0
+    failed: int = 0
+    createdAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finishedAt: Optional[datetime] = None
 
 class QAEmailReportCall(BaseModel):
     id: int
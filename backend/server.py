@@ -24,9 +24,12 @@ from services.concurrency import ConcurrencyService
 from services.concurrency_allocator import ConcurrencyAllocator
 from services.alert import AlertService
 from services.email_service import EmailService
+from services.email_outbox import EmailOutbox
 from services.qa_service import QAService
 from services.qa_analysis_service import QAAnalysisService
+from services.qa_job_queue import QAJobQueue
 from services.s3_service import S3Service
+from services.qa_report import report_s3_config
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -97,11 +100,16 @@ ssh_service = SSHConnectionService(db, encryption_service)
 concurrency_service = ConcurrencyService(db, ssh_service)
 concurrency_allocator = ConcurrencyAllocator(db, ssh_service)
 email_service = EmailService()
+email_outbox = EmailOutbox(db, email_service)
+email_service.outbox = email_outbox
 alert_service = AlertService(db, email_service)
 data_fetch_service = DataFetchService(db, ssh_service, alert_service, allocator=concurrency_allocator)
 qa_service = QAService(ssh_service)
 qa_analysis_service = QAAnalysisService(db, ssh_service, email_service)
+qa_job_queue = QAJobQueue(db, qa_analysis_service)
 s3_service = S3Service(encryption_service)
+email_service.s3_service = s3_service
+email_service.report_s3_config = report_s3_config()
 
 # Configure logging
 logging.basicConfig(
@@ -529,6 +537,8 @@ async def update_partner(partner_id: str, partner_update: PartnerConfigUpdate, c
     update_dict['updatedAt'] = datetime.now(timezone.utc).isoformat()
     
     await db.partner_configs.update_one({"id": partner_id}, {"$set": update_dict})
+    # Replaced credentials must not linger decrypted in memory
+    encryption_service.forget_partner(partner_data)
     
     updated_partner = await db.partner_configs.find_one({"id": partner_id}, {"_id": 0})
     return PartnerConfigSafe(**updated_partner)
@@ -549,9 +559,10 @@ async def update_partner(partner_id: str, partner_update: PartnerConfigUpdate, c
     """
 )
 async def delete_partner(partner_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.partner_configs.delete_one({"id": partner_id})
-    if result.deleted_count == 0:
+    partner_data = await db.partner_configs.find_one_and_delete({"id": partner_id}, projection={"_id": 0})
+    if not partner_data:
         raise HTTPException(status_code=404, detail="Partner not found")
+    encryption_service.forget_partner(partner_data)
     return {"message": "Partner deleted successfully"}
 
 @api_router.post(
@@ -698,6 +709,7 @@ async def force_sync(partner_id: str, current_user: User = Depends(get_current_u
     
     partner = PartnerConfig(**partner_data)
     await data_fetch_service.fetch_partner_data(partner)
+    await alert_service.flush_digest()
     return {"message": "Sync initiated successfully"}
 
 # ============= Dashboard Routes =============
@@ -878,6 +890,57 @@ async def trigger_allocation_now(current_user: User = Depends(get_current_user))
     }
 
 
+@api_router.post(
+    "/concurrency/allocate-dry-run",
+    tags=["Concurrency Management"],
+    summary="Preview a concurrency allocation cycle without writing",
+    description="""
+    Run the allocation against current snapshots and settings without side
+    effects: no partner limits, concurrency history or allocation run are written.
+    Send a full ConcurrencyAllocationSettings body to preview candidate settings
+    instead of the saved ones (nothing is persisted).
+
+    Returns the proposed allocation entries, the changes against current
+    limits, and wall time per phase (loadSettings, loadPartners, loadSnapshots,
+    forecast when predictive allocation is on, compute, write). `write` is
+    ~0 in a dry run; `changes` is what a real cycle would write.
+    """,
+)
+async def trigger_allocation_dry_run(
+    settings: Optional[ConcurrencyAllocationSettings] = None,
+    current_user: User = Depends(get_current_user),
+):
+    if settings is not None:
+        total = sum(settings.tierWeights.model_dump().values())
+        if total != 100:
+            raise HTTPException(
+                status_code=400,
+                detail=f"tierWeights must sum to 100, got {total}"
+            )
+    run = await concurrency_allocator.run_allocation_cycle(dry_run=True, settings=settings)
+    changes = [
+        {
+            "partnerId": e.partnerId,
+            "partnerName": e.partnerName,
+            "oldLimit": e.oldLimit,
+            "newLimit": e.newLimit,
+            "delta": e.newLimit - e.oldLimit,
+        }
+        for e in run.allocations
+        if e.newLimit != e.oldLimit
+    ]
+    return {
+        "status": run.status,
+        "globalMax": run.globalMax,
+        "availableSlots": run.availableSlots,
+        "totalInFlight": run.totalInFlight,
+        "allocations": [e.model_dump() for e in run.allocations],
+        "changes": changes,
+        "phaseMs": run.phaseMs,
+        "totalMs": round(sum(run.phaseMs.values()), 3),
+    }
+
+
 @api_router.get(
     "/concurrency/allocation-history",
     tags=["Concurrency Management"],
@@ -1186,6 +1249,22 @@ async def update_concurrency_allocation_settings(
         updated["minConcurrencyPerClient"] = update.minConcurrencyPerClient
     if update.allocationIntervalSeconds is not None:
         updated["allocationIntervalSeconds"] = update.allocationIntervalSeconds
+    if update.predictiveAllocation is not None:
+        updated["predictiveAllocation"] = update.predictiveAllocation
+    if update.forecastWindow is not None:
+        updated["forecastWindow"] = update.forecastWindow
+    if update.forecastAlpha is not None:
+        updated["forecastAlpha"] = update.forecastAlpha
+    if update.incrementalAllocation is not None:
+        updated["incrementalAllocation"] = update.incrementalAllocation
+    if update.incrementalDemandThreshold is not None:
+        updated["incrementalDemandThreshold"] = update.incrementalDemandThreshold
+    if update.minLimitDelta is not None:
+        updated["minLimitDelta"] = update.minLimitDelta
+    if update.limitCooldownSeconds is not None:
+        updated["limitCooldownSeconds"] = update.limitCooldownSeconds
+    if update.maxLimitStep is not None:
+        updated["maxLimitStep"] = update.maxLimitStep
 
     new_settings = ConcurrencyAllocationSettings(**updated)
     await concurrency_allocator.save_settings(new_settings)
@@ -1303,6 +1382,7 @@ async def dismiss_alert(alert_id: str, hours: int = 24, current_user: User = Dep
             "dismissedUntil": (datetime.now(timezone.utc) + timedelta(hours=hours)).isoformat()
         }}
     )
+    alert_service.alert_dismissed(alert_id)
     return {"message": "Alert dismissed"}
 
 # ============= Settings Routes =============
@@ -1875,8 +1955,49 @@ async def get_qa_calls(
     partner = PartnerConfig(**partner_data)
 
     try:
-        calls = await qa_service.get_qa_calls(partner, date, minMinutes)
-        return calls
+        page = await qa_service.get_qa_calls(partner, date, minMinutes)
+        return page.calls
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching QA calls for partner {partner.partnerName}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching QA calls: {str(e)}")
+
+@api_router.get(
+    "/partners/{partner_id}/qa/calls-page",
+    response_model=QACallPage,
+    tags=["QA"],
+    summary="Get one page of QA calls for a partner",
+    description="Keyset-paginated QA calls for a date, newest first. Pass `nextCursor` back as `cursor` "
+                "for the next page. `view=list` omits transcripts (fetch a single call for its transcript). "
+                "`maxScore` keeps calls where any AI or human score is at or below the value."
+)
+async def get_qa_calls_page(
+    partner_id: str,
+    date: str,
+    minMinutes: int = 2,
+    maxMinutes: Optional[int] = None,
+    maxScore: Optional[int] = Query(None, ge=0, le=10),
+    campaignId: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    view: str = Query("list", pattern="^(list|full)$"),
+    current_user: User = Depends(get_current_user)
+):
+    partner_data = await db.partner_configs.find_one({"id": partner_id}, {"_id": 0})
+    if not partner_data:
+        raise HTTPException(status_code=404, detail="Partner not found")
+
+    partner = PartnerConfig(**partner_data)
+
+    try:
+        return await qa_service.get_qa_calls(
+            partner, date, minMinutes,
+            max_minutes=maxMinutes, max_score=maxScore, campaign_id=campaignId,
+            limit=limit, cursor=cursor, include_transcript=view == "full",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching QA calls for partner {partner.partnerName}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching QA calls: {str(e)}")
@@ -1944,7 +2065,10 @@ async def review_qa_call(
     "/partners/{partner_id}/qa/analyze",
     tags=["QA"],
     summary="Run AI analysis on calls",
-    description="Queue calls for AI-powered QA analysis. Runs in background and returns immediately."
+    description="Queue calls for AI-powered QA analysis. Runs in background and returns immediately. "
+                "Calls already queued or running for this partner are skipped, as are calls "
+                "that already have AI scores unless `force` is true. "
+                "Track progress with GET /partners/{partner_id}/qa/jobs/{job_id}."
 )
 async def analyze_qa_calls(
     partner_id: str,
@@ -1963,39 +2087,45 @@ async def analyze_qa_calls(
         if request.maxAnalyze and request.maxAnalyze > 0:
             calls_data = calls_data[:request.maxAnalyze]
         call_ids = [c["id"] for c in calls_data]
-        use_legacy = False
     elif request.callIds:
-        # Legacy path: frontend sent only call IDs — fall back to SSH fetch per call
+        # Legacy path: frontend sent only call IDs — fetched from the partner DB per call
         call_ids = request.callIds
         if request.maxAnalyze and request.maxAnalyze > 0:
             call_ids = call_ids[:request.maxAnalyze]
         calls_data = None
-        use_legacy = True
     else:
         return {"message": "No calls to analyze", "total": 0}
 
     if not call_ids:
         return {"message": "No calls to analyze", "total": 0}
 
-    # Run analysis as background task
-    report_date = request.date
-    async def _run_analysis():
-        try:
-            if use_legacy:
-                await qa_analysis_service.batch_analyze_legacy(partner, call_ids, partner.partnerName, report_date)
-            else:
-                await qa_analysis_service.batch_analyze(partner, calls_data, partner.partnerName, report_date)
-        except Exception as e:
-            logger.error(f"Background QA analysis failed: {str(e)}")
-
-    asyncio.create_task(_run_analysis())
+    job = await qa_job_queue.enqueue(partner, call_ids, request.date, calls_data, request.force)
 
     return {
-        "message": f"QA analysis started for {len(call_ids)} calls",
-        "total": len(call_ids),
+        "message": f"QA analysis queued for {job.total} calls",
+        "jobId": job.id,
+        "total": job.total,
+        "skipped": job.skipped,
+        "alreadyScored": job.alreadyScored,
         "callIds": call_ids,
     }
 
+@api_router.get(
+    "/partners/{partner_id}/qa/jobs/{job_id}",
+    tags=["QA"],
+    summary="QA analysis job progress",
+    description="Per-state call counts, percent done, throughput and ETA for a queued QA analysis job."
+)
+async def get_qa_job_progress(
+    partner_id: str,
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    progress = await qa_job_queue.get_progress(job_id)
+    if not progress or progress["partnerId"] != partner_id:
+        raise HTTPException(status_code=404, detail="QA job not found")
+    return progress
+
 @api_router.get(
     "/partners/{partner_id}/qa/presigned-url",
     tags=["QA"],
@@ -2017,7 +2147,7 @@ async def get_presigned_url(
     if not s3_config or not s3_config.get("enabled"):
         raise HTTPException(status_code=400, detail="S3 not configured for this partner")
 
-    result = s3_service.get_playable_url(s3_config, url)
+    result = await s3_service.get_playable_url(s3_config, url)
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
 
@@ -2073,7 +2203,7 @@ async def email_qa_report(
         total = time.time() - t_start
         if success:
             logger.info(f"[QA-EMAIL] ====== API /qa/email-report DONE in {total:.3f}s ======")
-            return {"message": f"QA report sent for {len(request.calls)} calls", "success": True}
+            return {"message": f"QA report queued for {len(request.calls)} calls", "success": True}
         else:
             logger.error(f"[QA-EMAIL] ====== API /qa/email-report FAILED after {total:.3f}s ======")
             raise HTTPException(status_code=500, detail="Failed to send QA report email")
@@ -2426,6 +2556,7 @@ async def startup_event():
         {"settingKey": "highQueuedMin", "settingValue": 100, "description": "High priority queued min"},
         {"settingKey": "highQueuedMax", "settingValue": 200, "description": "High priority queued max"},
         {"settingKey": "publicApiAllowedDomains", "settingValue": "", "description": "Comma-separated list of allowed domains for public API CORS (e.g., https://example.com,https://another.com). Leave empty to allow all origins."},
+        {"settingKey": "alertRecipients", "settingValue": "admin@jobtalk.com", "description": "Comma-separated email addresses for critical alert digests"},
         {"settingKey": "qaReportRecipients", "settingValue": "bhavdipm@aptask.com", "description": "Comma-separated email addresses for QA analysis report recipients"},
     ]
     
@@ -2436,6 +2567,12 @@ async def startup_event():
             setting['updatedAt'] = datetime.now(timezone.utc).isoformat()
             await db.system_settings.insert_one(setting)
     
+    # Latest snapshot per partner (dashboard reads, stale-data check)
+    await db.dashboard_snapshots.create_index([("partnerId", 1), ("snapshotTime", -1)])
+
+    # LLM QA results are looked up by content hash
+    await db.qa_llm_cache.create_index("key", unique=True, name="qa_llm_cache_key")
+
     # Ensure TTL index on allocation_runs so logs auto-expire after 30 days
     await db.allocation_runs.create_index(
         "runAt",
@@ -2443,13 +2580,25 @@ async def startup_event():
         name="allocation_runs_ttl"
     )
 
+    # Alert email throttle and open-alert state are kept in memory; load them before the first sync
+    await alert_service.start()
+
     # Start data fetch scheduler with configurable interval
     settings = await concurrency_allocator._load_settings()
     interval = settings.allocationIntervalSeconds
     data_fetch_service.start_scheduler(interval_seconds=interval)
     logger.info(f"Data fetch scheduler started (interval={interval}s)")
 
+    # Deliver queued emails (QA summaries included) in the background
+    await email_outbox.start()
+
+    # Resume QA analysis left unfinished by a previous process
+    await qa_job_queue.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     data_fetch_service.stop_scheduler()
+    await qa_job_queue.stop()
+    await email_outbox.stop()
+    await qa_analysis_service.close()
     client.close()
@@ -1,27 +1,98 @@
 from datetime import datetime, timezone, timedelta
 import logging
+from typing import Any, Dict, List, Optional, Set
 from models import PartnerConfig, DashboardSnapshot, AlertLog, AlertLevel
 from services.email_service import EmailService
 
 logger = logging.getLogger(__name__)
 
+# At most one critical-alert email per partner per window
+EMAIL_THROTTLE = timedelta(hours=1)
+DEFAULT_ALERT_RECIPIENTS = ["admin@jobtalk.com"]
+# Open-alert cache is re-read from Mongo this often to pick up outside changes
+ALERT_STATE_RECONCILE_SECONDS = 300
+
 class AlertService:
     def __init__(self, db, email_service: EmailService):
         self.db = db
         self.email_service = email_service
+        # partnerId -> last critical email time, mirrored in alert_email_throttle
+        self._email_throttle: Dict[str, datetime] = {}
+        # Critical alerts waiting for the end-of-cycle digest
+        self._digest: List[Dict[str, Any]] = []
+        # partnerId -> {"id", "alertLevel"} of its open (unresolved, undismissed) alert
+        self._open_alerts: Dict[str, Dict[str, str]] = {}
+        self._state_loaded = False
+        # Partners whose state changed while a reload was in flight
+        self._touched: Optional[Set[str]] = None
+
+    async def start(self):
+        """Load the email throttle and open-alert state so the sync path never queries them."""
+        await self.db.alert_logs.create_index([("isResolved", 1), ("isDismissed", 1)])
+        await self.reconcile_alert_state()
+        await self.db.alert_email_throttle.create_index("partnerId", unique=True)
+        since = (datetime.now(timezone.utc) - EMAIL_THROTTLE).isoformat()
+        rows = await self.db.alert_email_throttle.find(
+            {"lastEmailSentAt": {"$gte": since}}, {"_id": 0}
+        ).to_list(None)
+        self._email_throttle = {
+            row["partnerId"]: datetime.fromisoformat(row["lastEmailSentAt"]) for row in rows
+        }
+        logger.info(f"Loaded alert email throttle for {len(self._email_throttle)} partners")
+
+    async def reconcile_alert_state(self):
+        """Rebuild the open-alert cache from alert_logs.
+
+        Run at startup and periodically, so alerts dismissed or edited outside
+        this service are eventually reflected.
+        """
+        self._touched = set()
+        try:
+            rows = await self.db.alert_logs.find(
+                {"isResolved": False, "isDismissed": False, "partnerId": {"$ne": "SYSTEM"}},
+                {"_id": 0, "id": 1, "partnerId": 1, "alertLevel": 1}
+            ).sort("createdAt", 1).to_list(None)
+            open_alerts = {
+                row["partnerId"]: {"id": row["id"], "alertLevel": row["alertLevel"]} for row in rows
+            }
+            # Transitions that happened during the read are newer than what it returned
+            for partner_id in self._touched:
+                if partner_id in self._open_alerts:
+                    open_alerts[partner_id] = self._open_alerts[partner_id]
+                else:
+                    open_alerts.pop(partner_id, None)
+            self._open_alerts = open_alerts
+            self._state_loaded = True
+        finally:
+            self._touched = None
+        logger.info(f"Alert state reconciled: {len(self._open_alerts)} open partner alerts")
+
+    def alert_dismissed(self, alert_id: str):
+        """Drop a dismissed alert from the cache so the next breach raises a new one."""
+        for partner_id, state in list(self._open_alerts.items()):
+            if state["id"] == alert_id:
+                self._set_open_alert(partner_id, None)
+
+    def _set_open_alert(self, partner_id: str, state: Optional[Dict[str, str]]):
+        if state is None:
+            self._open_alerts.pop(partner_id, None)
+        else:
+            self._open_alerts[partner_id] = state
+        if self._touched is not None:
+            self._touched.add(partner_id)
+
+    def _email_throttled(self, partner_id: str, now: datetime) -> bool:
+        last_sent = self._email_throttle.get(partner_id)
+        return last_sent is not None and now - last_sent < EMAIL_THROTTLE
     
     async def generate_alert(self, partner: PartnerConfig, snapshot: DashboardSnapshot):
         """Generate alert based on snapshot metrics"""
         try:
-            # Check if there's an existing active alert for this partner
-            existing_alert = await self.db.alert_logs.find_one(
-                {
-                    "partnerId": partner.id,
-                    "isResolved": False,
-                    "isDismissed": False
-                },
-                {"_id": 0}
-            )
+            if not self._state_loaded:
+                await self.reconcile_alert_state()
+
+            # Existing active alert for this partner (cached; no query on steady cycles)
+            existing_alert = self._open_alerts.get(partner.id)
             
             # If alert level is NORMAL or IDLE, resolve existing alerts
             if snapshot.alertLevel in [AlertLevel.NORMAL, AlertLevel.IDLE]:
@@ -33,6 +104,7 @@ class AlertService:
                             "resolvedAt": datetime.now(timezone.utc).isoformat()
                         }}
                     )
+                    self._set_open_alert(partner.id, None)
                     logger.info(f"Resolved alert for {partner.partnerName}")
                 return
             
@@ -47,53 +119,94 @@ class AlertService:
                             "resolvedAt": datetime.now(timezone.utc).isoformat()
                         }}
                     )
+                    self._set_open_alert(partner.id, None)
                 
                 # Create new alert
                 alert = AlertLog(
                     partnerId=partner.id,
                     alertLevel=snapshot.alertLevel,
-                    alertMessage=snapshot.alertMessage or "Alert triggered"
+                    alertMessage=snapshot.alertMessage or "Alert triggered",
+                    alertRule=snapshot.alertRule
                 )
                 
                 alert_dict = alert.model_dump()
                 alert_dict['createdAt'] = alert_dict['createdAt'].isoformat()
                 
                 await self.db.alert_logs.insert_one(alert_dict)
+                self._set_open_alert(partner.id, {"id": alert_dict['id'], "alertLevel": snapshot.alertLevel.value})
                 
                 logger.info(f"Created {snapshot.alertLevel.value} alert for {partner.partnerName}")
                 
-                # Send email for critical alerts
-                if snapshot.alertLevel == AlertLevel.CRITICAL:
-                    # Check if email was sent recently (within 1 hour)
-                    one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-                    recent_email = await self.db.alert_logs.find_one({
+                # Critical alerts are emailed in one digest at the end of the sync cycle
+                if snapshot.alertLevel == AlertLevel.CRITICAL and not self._email_throttled(
+                    partner.id, datetime.now(timezone.utc)
+                ):
+                    self._digest.append({
+                        "alertId": alert_dict['id'],
                         "partnerId": partner.id,
-                        "emailSent": True,
-                        "lastEmailSentAt": {"$gte": one_hour_ago.isoformat()}
+                        "partnerName": partner.partnerName,
+                        "alertLevel": snapshot.alertLevel.value,
+                        "message": snapshot.alertMessage or "Critical alert",
+                        "metrics": {
+                            "queuedCalls": snapshot.queuedCalls,
+                            "activeCalls": snapshot.activeCalls,
+                            "utilization": snapshot.utilizationPercent,
+                            "runningCampaigns": snapshot.runningCampaigns
+                        }
                     })
-                    
-                    if not recent_email:
-                        # Send email
-                        email_sent = await self.email_service.send_alert_email(
-                            partner.partnerName,
-                            snapshot.alertLevel.value,
-                            snapshot.alertMessage or "Critical alert",
-                            {
-                                "queuedCalls": snapshot.queuedCalls,
-                                "activeCalls": snapshot.activeCalls,
-                                "utilization": snapshot.utilizationPercent,
-                                "runningCampaigns": snapshot.runningCampaigns
-                            }
-                        )
-                        
-                        if email_sent:
-                            await self.db.alert_logs.update_one(
-                                {"id": alert_dict['id']},
-                                {"$set": {
-                                    "emailSent": True,
-                                    "lastEmailSentAt": datetime.now(timezone.utc).isoformat()
-                                }}
-                            )
         
         except Exception as e:
             logger.error(f"Error generating alert for {partner.partnerName}: {str(e)}")
+
+    async def _alert_recipients(self) -> List[str]:
+        setting = await self.db.system_settings.find_one({"settingKey": "alertRecipients"}, {"_id": 0})
+        if setting and setting.get("settingValue"):
+            recipients = [e.strip() for e in str(setting["settingValue"]).split(",") if e.strip()]
+            if recipients:
+                return recipients
+        return DEFAULT_ALERT_RECIPIENTS
+
+    async def flush_digest(self) -> Optional[int]:
+        """Send the critical alerts collected this cycle as one email.
+
+        Returns the number of partners included, or None when there was
+        nothing to send. Alerts stay queued for the next cycle if sending fails.
+        """
+        if not self._digest:
+            return None
+        pending, self._digest = self._digest, []
+        now = datetime.now(timezone.utc)
+
+        # One entry per partner (latest wins), skipping any emailed meanwhile
+        entries: Dict[str, Dict[str, Any]] = {}
+        for entry in pending:
+            if not self._email_throttled(entry["partnerId"], now):
+                entries[entry["partnerId"]] = entry
+        if not entries:
+            return None
+        alerts = list(entries.values())
+
+        try:
+            recipients = await self._alert_recipients()
+            email_sent = await self.email_service.send_alert_digest_email(alerts, recipients)
+        except Exception as e:
+            logger.error(f"Error sending alert digest: {str(e)}")
+            email_sent = False
+        if not email_sent:
+            self._digest = alerts + self._digest
+            return None
+
+        sent_at = now.isoformat()
+        for partner_id in entries:
+            self._email_throttle[partner_id] = now
+            await self.db.alert_email_throttle.update_one(
+                {"partnerId": partner_id},
+                {"$set": {"partnerId": partner_id, "lastEmailSentAt": sent_at}},
+                upsert=True
+            )
+        await self.db.alert_logs.update_many(
+            {"id": {"$in": [a["alertId"] for a in alerts]}},
+            {"$set": {"emailSent": True, "lastEmailSentAt": sent_at}}
+        )
+        logger.info(f"Sent critical alert digest for {len(alerts)} partners to {recipients}")
+        return len(alerts)
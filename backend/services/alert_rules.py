@@ -0,0 +1,217 @@
+"""
+Declarative partner alert rules.
+
+ALERT_RULES lists every rule as data: an id, a level, a message template and
+a conjunction of conditions. Condition operands are snapshot metrics, alert
+threshold settings from `system_settings`, or plain numbers. compile_rules()
+resolves the thresholds once and turns the table into NumPy arrays, so
+evaluating any number of partners is a handful of array comparisons. The first
+matching rule (in table order) wins, like the if-chain it replaces.
+"""
+import logging
+import operator
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from models import AlertLevel
+
+logger = logging.getLogger(__name__)
+
+# Columns of the metrics matrix, in order
+METRICS = ("queuedCalls", "activeCalls", "runningCampaigns", "concurrencyLimit", "utilization")
+
+# Settings seeded at startup; these values apply when a key is missing or invalid
+DEFAULT_THRESHOLDS = {
+    "criticalQueuedThreshold": 200,
+    "criticalUtilizationThreshold": 30,
+    "highQueuedMin": 100,
+    "highQueuedMax": 200,
+}
+
+_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+ALERT_RULES: List[Dict[str, Any]] = [
+    {
+        "id": "critical_queue_low_utilization",
+        "level": AlertLevel.CRITICAL,
+        "when": [("queuedCalls", ">", "criticalQueuedThreshold"),
+                 ("utilization", "<", "criticalUtilizationThreshold")],
+        "message": "High queue ({queuedCalls}) with low utilization ({utilization:.1f}%)",
+    },
+    {
+        "id": "critical_at_capacity",
+        "level": AlertLevel.CRITICAL,
+        "when": [("activeCalls", ">=", "concurrencyLimit"), ("queuedCalls", ">", 100)],
+        "message": "At max capacity with {queuedCalls} calls queued",
+    },
+    {
+        "id": "critical_campaigns_over_capacity",
+        "level": AlertLevel.CRITICAL,
+        "when": [("runningCampaigns", ">", 50), ("concurrencyLimit", "<", 10)],
+        "message": "{runningCampaigns} campaigns running with only {concurrencyLimit} concurrent slots",
+    },
+    {
+        "id": "high_growing_queue",
+        "level": AlertLevel.HIGH,
+        "when": [("queuedCalls", ">=", "highQueuedMin"), ("queuedCalls", "<=", "highQueuedMax"),
+                 ("utilization", "<", 40)],
+        "message": "Growing queue ({queuedCalls}) with low utilization ({utilization:.1f}%)",
+    },
+    {
+        "id": "high_campaigns_limited_concurrency",
+        "level": AlertLevel.HIGH,
+        "when": [("runningCampaigns", ">=", 30), ("runningCampaigns", "<=", 50), ("concurrencyLimit", "<", 15)],
+        "message": "{runningCampaigns} campaigns with limited concurrency ({concurrencyLimit})",
+    },
+    {
+        "id": "medium_moderate_queue",
+        "level": AlertLevel.MEDIUM,
+        "when": [("queuedCalls", ">=", 50), ("queuedCalls", "<=", 100),
+                 ("utilization", ">=", 40), ("utilization", "<=", 60)],
+        "message": "Moderate queue ({queuedCalls}) and utilization ({utilization:.1f}%)",
+    },
+    {
+        "id": "medium_campaigns_need_concurrency",
+        "level": AlertLevel.MEDIUM,
+        "when": [("runningCampaigns", ">=", 15), ("runningCampaigns", "<=", 30), ("concurrencyLimit", "<", 20)],
+        "message": "{runningCampaigns} campaigns, consider increasing concurrency",
+    },
+    {
+        "id": "idle",
+        "level": AlertLevel.IDLE,
+        "when": [("runningCampaigns", "==", 0), ("activeCalls", "==", 0), ("queuedCalls", "==", 0)],
+        "message": "No active campaigns",
+    },
+    {
+        "id": "normal_high_utilization",
+        "level": AlertLevel.NORMAL,
+        "when": [("utilization", ">", 60)],
+        "message": "Operating normally",
+    },
+    {
+        "id": "normal_short_queue",
+        "level": AlertLevel.NORMAL,
+        "when": [("queuedCalls", "<", 50)],
+        "message": "Operating normally",
+    },
+]
+
+# Applies when no rule matches
+FALLBACK_RULE = {"id": "normal", "level": AlertLevel.NORMAL, "message": "All metrics within normal range"}
+
+
+class AlertResult(NamedTuple):
+    level: AlertLevel
+    message: str
+    rule: str
+
+
+def parse_thresholds(settings: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    """Threshold values from system_settings documents, defaults for missing or bad ones."""
+    thresholds = {key: float(value) for key, value in DEFAULT_THRESHOLDS.items()}
+    for setting in settings:
+        key = setting.get("settingKey")
+        if key not in thresholds:
+            continue
+        try:
+            thresholds[key] = float(setting.get("settingValue"))
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid alert threshold {key}={setting.get('settingValue')!r}")
+    return thresholds
+
+
+class CompiledAlertRules:
+    """ALERT_RULES with thresholds resolved, as arrays over (condition, rule)."""
+
+    def __init__(self, rules: List[Dict[str, Any]], thresholds: Dict[str, float]):
+        self.thresholds = dict(thresholds)
+        self.rules = rules
+        # Per condition: metric column, operator, and either a metric column
+        # (rhs_col >= 0) or a constant
+        lhs_cols, ops, rhs_cols, rhs_values, rule_index = [], [], [], [], []
+        for i, rule in enumerate(rules):
+            for lhs, op, rhs in rule["when"]:
+                lhs_cols.append(METRICS.index(lhs))
+                ops.append(op)
+                if isinstance(rhs, str) and rhs in METRICS:
+                    rhs_cols.append(METRICS.index(rhs))
+                    rhs_values.append(0.0)
+                else:
+                    rhs_cols.append(-1)
+                    rhs_values.append(float(self.thresholds[rhs]) if isinstance(rhs, str) else float(rhs))
+                rule_index.append(i)
+        self._lhs = np.array(lhs_cols, dtype=int)
+        self._rhs_col = np.array(rhs_cols, dtype=int)
+        self._rhs_value = np.array(rhs_values, dtype=float)
+        # membership[c, r] = 1 when condition c belongs to rule r
+        self._membership = np.zeros((len(rule_index), len(rules)), dtype=int)
+        self._membership[np.arange(len(rule_index)), rule_index] = 1
+        # Conditions grouped by operator: one vectorized comparison per operator
+        self._op_groups = [
+            (_OPS[op], np.array([j for j, o in enumerate(ops) if o == op], dtype=int))
+            for op in sorted(set(ops))
+        ]
+
+    def evaluate_batch(self, rows: Sequence[Dict[str, Any]]) -> List[AlertResult]:
+        """Evaluate every row (a dict with the METRICS keys) in one pass."""
+        if not rows:
+            return []
+        x = np.array([[float(row.get(m) or 0) for m in METRICS] for row in rows], dtype=float)
+
+        lhs = x[:, self._lhs]
+        rhs = np.where(self._rhs_col >= 0, x[:, np.maximum(self._rhs_col, 0)], self._rhs_value)
+        met = np.empty(lhs.shape, dtype=bool)
+        for compare, columns in self._op_groups:
+            met[:, columns] = compare(lhs[:, columns], rhs[:, columns])
+
+        # A rule fires when none of its conditions fail
+        fired = (~met).astype(int) @ self._membership == 0
+        first = np.where(fired.any(axis=1), fired.argmax(axis=1), -1)
+
+        results = []
+        for row, i in zip(rows, first):
+            rule = self.rules[i] if i >= 0 else FALLBACK_RULE
+            values = {m: row.get(m) or 0 for m in METRICS}
+            results.append(AlertResult(rule["level"], rule["message"].format(**values), rule["id"]))
+        return results
+
+    def evaluate(self, row: Dict[str, Any]) -> AlertResult:
+        return self.evaluate_batch([row])[0]
+
+
+def compile_rules(
+    thresholds: Optional[Dict[str, float]] = None, rules: Optional[List[Dict[str, Any]]] = None
+) -> CompiledAlertRules:
+    return CompiledAlertRules(rules or ALERT_RULES, thresholds or parse_thresholds([]))
+
+
+class AlertRuleEngine:
+    """Keeps the compiled rules in step with the threshold settings."""
+
+    def __init__(self, db):
+        self.db = db
+        self.rules = compile_rules()
+
+    async def refresh(self) -> CompiledAlertRules:
+        """Re-read thresholds (one query); recompile only when they changed."""
+        settings = await self.db.system_settings.find(
+            {"settingKey": {"$in": list(DEFAULT_THRESHOLDS)}}, {"_id": 0}
+        ).to_list(None)
+        thresholds = parse_thresholds(settings)
+        if thresholds != self.rules.thresholds:
+            logger.info(f"Alert thresholds changed: {thresholds}")
+            self.rules = compile_rules(thresholds)
+        return self.rules
+
+    def evaluate(self, row: Dict[str, Any]) -> AlertResult:
+        return self.rules.evaluate(row)
+
+    def evaluate_batch(self, rows: Sequence[Dict[str, Any]]) -> List[AlertResult]:
+        return self.rules.evaluate_batch(rows)
@@ -0,0 +1,183 @@
+"""
+Array-based allocation core for ConcurrencyAllocator.
+
+Every function works on parallel NumPy arrays indexed by client (or by tier
+for the pool helpers, index 0 = P1). Nothing in here touches Pydantic models,
+MongoDB or SSH, so it can be benchmarked and tested in isolation.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+TIERS = (1, 2, 3, 4)
+
+# Guards floor() against float noise such as 59.999999999 when the exact
+# answer is 60 — far below the resolution of a call slot.
+FLOOR_EPSILON = 1e-9
+
+
+def compute_tier_pools(
+    tier_counts: np.ndarray, tier_weights: np.ndarray, available: float
+) -> np.ndarray:
+    """Split `available` across tiers by weight, renormalized over tiers with clients."""
+    active = tier_counts > 0
+    total_weight = tier_weights[active].sum()
+    if total_weight == 0:
+        return np.zeros(len(tier_weights), dtype=float)
+    return np.where(active, tier_weights / total_weight * available, 0.0)
+
+
+def water_fill(
+    base: np.ndarray, caps: np.ndarray, weights: np.ndarray, total: float
+) -> np.ndarray:
+    """
+    Closed-form solution of the maxConcurrency surplus cascade.
+
+    Returns x_i = min(cap_i, base_i + w_i * lam) with the single lam >= 0
+    that makes sum(x) == total. Surplus from capped clients therefore flows
+    to uncapped clients in proportion to their tier weight, exactly like the
+    old iterative cascade, but without an iteration limit. When every client
+    is capped before `total` is reached, all clients sit at their cap and the
+    leftover surplus is dropped.
+    """
+    n = len(base)
+    if n == 0:
+        return np.zeros(0, dtype=float)
+
+    # Clients starting above their cap are clipped at lam == 0; their excess
+    # is part of the surplus that the rest of the fill has to absorb.
+    base = np.minimum(base, caps)
+
+    # lam at which each client hits its cap
+    breakpoints = (caps - base) / weights
+    order = np.argsort(breakpoints, kind="stable")
+    t = breakpoints[order]
+    c = caps[order]
+    b = base[order]
+    w = weights[order]
+
+    # For lam == t[k]: clients before k are capped, clients from k on are not
+    capped_sum = np.concatenate(([0.0], np.cumsum(c)[:-1]))
+    base_suffix = np.cumsum(b[::-1])[::-1]
+    weight_suffix = np.cumsum(w[::-1])[::-1]
+    filled = capped_sum + base_suffix + weight_suffix * t
+
+    reached = np.flatnonzero(filled >= total - FLOOR_EPSILON)
+    if len(reached) == 0:
+        return caps.astype(float)
+
+    k = reached[0]
+    lam = max((total - capped_sum[k] - base_suffix[k]) / weight_suffix[k], 0.0)
+    return np.minimum(caps, base + weights * lam)
+
+
+def floor_with_remainder(slots: np.ndarray, remaining: np.ndarray) -> np.ndarray:
+    """Floor all slots, then hand the rounding remainder out 1-by-1 by remainingCalls DESC."""
+    floored = np.floor(slots + FLOOR_EPSILON)
+    remainder = int(round(float(slots.sum() - floored.sum())))
+    if remainder > 0:
+        order = np.argsort(-remaining, kind="stable")
+        floored[order[:remainder]] += 1.0
+    return floored
+
+
+def tiered_fill(
+    tier_idx: np.ndarray,
+    caps: np.ndarray,
+    tier_weights: np.ndarray,
+    total: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Tier pools by weight, equal split within each tier, then cap + cascade surplus."""
+    tier_counts = np.bincount(tier_idx, minlength=len(TIERS))
+    tier_pools = compute_tier_pools(tier_counts, tier_weights, total)
+    if len(tier_idx) == 0:
+        return tier_pools, np.zeros(0, dtype=float)
+    base = tier_pools[tier_idx] / tier_counts[tier_idx]
+    slots = water_fill(base, caps, tier_weights[tier_idx].astype(float), float(total))
+    return tier_pools, slots
+
+
+def allocate(
+    priorities: np.ndarray,
+    max_concurrency: np.ndarray,
+    in_flight: np.ndarray,
+    remaining: np.ndarray,
+    tier_weights: np.ndarray,
+    available: float,
+    min_per_client: int,
+    expected_demand: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Allocate `available` slots across clients that have demand.
+
+    All client arrays must already be filtered to clients with demand and
+    ordered by priority (the order decides remainder tie-breaks).
+
+    With `expected_demand` (forecast in-flight calls for the next interval),
+    slots are first filled up to each client's forecast need, so ramping-up
+    clients get served before ramping-down ones; whatever is left over is
+    then spread with the usual tier split. The total handed out never
+    exceeds `available` either way.
+
+    Returns (tier_pools, new_limits) where tier_pools is indexed by tier - 1.
+    """
+    tier_idx = priorities.astype(np.int64) - 1
+    caps = max_concurrency.astype(float)
+
+    if expected_demand is None:
+        tier_pools, slots = tiered_fill(tier_idx, caps, tier_weights, available)
+    else:
+        need = np.maximum(expected_demand - in_flight, 0.0)
+        tier_pools, slots = tiered_fill(tier_idx, np.minimum(caps, need), tier_weights, available)
+        leftover = available - slots.sum()
+        if leftover > FLOOR_EPSILON:
+            _, extra = tiered_fill(tier_idx, caps - slots, tier_weights, leftover)
+            slots = slots + extra
+
+    if len(priorities) == 0:
+        return tier_pools, np.zeros(0, dtype=np.int64)
+
+    slots = floor_with_remainder(slots, remaining)
+
+    new_limits = np.maximum(in_flight + slots.astype(np.int64), min_per_client)
+    new_limits = np.minimum(new_limits, max_concurrency)
+    return tier_pools, new_limits.astype(np.int64)
+
+
+def damp_limits(
+    old: np.ndarray,
+    target: np.ndarray,
+    min_delta: int,
+    max_step: int,
+    frozen: np.ndarray,
+    budget: int,
+) -> np.ndarray:
+    """
+    Smooth a cycle's target limits against the current ones.
+
+    - a change smaller than `min_delta` is dropped (0 disables)
+    - a change larger than `max_step` is clipped to it (0 disables)
+    - `frozen` clients (in cooldown) keep their current limit
+
+    Holding a limit above its target can push the sum past `budget`. When
+    that happens the excess is taken back from the clients held furthest
+    above target first. The result therefore never sums above
+    max(budget, target.sum()).
+    """
+    old = old.astype(np.int64)
+    target = target.astype(np.int64)
+    delta = target - old
+    if max_step > 0:
+        delta = np.clip(delta, -max_step, max_step)
+    hold = frozen | (np.abs(delta) < min_delta)
+    damped = np.where(hold, old, old + delta)
+
+    excess = int(damped.sum()) - max(int(budget), int(target.sum()))
+    if excess > 0:
+        above = np.maximum(damped - target, 0)
+        order = np.argsort(-above, kind="stable")
+        # Take whole gaps largest-first; the last one only partially
+        taken_before = np.concatenate(([0], np.cumsum(above[order])[:-1]))
+        reclaim = np.clip(excess - taken_before, 0, above[order])
+        damped[order] -= reclaim
+    return damped
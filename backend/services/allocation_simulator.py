@@ -0,0 +1,294 @@
+"""
+Offline replay / simulation of ConcurrencyAllocator.
+
+Runs the real allocator code path (run_allocation_cycle) tick by tick
+against an in-memory stand-in for MongoDB and a no-op partner sync, so
+allocation policies can be evaluated and benchmarked with no SSH or Mongo.
+
+Demand comes either from stored `allocation_runs` + `dashboard_snapshots`
+(see load_recorded_trace) or from a synthetic trace (see synthetic_trace).
+"""
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from models import ConcurrencyAllocationSettings, PartnerConfig, SSHConfig
+from services.allocation_engine import TIERS
+from services.concurrency_allocator import SETTINGS_KEY, ConcurrencyAllocator
+from services.in_memory_db import InMemoryDB
+
+logger = logging.getLogger(__name__)
+
+
+class NullSSHService:
+    """Stand-in for SSHConnectionService: every partner write succeeds instantly."""
+
+    def __init__(self):
+        self.writes = 0
+
+    async def update_setting_with_audit(self, partner, name, new_value, audit_user_id=9999999999):
+        self.writes += 1
+        return {"exists": True, "oldValue": None, "updated": True, "auditError": None}
+
+
+# ----------------------------------------------------------------------
+# Traces
+# ----------------------------------------------------------------------
+
+class SimulationTrace(BaseModel):
+    """Partners plus one {partnerId: snapshot fields} dict per allocation tick."""
+    partners: List[PartnerConfig]
+    ticks: List[Dict[str, Dict[str, Any]]]
+    tickTimes: List[datetime] = []
+
+
+def _sim_partner(pid: str, name: str, priority: int, max_concurrency: int, limit: int) -> PartnerConfig:
+    return PartnerConfig(
+        id=pid,
+        partnerName=name,
+        dbHost="simulated",
+        dbName="simulated",
+        dbUsername="simulated",
+        dbPassword="",
+        sshConfig=SSHConfig(enabled=False),
+        priority=priority,
+        maxConcurrency=max_concurrency,
+        concurrencyLimit=limit,
+    )
+
+
+def synthetic_trace(
+    n_clients: int, n_ticks: int, global_max: int, seed: int = 0
+) -> SimulationTrace:
+    """Diurnal-ish demand per client with noise, bursts and idle clients."""
+    rng = np.random.default_rng(seed)
+    priorities = rng.integers(1, 5, n_clients)
+    max_conc = rng.integers(5, 120, n_clients)
+    peak = rng.gamma(2.0, global_max / max(n_clients, 1), n_clients)
+    phase = rng.uniform(0, 2 * np.pi, n_clients)
+    idle = rng.random(n_clients) < 0.15
+    remaining = rng.integers(500, 20_000, n_clients).astype(float)
+    completed = np.zeros(n_clients)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    partners = [
+        _sim_partner(f"sim-{i}", f"Sim{i}", int(priorities[i]), int(max_conc[i]), 10)
+        for i in range(n_clients)
+    ]
+
+    ticks = []
+    for t in range(n_ticks):
+        wave = 0.5 + 0.5 * np.sin(2 * np.pi * t / max(n_ticks, 1) + phase)
+        burst = rng.random(n_clients) < 0.05
+        demand = peak * wave * rng.uniform(0.8, 1.2, n_clients) * np.where(burst, 3.0, 1.0)
+        demand = np.where(idle, 0.0, demand)
+        active = np.minimum(demand, max_conc).astype(int)
+        queued = (demand - active).clip(min=0).astype(int)
+        remaining = (remaining - active).clip(min=0)
+        # roughly a third of active calls finish each interval
+        completed += rng.binomial(active, 0.33)
+        ticks.append({
+            p.id: {
+                "activeCalls": int(active[i]),
+                "queuedCalls": int(queued[i]),
+                "remainingCalls": int(remaining[i]) if not idle[i] else 0,
+                "completedCallsToday": int(completed[i]),
+                "pauseAllCampaigns": False,
+            }
+            for i, p in enumerate(partners)
+        })
+    tick_times = [start + timedelta(minutes=t) for t in range(n_ticks)]
+    return SimulationTrace(partners=partners, ticks=ticks, tickTimes=tick_times)
+
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def recorded_trace(runs: List[Dict], snapshots: List[Dict]) -> SimulationTrace:
+    """
+    Build a trace from stored allocation_runs and dashboard_snapshots documents.
+
+    Each allocation run becomes one tick. Partner priority / maxConcurrency
+    and the starting limits come from the run entries; demand comes from the
+    latest snapshot of each partner taken at or before the run.
+    """
+    runs = sorted(runs, key=lambda r: _parse_time(r["runAt"]))
+    snapshots = sorted(snapshots, key=lambda s: _parse_time(s["snapshotTime"]))
+
+    partners: Dict[str, PartnerConfig] = {}
+    for run in runs:
+        for entry in run.get("allocations", []):
+            if entry["partnerId"] not in partners:
+                partners[entry["partnerId"]] = _sim_partner(
+                    entry["partnerId"], entry.get("partnerName", entry["partnerId"]),
+                    entry["priority"], entry["maxConcurrency"], entry["oldLimit"],
+                )
+
+    ticks, tick_times = [], []
+    latest: Dict[str, Dict[str, Any]] = {}
+    i = 0
+    for run in runs:
+        run_at = _parse_time(run["runAt"])
+        while i < len(snapshots) and _parse_time(snapshots[i]["snapshotTime"]) <= run_at:
+            snap = snapshots[i]
+            latest[snap["partnerId"]] = {
+                "activeCalls": snap.get("activeCalls", 0),
+                "queuedCalls": snap.get("queuedCalls", 0),
+                "remainingCalls": snap.get("remainingCalls", 0),
+                "completedCallsToday": snap.get("completedCallsToday", 0),
+                "pauseAllCampaigns": snap.get("pauseAllCampaigns", False),
+            }
+            i += 1
+        ticks.append({pid: dict(latest[pid]) for pid in partners if pid in latest})
+        tick_times.append(run_at)
+
+    return SimulationTrace(partners=list(partners.values()), ticks=ticks, tickTimes=tick_times)
+
+
+async def load_recorded_trace(db, since: datetime, until: datetime) -> SimulationTrace:
+    """Read allocation_runs and dashboard_snapshots from Mongo (read-only) into a trace."""
+    runs = await db.allocation_runs.find(
+        {"runAt": {"$gte": since.isoformat(), "$lt": until.isoformat()}}, {"_id": 0}
+    ).sort("runAt", 1).to_list(None)
+    snapshots = await db.dashboard_snapshots.find(
+        {"snapshotTime": {"$gte": since.isoformat(), "$lt": until.isoformat()}},
+        {"_id": 0, "partnerId": 1, "snapshotTime": 1, "activeCalls": 1,
+         "queuedCalls": 1, "remainingCalls": 1, "completedCallsToday": 1,
+         "pauseAllCampaigns": 1},
+    ).sort("snapshotTime", 1).to_list(None)
+    return recorded_trace(runs, snapshots)
+
+
+# ----------------------------------------------------------------------
+# Simulation
+# ----------------------------------------------------------------------
+
+class SimulationReport(BaseModel):
+    ticks: int
+    clients: int
+    globalMax: int
+    # share of globalMax covered by limits that met next-tick demand
+    utilization: float = 0.0
+    # per tier: unserved next-tick demand / total next-tick demand
+    starvation: Dict[str, float] = Field(default_factory=dict)
+    limitChanges: int = 0
+    limitChangesPerTick: float = 0.0
+    totalLimitDelta: int = 0
+    peakLimitSum: int = 0
+    cycleMs: Dict[str, float] = Field(default_factory=dict)
+    computeMs: Dict[str, float] = Field(default_factory=dict)
+    statusCounts: Dict[str, int] = Field(default_factory=dict)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    arr = np.array(samples) * 1000
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+async def simulate(
+    trace: SimulationTrace,
+    settings: ConcurrencyAllocationSettings,
+    allocator_factory: Callable[[Any, Any], ConcurrencyAllocator] = ConcurrencyAllocator,
+) -> SimulationReport:
+    """Replay `trace` through the allocator and score the resulting limits."""
+    db = InMemoryDB()
+    ssh = NullSSHService()
+    allocator = allocator_factory(db, ssh)
+
+    await db.settings.insert_one({"key": SETTINGS_KEY, "value": settings.model_dump()})
+    for p in trace.partners:
+        doc = p.model_dump(mode="json")
+        doc["isActive"] = True
+        await db.partner_configs.insert_one(doc)
+
+    compute_times: List[float] = []
+    compute = allocator._compute_allocations
+
+    def timed_compute(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return compute(*args, **kwargs)
+        finally:
+            compute_times.append(time.perf_counter() - t0)
+
+    allocator._compute_allocations = timed_compute
+
+    tiers = {p.id: p.priority for p in trace.partners}
+    caps = {p.id: p.maxConcurrency for p in trace.partners}
+    demand_by_tier = {t: 0 for t in TIERS}
+    unserved_by_tier = {t: 0 for t in TIERS}
+    served_ratio: List[float] = []
+    cycle_times: List[float] = []
+    status_counts: Dict[str, int] = {}
+    changes = 0
+    total_delta = 0
+    peak_limit_sum = 0
+    prev_limits: Optional[Dict[str, int]] = None
+    # Predictive mode reads recent snapshots, so keep a rolling window of ticks
+    window = settings.forecastWindow if settings.predictiveAllocation else 1
+    recent: deque = deque(maxlen=window)
+
+    for t, tick in enumerate(trace.ticks):
+        # Score the limits set last tick against this tick's demand
+        if prev_limits is not None:
+            served = 0
+            for pid, snap in tick.items():
+                demand = min(snap.get("activeCalls", 0) + snap.get("queuedCalls", 0), caps[pid])
+                got = min(prev_limits.get(pid, 0), demand)
+                served += got
+                demand_by_tier[tiers[pid]] += demand
+                unserved_by_tier[tiers[pid]] += demand - got
+            served_ratio.append(min(served, settings.globalMaxConcurrency) / settings.globalMaxConcurrency)
+
+        now = trace.tickTimes[t] if t < len(trace.tickTimes) else datetime.now(timezone.utc)
+        recent.append([
+            {"partnerId": pid, "snapshotTime": now.isoformat(), **snap} for pid, snap in tick.items()
+        ])
+        db.dashboard_snapshots.clear()
+        for docs in recent:
+            await db.dashboard_snapshots.insert_many(docs)
+
+        t0 = time.perf_counter()
+        run = await allocator.run_allocation_cycle()
+        cycle_times.append(time.perf_counter() - t0)
+
+        status_counts[run.status] = status_counts.get(run.status, 0) + 1
+        limits = {e.partnerId: e.newLimit for e in run.allocations}
+        for e in run.allocations:
+            if e.newLimit != e.oldLimit:
+                changes += 1
+                total_delta += abs(e.newLimit - e.oldLimit)
+        peak_limit_sum = max(peak_limit_sum, sum(limits.values()))
+        prev_limits = limits
+
+    return SimulationReport(
+        ticks=len(trace.ticks),
+        clients=len(trace.partners),
+        globalMax=settings.globalMaxConcurrency,
+        utilization=round(float(np.mean(served_ratio)), 4) if served_ratio else 0.0,
+        starvation={
+            f"p{t}": round(unserved_by_tier[t] / demand_by_tier[t], 4) if demand_by_tier[t] else 0.0
+            for t in TIERS
+        },
+        limitChanges=changes,
+        limitChangesPerTick=round(changes / max(len(trace.ticks), 1), 2),
+        totalLimitDelta=total_delta,
+        peakLimitSum=peak_limit_sum,
+        cycleMs=_percentiles(cycle_times),
+        computeMs=_percentiles(compute_times),
+        statusCounts=status_counts,
+    )
@@ -0,0 +1,287 @@
+"""
+On-disk, content-addressed cache for call recordings and their transcripts.
+
+Layout under the cache root:
+    urls/<sha256(url)>                 -> "<etag>\\n<content sha256>"
+    entries/<content sha256>/audio     -> recording bytes
+    entries/<content sha256>/<sha256(model)>.txt  -> transcript
+    entries/<content sha256>/refs      -> names of the urls/ records pointing here
+
+The same recording reached through different URLs is stored once. URLs that
+came with an ETag are keyed without their query string (presigned URLs change
+it per request) and revalidated with If-None-Match; URLs without one are
+trusted as-is. Whole entries (audio, transcripts and the url records that
+point to them) are evicted least-recently-used once the total size of all of
+them passes max_bytes. Recency is the audio file's mtime, refreshed on every
+audio or transcript hit.
+
+File I/O is blocking and runs via asyncio.to_thread.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "QA_AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "qa_audio_cache")
+)
+DEFAULT_CACHE_MAX_MB = int(os.environ.get("QA_AUDIO_CACHE_MAX_MB", "2048"))
+
+
+def _sha256(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._urls_dir = os.path.join(root, "urls")
+        self._entries_dir = os.path.join(root, "entries")
+        os.makedirs(self._urls_dir, exist_ok=True)
+        os.makedirs(self._entries_dir, exist_ok=True)
+
+        # Total size of everything the cache holds, kept under max_bytes
+        self._bytes = 0
+        for entry in os.scandir(self._entries_dir):
+            if entry.name.startswith(".part-"):
+                os.remove(entry.path)  # left behind by an interrupted download
+            elif entry.is_dir():
+                self._bytes += _dir_size(entry.path)
+        self._bytes += _dir_size(self._urls_dir)
+        self._lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def source_key(url: str, etag: Optional[str]) -> str:
+        # Query strings of presigned URLs change per request; the ETag pins the content
+        return _sha256(url.split("?", 1)[0] if etag else url)
+
+    def _url_path(self, name: str) -> str:
+        return os.path.join(self._urls_dir, name)
+
+    def _entry_path(self, content_hash: str, name: str = "") -> str:
+        return os.path.join(self._entries_dir, content_hash, name)
+
+    def _transcript_path(self, content_hash: str, model: str) -> str:
+        return self._entry_path(content_hash, f"{_sha256(model)}.txt")
+
+    async def lookup(self, url: str) -> Optional[Tuple[Optional[str], str]]:
+        """(ETag or None, content hash) last stored for this URL, before any request is made."""
+        return await asyncio.to_thread(self._lookup, url)
+
+    def _lookup(self, url: str) -> Optional[Tuple[Optional[str], str]]:
+        # A record under the query-less key is only valid with an ETag to revalidate
+        for name, with_etag in ((self.source_key(url, "etag"), True), (self.source_key(url, None), False)):
+            record = _read_url_record(self._url_path(name))
+            if record and bool(record[0]) == with_etag:
+                return record[0] or None, record[1]
+        return None
+
+    async def get_audio(self, content_hash: str) -> Optional[bytes]:
+        return await asyncio.to_thread(_read_bytes, self._entry_path(content_hash, "audio"), True)
+
+    async def get_transcript(self, content_hash: str, model: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get_transcript, content_hash, model)
+
+    def _get_transcript(self, content_hash: str, model: str) -> Optional[str]:
+        data = _read_bytes(self._transcript_path(content_hash, model), touch=False)
+        if data is None:
+            return None
+        _touch(self._entry_path(content_hash, "audio"))
+        return data.decode("utf-8")
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def open_writer(self) -> "AudioWriter":
+        """Start writing a recording chunk by chunk; finish with commit() or abort()."""
+        return AudioWriter(self)
+
+    async def put_audio(self, url: str, etag: Optional[str], audio: bytes) -> str:
+        """Store a recording and map url + etag to it. Returns its content hash."""
+        writer = self.open_writer()
+        writer.write(audio)
+        return await writer.commit(url, etag)
+
+    async def _store(self, tmp_path: str, size: int, content_hash: str, url: str, etag: Optional[str]) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._store_sync, tmp_path, size, content_hash, url, etag)
+
+    def _store_sync(self, tmp_path: str, size: int, content_hash: str, url: str, etag: Optional[str]) -> None:
+        audio_path = self._entry_path(content_hash, "audio")
+        if os.path.exists(audio_path):
+            os.remove(tmp_path)
+            _touch(audio_path)
+        else:
+            os.makedirs(self._entry_path(content_hash), exist_ok=True)
+            os.replace(tmp_path, audio_path)
+            self._bytes += size
+
+        name = self.source_key(url, etag)
+        record = f"{etag or ''}\n{content_hash}".encode()
+        self._bytes += _replace_size(self._url_path(name), record)
+        refs_path = self._entry_path(content_hash, "refs")
+        refs = _read_bytes(refs_path, touch=False) or b""
+        if name.encode() not in refs.split():
+            line = f"{name}\n".encode()
+            with open(refs_path, "ab") as f:
+                f.write(line)
+            self._bytes += len(line)
+        if self._bytes > self.max_bytes:
+            self._evict()
+
+    async def put_transcript(self, content_hash: str, model: str, transcript: str) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._put_transcript_sync, content_hash, model, transcript)
+
+    def _put_transcript_sync(self, content_hash: str, model: str, transcript: str) -> None:
+        self._bytes += _replace_size(self._transcript_path(content_hash, model), transcript.encode("utf-8"))
+        if self._bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until the cache is back under max_bytes."""
+        entries = sorted(
+            (e for e in os.scandir(self._entries_dir) if e.is_dir()),
+            key=lambda e: _mtime(os.path.join(e.path, "audio")),
+        )
+        for entry in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            self._remove_entry(entry.name)
+        logger.info(f"Audio cache evicted to {self._bytes / (1024 * 1024):.1f}MB")
+
+    def _remove_entry(self, content_hash: str) -> None:
+        refs = _read_bytes(self._entry_path(content_hash, "refs"), touch=False) or b""
+        for name in refs.decode().split():
+            path = self._url_path(name)
+            record = _read_url_record(path)
+            # The URL may have moved on to newer content since
+            if record and record[1] == content_hash:
+                self._bytes -= _remove(path)
+        entry_dir = self._entry_path(content_hash)
+        for name in os.listdir(entry_dir):
+            self._bytes -= _remove(os.path.join(entry_dir, name))
+        shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+class AudioWriter:
+    """Streams a recording into a temp file while hashing it, so nothing is held in memory.
+
+    Writes are small buffered appends to local disk and are done inline.
+    """
+
+    def __init__(self, cache: AudioCache):
+        self._cache = cache
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache._entries_dir, prefix=".part-")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    async def commit(self, url: str, etag: Optional[str]) -> str:
+        self._file.close()
+        content_hash = self._hash.hexdigest()
+        try:
+            await self._cache._store(self._tmp_path, self.size, content_hash, url, etag)
+        except BaseException:
+            self.abort()
+            raise
+        return content_hash
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def _read_url_record(path: str) -> Optional[Tuple[str, str]]:
+    data = _read_bytes(path, touch=False)
+    if not data:
+        return None
+    etag, _, content_hash = data.decode("utf-8").partition("\n")
+    return etag, content_hash
+
+
+def _read_bytes(path: str, touch: bool) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if touch:
+        _touch(path)
+    return data
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _remove(path: str) -> int:
+    """Delete a file; returns the bytes freed."""
+    size = _size(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def _dir_size(path: str) -> int:
+    return sum(_size(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def _replace_size(path: str, data: bytes) -> int:
+    """Write `data` atomically over `path`; returns the change in bytes on disk."""
+    before = _size(path)
+    _write_atomic(path, data)
+    return len(data) - before
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write via a temp file + rename so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -1,7 +1,10 @@
+import asyncio
 import logging
-import uuid
+import time
 from datetime import datetime, timezone
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from models import (
     AllocationRun,
@@ -9,32 +12,100 @@ from models import (
     ConcurrencyAllocationSettings,
     ConcurrencyHistory,
     PartnerConfig,
-    TierWeights,
 )
+from services.allocation_engine import allocate, damp_limits
+from services.demand_forecast import forecast_demand
 from services.ssh_connection import SSHConnectionService
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_SETTINGS = ConcurrencyAllocationSettings()
 SETTINGS_KEY = "concurrency_allocation"
+WRITE_CONCURRENCY = 5  # max partner writes (Mongo + SSH) in flight at once
 
 
 class ConcurrencyAllocator:
     def __init__(self, db, ssh_service: SSHConnectionService):
         self.db = db
         self.ssh_service = ssh_service
+        # Full and incremental runs read-modify-write the same limits
+        self._lock = asyncio.Lock()
+        # partner_id -> (in-flight, has demand) its current limit was computed from
+        self._allocated_demand: Dict[str, Tuple[int, bool]] = {}
+        # partner_id -> when the allocator last changed its limit (cooldown)
+        self._last_changed: Dict[str, datetime] = {}
+        # Settings the last full cycle loaded; incremental passes reuse them
+        self._settings: Optional[ConcurrencyAllocationSettings] = None
 
     # ------------------------------------------------------------------
-    # Public entry point — called by scheduler after every data fetch
+    # Public entry points — full cycle after every data fetch, incremental
+    # re-balance after each partner snapshot
     # ------------------------------------------------------------------
 
-    async def run_allocation_cycle(self) -> AllocationRun:
-        """Run one full allocation cycle and write limits to all clients."""
-        logger.info("Starting concurrency allocation cycle")
+    async def run_allocation_cycle(
+        self,
+        dry_run: bool = False,
+        settings: Optional[ConcurrencyAllocationSettings] = None,
+    ) -> AllocationRun:
+        """
+        Run one full allocation cycle and write limits to all clients.
 
-        settings = await self._load_settings()
+        With dry_run the cycle computes against current snapshots and returns
+        the proposed run without writing limits, history or the run record.
+        `settings` (dry runs only) previews candidate settings in place of the
+        persisted ones.
+        """
+        if dry_run:
+            return await self._run_full_cycle(dry_run=True, settings=settings)
+        if settings is not None:
+            raise ValueError("Candidate settings are only supported for dry runs")
+        async with self._lock:
+            return await self._run_full_cycle()
+
+    async def on_snapshot(self, partner_id: str, snapshot: Dict) -> Optional[AllocationRun]:
+        """
+        Re-balance one partner's tier when its demand moved by at least
+        incrementalDemandThreshold since its limit was last computed.
+        Returns the run, or None when nothing was re-evaluated.
+
+        Uses the settings the last full cycle loaded, so snapshots cost no
+        settings read; only a snapshot before the first cycle loads them.
+        """
+        settings = self._settings
+        if settings is None:
+            settings = self._settings = await self._load_settings()
+        if not settings.incrementalAllocation:
+            return None
+        if not self._demand_shifted(partner_id, snapshot, settings):
+            return None
+        async with self._lock:
+            # A full cycle may have picked this snapshot up while we waited
+            if not self._demand_shifted(partner_id, snapshot, settings):
+                return None
+            return await self._reallocate_tier(partner_id, settings)
+
+    async def _run_full_cycle(
+        self,
+        dry_run: bool = False,
+        settings: Optional[ConcurrencyAllocationSettings] = None,
+    ) -> AllocationRun:
+        logger.info(f"Starting concurrency allocation cycle{' (dry run)' if dry_run else ''}")
+        phase_ms: Dict[str, float] = {}
+        clock = time.perf_counter()
+
+        def lap(phase: str) -> None:
+            nonlocal clock
+            now = time.perf_counter()
+            phase_ms[phase] = round((now - clock) * 1000, 3)
+            clock = now
+
+        if settings is None:
+            settings = self._settings = await self._load_settings()
+        lap("loadSettings")
         partners = await self._load_active_partners()
+        lap("loadPartners")
         snapshots = await self._load_latest_snapshots([p.id for p in partners])
+        lap("loadSnapshots")
 
         total_in_flight = sum(
             snapshots.get(p.id, {}).get("activeCalls", 0)
@@ -50,21 +121,43 @@ class ConcurrencyAllocator:
                 totalInFlight=total_in_flight,
                 availableSlots=max(available, 0),
                 status="no_active_clients",
+                phaseMs=phase_ms,
             )
-            await self._save_run(run)
+            if not dry_run:
+                await self._save_run(run)
             return run
 
         if available <= 0:
-            run = await self._apply_saturated_floor(
-                partners, snapshots, settings, total_in_flight
-            )
-            await self._save_run(run)
+            run = self._saturated_floor_run(partners, snapshots, settings, total_in_flight)
+            lap("compute")
+            if not dry_run:
+                await self._write_changed(
+                    [(p, e.newLimit, e) for p, e in zip(partners, run.allocations)],
+                    "auto_allocation_saturated",
+                )
+                self._remember_demand(partners, snapshots)
+            lap("write")
+            run.phaseMs = phase_ms
+            if not dry_run:
+                await self._save_run(run)
             return run
 
+        forecasts = None
+        if settings.predictiveAllocation:
+            forecasts = await self._forecast_demand(partners, settings)
+            lap("forecast")
+
         allocations = self._compute_allocations(
-            partners, snapshots, settings, available
+            partners, snapshots, settings, available, forecasts
         )
-        await self._write_allocations(partners, snapshots, allocations, settings)
+        self._damp_allocations(allocations, settings, settings.globalMaxConcurrency)
+        lap("compute")
+
+        written = 0
+        if not dry_run:
+            written = await self._write_allocations(partners, snapshots, allocations, settings)
+            self._remember_demand(partners, snapshots)
+        lap("write")
 
         run = AllocationRun(
             globalMax=settings.globalMaxConcurrency,
@@ -72,14 +165,105 @@ class ConcurrencyAllocator:
             availableSlots=available,
             status="normal",
             allocations=allocations,
+            phaseMs=phase_ms,
         )
+        if dry_run:
+            return run
+
         await self._save_run(run)
         logger.info(
-            f"Allocation cycle complete — {len(allocations)} clients updated, "
+            f"Allocation cycle complete — {written}/{len(allocations)} clients updated, "
             f"available={available}, in-flight={total_in_flight}"
         )
         return run
 
+    # ------------------------------------------------------------------
+    # Incremental path
+    # ------------------------------------------------------------------
+
+    def _demand_shifted(
+        self, partner_id: str, snapshot: Dict, settings: ConcurrencyAllocationSettings
+    ) -> bool:
+        baseline = self._allocated_demand.get(partner_id)
+        if baseline is None:
+            return False  # not allocated yet — the next full cycle covers it
+        in_flight = snapshot.get("activeCalls", 0) + snapshot.get("queuedCalls", 0)
+        return (
+            self._has_demand(snapshot) != baseline[1]
+            or abs(in_flight - baseline[0]) >= settings.incrementalDemandThreshold
+        )
+
+    def _remember_demand(self, partners: List[PartnerConfig], snapshots: Dict) -> None:
+        for p in partners:
+            snap = snapshots.get(p.id, {})
+            in_flight = snap.get("activeCalls", 0) + snap.get("queuedCalls", 0)
+            self._allocated_demand[p.id] = (in_flight, self._has_demand(snap))
+
+    async def _reallocate_tier(
+        self, partner_id: str, settings: ConcurrencyAllocationSettings
+    ) -> Optional[AllocationRun]:
+        """
+        Re-run the allocation for the partner's priority tier only.
+
+        Other tiers keep their current limits, so the tier may hand out at
+        most globalMax minus those limits; the global sum stays within
+        globalMaxConcurrency. If the tier has no room, nothing is written and
+        the next full cycle reconciles.
+        """
+        partners = await self._load_active_partners()
+        target = next((p for p in partners if p.id == partner_id), None)
+        if target is None:
+            return None
+
+        tier = [p for p in partners if p.priority == target.priority]
+        budget = settings.globalMaxConcurrency - sum(
+            p.concurrencyLimit for p in partners if p.priority != target.priority
+        )
+        snapshots = await self._load_latest_snapshots([p.id for p in tier])
+
+        demand_in_flight = 0
+        idle = 0
+        for p in tier:
+            snap = snapshots.get(p.id, {})
+            if self._has_demand(snap):
+                demand_in_flight += snap.get("activeCalls", 0) + snap.get("queuedCalls", 0)
+            else:
+                idle += 1
+        available = budget - demand_in_flight - idle * settings.minConcurrencyPerClient
+
+        if available <= 0:
+            logger.info(
+                f"Incremental allocation skipped for P{target.priority} — "
+                f"no room under globalMax (budget={budget}, in-flight={demand_in_flight})"
+            )
+            return None
+
+        allocations = self._compute_allocations(tier, snapshots, settings, available)
+        if sum(a.newLimit for a in allocations) > budget:
+            # Per-client floors pushed the tier over its share — leave it to the full cycle
+            logger.info(f"Incremental allocation skipped for P{target.priority} — floors exceed budget")
+            return None
+        self._damp_allocations(allocations, settings, budget)
+
+        written = await self._write_allocations(
+            tier, snapshots, allocations, settings, reason="incremental_allocation"
+        )
+        self._remember_demand(tier, snapshots)
+
+        run = AllocationRun(
+            globalMax=settings.globalMaxConcurrency,
+            totalInFlight=demand_in_flight,
+            availableSlots=available,
+            status="incremental",
+            allocations=allocations,
+        )
+        await self._save_run(run)
+        logger.info(
+            f"Incremental allocation for P{target.priority} (triggered by {target.partnerName}) — "
+            f"{written}/{len(allocations)} clients updated, available={available}"
+        )
+        return run
+
     # ------------------------------------------------------------------
     # Core algorithm
     # ------------------------------------------------------------------
@@ -90,30 +274,27 @@ class ConcurrencyAllocator:
         snapshots: Dict,
         settings: ConcurrencyAllocationSettings,
         available: int,
+        forecasts: Optional[Dict[str, float]] = None,
     ) -> List[AllocationRunEntry]:
-        weights = {
-            1: settings.tierWeights.p1,
-            2: settings.tierWeights.p2,
-            3: settings.tierWeights.p3,
-            4: settings.tierWeights.p4,
-        }
-
-        # Group partners by priority — only include those with demand and not paused
-        tier_clients: Dict[int, List[PartnerConfig]] = {1: [], 2: [], 3: [], 4: []}
-        for p in partners:
-            snap = snapshots.get(p.id, {})
-            remaining = snap.get("remainingCalls", 0)
-            raw_paused = snap.get("pauseAllCampaigns", False)
-            paused = raw_paused if isinstance(raw_paused, bool) else str(raw_paused).strip().lower() in ("1", "true", "yes")
-            if remaining > 0 and not paused:
-                tier_clients[p.priority].append(p)
+        weights = np.array(
+            [
+                settings.tierWeights.p1,
+                settings.tierWeights.p2,
+                settings.tierWeights.p3,
+                settings.tierWeights.p4,
+            ],
+            dtype=float,
+        )
 
-        # Compute tier pools based on active tiers only (renormalize)
-        tier_pools = self._compute_tier_pools(tier_clients, weights, available)
+        # Only partners with demand and not paused, grouped by priority (stable)
+        demand_clients = sorted(
+            (p for p in partners if self._has_demand(snapshots.get(p.id, {}))),
+            key=lambda p: p.priority,
+        )
 
-        # Assign slots within each tier (equal split + maxConcurrency cap + surplus cascade)
+        # Tier pools, equal split, maxConcurrency cap + surplus cascade, rounding
         allocations = self._assign_within_tiers(
-            tier_clients, tier_pools, weights, snapshots, settings, available
+            demand_clients, weights, snapshots, settings, available, forecasts
         )
 
         # Handle partners with 0 demand — give them the floor
@@ -137,198 +318,115 @@ class ConcurrencyAllocator:
 
         return allocations
 
-    def _compute_tier_pools(
-        self,
-        tier_clients: Dict[int, List[PartnerConfig]],
-        weights: Dict[int, int],
-        available: int,
-    ) -> Dict[int, float]:
-        active_tiers = {t for t, clients in tier_clients.items() if clients}
-        total_weight = sum(weights[t] for t in active_tiers)
-        if total_weight == 0:
-            return {1: 0.0, 2: 0.0, 3: 0.0, 4: 0.0}
-        return {
-            t: (weights[t] / total_weight) * available if t in active_tiers else 0.0
-            for t in weights
-        }
+    @staticmethod
+    def _has_demand(snap: Dict) -> bool:
+        remaining = snap.get("remainingCalls", 0)
+        raw_paused = snap.get("pauseAllCampaigns", False)
+        paused = raw_paused if isinstance(raw_paused, bool) else str(raw_paused).strip().lower() in ("1", "true", "yes")
+        return remaining > 0 and not paused
 
     def _assign_within_tiers(
         self,
-        tier_clients: Dict[int, List[PartnerConfig]],
-        tier_pools: Dict[int, float],
-        weights: Dict[int, int],
+        clients: List[PartnerConfig],
+        weights: np.ndarray,
         snapshots: Dict,
         settings: ConcurrencyAllocationSettings,
         available: int,
+        forecasts: Optional[Dict[str, float]] = None,
     ) -> List[AllocationRunEntry]:
-        # Build mutable allocation map: partner_id -> float slots
-        alloc: Dict[str, float] = {}
-        partner_map: Dict[str, PartnerConfig] = {}
-
-        for tier, clients in tier_clients.items():
-            if not clients:
-                continue
-            pool = tier_pools[tier]
-            per_client = pool / len(clients)
-
-            for p in clients:
-                partner_map[p.id] = p
-                alloc[p.id] = per_client
-
-        # Apply maxConcurrency caps and cascade surplus
-        alloc = self._cascade_surplus(alloc, partner_map, tier_clients, weights, tier_pools)
-
-        # Floor and distribute remainder
-        alloc = self._apply_floor_and_remainder(alloc, partner_map, snapshots)
-
-        # Build result entries
-        entries: List[AllocationRunEntry] = []
-        for pid, slots in alloc.items():
-            p = partner_map[pid]
-            snap = snapshots.get(pid, {})
-            active_calls = snap.get("activeCalls", 0)
-            queued_calls = snap.get("queuedCalls", 0)
-            raw_new_limit = active_calls + queued_calls + int(slots)
-            new_limit = max(raw_new_limit, settings.minConcurrencyPerClient)
-            new_limit = min(new_limit, p.maxConcurrency)
-
-            entries.append(
-                AllocationRunEntry(
-                    partnerId=pid,
-                    partnerName=p.partnerName,
-                    priority=p.priority,
-                    tierPool=tier_pools[p.priority],
-                    maxConcurrency=p.maxConcurrency,
-                    oldLimit=p.concurrencyLimit,
-                    newLimit=new_limit,
-                    remainingContacts=snap.get("remainingCalls", 0),
-                    activeCalls=active_calls,
-                )
-            )
-        return entries
-
-    def _cascade_surplus(
-        self,
-        alloc: Dict[str, float],
-        partner_map: Dict[str, PartnerConfig],
-        tier_clients: Dict[int, List[PartnerConfig]],
-        weights: Dict[int, int],
-        tier_pools: Dict[int, float],
-    ) -> Dict[str, float]:
         """
-        Cap allocations at maxConcurrency. Surplus cascades:
-          1. Within the same tier first (redistribute equally to uncapped clients)
-          2. Then cross-tier by weight ratio
-        Iterates until no more surplus moves.
+        Run the vectorized allocation core over `clients` (already filtered to
+        those with demand and ordered by priority) and build result entries.
+        With `forecasts`, slots go to forecast next-interval demand first.
         """
-        for _ in range(10):  # max iterations to prevent infinite loops
-            surplus = 0.0
-            capped_ids = set()
-
-            for pid, slots in alloc.items():
-                cap = partner_map[pid].maxConcurrency
-                if slots > cap:
-                    surplus += slots - cap
-                    alloc[pid] = float(cap)
-                    capped_ids.add(pid)
-
-            if surplus < 0.01:
-                break
-
-            # Step 1: redistribute within tiers
-            surplus = self._redistribute_within_tiers(
-                alloc, partner_map, tier_clients, capped_ids, surplus
+        if not clients:
+            return []
+
+        snaps = [snapshots.get(p.id, {}) for p in clients]
+        active_calls = np.array([s.get("activeCalls", 0) for s in snaps], dtype=np.int64)
+        queued_calls = np.array([s.get("queuedCalls", 0) for s in snaps], dtype=np.int64)
+        remaining = np.array([s.get("remainingCalls", 0) for s in snaps], dtype=np.int64)
+        in_flight = active_calls + queued_calls
+
+        expected = None
+        if forecasts is not None:
+            # Partners without history are assumed to hold steady
+            expected = np.array(
+                [forecasts.get(p.id, float(in_flight[i])) for i, p in enumerate(clients)],
+                dtype=float,
             )
 
-            # Step 2: redistribute cross-tier if still surplus
-            if surplus >= 0.01:
-                self._redistribute_cross_tier(
-                    alloc, partner_map, tier_clients, weights, capped_ids, surplus
-                )
-
-        return alloc
+        tier_pools, new_limits = allocate(
+            priorities=np.array([p.priority for p in clients], dtype=np.int64),
+            max_concurrency=np.array([p.maxConcurrency for p in clients], dtype=np.int64),
+            in_flight=in_flight,
+            remaining=remaining,
+            tier_weights=weights,
+            available=available,
+            min_per_client=settings.minConcurrencyPerClient,
+            expected_demand=expected,
+        )
 
-    def _redistribute_within_tiers(
-        self,
-        alloc: Dict[str, float],
-        partner_map: Dict[str, PartnerConfig],
-        tier_clients: Dict[int, List[PartnerConfig]],
-        capped_ids: set,
-        surplus: float,
-    ) -> float:
-        remaining_surplus = surplus
-        for tier, clients in tier_clients.items():
-            uncapped = [
-                p for p in clients
-                if p.id not in capped_ids and alloc.get(p.id, 0) < p.maxConcurrency
-            ]
-            if not uncapped:
-                continue
-            # Collect surplus only from this tier's capped clients
-            tier_surplus = sum(
-                0.0 for p in clients if p.id in capped_ids
+        return [
+            AllocationRunEntry(
+                partnerId=p.id,
+                partnerName=p.partnerName,
+                priority=p.priority,
+                tierPool=float(tier_pools[p.priority - 1]),
+                maxConcurrency=p.maxConcurrency,
+                oldLimit=p.concurrencyLimit,
+                newLimit=int(new_limits[i]),
+                remainingContacts=int(remaining[i]),
+                activeCalls=int(active_calls[i]),
+                forecastDemand=round(float(expected[i]), 2) if expected is not None else None,
             )
-            if tier_surplus <= 0:
-                continue
-            share = tier_surplus / len(uncapped)
-            for p in uncapped:
-                alloc[p.id] = alloc.get(p.id, 0) + share
-            remaining_surplus -= tier_surplus
-        return max(remaining_surplus, 0.0)
+            for i, p in enumerate(clients)
+        ]
 
-    def _redistribute_cross_tier(
+    def _damp_allocations(
         self,
-        alloc: Dict[str, float],
-        partner_map: Dict[str, PartnerConfig],
-        tier_clients: Dict[int, List[PartnerConfig]],
-        weights: Dict[int, int],
-        capped_ids: set,
-        surplus: float,
+        allocations: List[AllocationRunEntry],
+        settings: ConcurrencyAllocationSettings,
+        budget: int,
     ) -> None:
-        eligible: List[Tuple[int, PartnerConfig]] = [
-            (tier, p)
-            for tier, clients in tier_clients.items()
-            for p in clients
-            if p.id not in capped_ids and alloc.get(p.id, 0) < p.maxConcurrency
-        ]
-        if not eligible:
-            return
-        total_weight = sum(weights[tier] for tier, _ in eligible)
-        if total_weight == 0:
+        """
+        Apply minLimitDelta / limitCooldownSeconds / maxLimitStep to the
+        computed limits in place, keeping the sum within `budget`.
+        """
+        if not allocations or not (
+            settings.minLimitDelta or settings.limitCooldownSeconds or settings.maxLimitStep
+        ):
             return
-        for tier, p in eligible:
-            share = (weights[tier] / total_weight) * surplus
-            alloc[p.id] = alloc.get(p.id, 0) + share
-
-    def _apply_floor_and_remainder(
-        self,
-        alloc: Dict[str, float],
-        partner_map: Dict[str, PartnerConfig],
-        snapshots: Dict,
-    ) -> Dict[str, float]:
-        """Floor all allocations. Give remainder slots 1-by-1 to highest demand clients."""
-        floored = {pid: float(int(slots)) for pid, slots in alloc.items()}
-        total_floored = sum(floored.values())
-        total_raw = sum(alloc.values())
-        remainder = int(round(total_raw - total_floored))
-
-        if remainder > 0:
-            # Sort by remainingContacts DESC to assign remainder
-            sorted_ids = sorted(
-                floored.keys(),
-                key=lambda pid: snapshots.get(pid, {}).get("remainingCalls", 0),
-                reverse=True,
-            )
-            for i in range(min(remainder, len(sorted_ids))):
-                floored[sorted_ids[i]] += 1.0
 
-        return floored
+        now = datetime.now(timezone.utc)
+        cooldown = settings.limitCooldownSeconds
+        frozen = np.array(
+            [
+                cooldown > 0
+                and a.partnerId in self._last_changed
+                and (now - self._last_changed[a.partnerId]).total_seconds() < cooldown
+                for a in allocations
+            ],
+            dtype=bool,
+        )
+        damped = damp_limits(
+            old=np.array([a.oldLimit for a in allocations], dtype=np.int64),
+            target=np.array([a.newLimit for a in allocations], dtype=np.int64),
+            min_delta=settings.minLimitDelta,
+            max_step=settings.maxLimitStep,
+            frozen=frozen,
+            budget=budget,
+        )
+        for a, limit in zip(allocations, damped.tolist()):
+            if limit != a.newLimit:
+                a.targetLimit = a.newLimit
+                a.newLimit = limit
 
     # ------------------------------------------------------------------
     # Saturated path
     # ------------------------------------------------------------------
 
-    async def _apply_saturated_floor(
+    def _saturated_floor_run(
         self,
         partners: List[PartnerConfig],
         snapshots: Dict,
@@ -343,8 +441,6 @@ class ConcurrencyAllocator:
         allocations = []
         for p in partners:
             snap = snapshots.get(p.id, {})
-            new_limit = min(floor, p.maxConcurrency)
-            sync_result = await self._write_single(p, new_limit, "auto_allocation_saturated")
             allocations.append(
                 AllocationRunEntry(
                     partnerId=p.id,
@@ -353,11 +449,9 @@ class ConcurrencyAllocator:
                     tierPool=0,
                     maxConcurrency=p.maxConcurrency,
                     oldLimit=p.concurrencyLimit,
-                    newLimit=new_limit,
+                    newLimit=min(floor, p.maxConcurrency),
                     remainingContacts=snap.get("remainingCalls", 0),
                     activeCalls=snap.get("activeCalls", 0),
-                    syncedToPartner=sync_result["success"],
-                    syncError=sync_result.get("error"),
                 )
             )
         return AllocationRun(
@@ -378,24 +472,67 @@ class ConcurrencyAllocator:
         snapshots: Dict,
         allocations: List[AllocationRunEntry],
         settings: ConcurrencyAllocationSettings,
-    ) -> None:
+        reason: str = "auto_allocation",
+    ) -> int:
         alloc_map = {a.partnerId: a for a in allocations}
+        writes = []
         for p in partners:
             entry = alloc_map.get(p.id)
             new_limit = entry.newLimit if entry else settings.minConcurrencyPerClient
-            sync_result = await self._write_single(p, new_limit, "auto_allocation")
+            writes.append((p, new_limit, entry))
+        return await self._write_changed(writes, reason)
+
+    async def _write_changed(
+        self,
+        writes: List[Tuple[PartnerConfig, int, Optional[AllocationRunEntry]]],
+        reason: str,
+    ) -> int:
+        """
+        Write only the limits that actually change, WRITE_CONCURRENCY at a time,
+        then record all concurrency_history rows with one insert_many.
+        Returns the number of partners written.
+        """
+        changed = []
+        for partner, new_limit, entry in writes:
+            if new_limit == partner.concurrencyLimit:
+                # Already at this limit (synced from the partner DB every fetch)
+                if entry:
+                    entry.syncedToPartner = True
+                continue
+            changed.append((partner, new_limit, entry))
+
+        if not changed:
+            return 0
+
+        semaphore = asyncio.Semaphore(WRITE_CONCURRENCY)
+
+        async def write_with_limit(partner: PartnerConfig, new_limit: int) -> dict:
+            async with semaphore:
+                return await self._write_single(partner, new_limit, reason)
+
+        results = await asyncio.gather(
+            *[write_with_limit(p, new_limit) for p, new_limit, _ in changed]
+        )
+
+        changed_at = datetime.now(timezone.utc)
+        for (partner, _, entry), sync_result in zip(changed, results):
+            if sync_result["success"]:
+                self._last_changed[partner.id] = changed_at
             if entry:
                 entry.syncedToPartner = sync_result["success"]
                 entry.syncError = sync_result.get("error")
 
+        await self._save_history(
+            [(p, new_limit, sync_result) for (p, new_limit, _), sync_result in zip(changed, results)],
+            reason,
+        )
+        return len(changed)
+
     async def _write_single(
         self, partner: PartnerConfig, new_limit: int, reason: str
     ) -> dict:
         """Write new limit to MongoDB + partner MySQL. Returns sync result dict."""
-        sync_result = {"success": False, "error": "write not attempted"}
         try:
-            old_limit = partner.concurrencyLimit
-
             # Update admin MongoDB
             await self.db.partner_configs.update_one(
                 {"id": partner.id},
@@ -407,77 +544,63 @@ class ConcurrencyAllocator:
                 },
             )
 
-            # Log to concurrency history
-            history_id = str(uuid.uuid4())
-            history = ConcurrencyHistory(
-                id=history_id,
-                partnerId=partner.id,
-                oldLimit=old_limit,
-                newLimit=new_limit,
-                reason=reason,
-                changedBy="auto_allocator",
-            )
-            history_dict = history.model_dump()
-            history_dict["changedAt"] = history_dict["changedAt"].isoformat()
-            await self.db.concurrency_history.insert_one(history_dict)
-
             # Sync to partner MySQL via SSH
-            sync_result = await self._sync_to_partner_db(partner, new_limit, old_limit)
-
-            # Update history record with sync outcome
-            await self.db.concurrency_history.update_one(
-                {"id": history_id},
-                {
-                    "$set": {
-                        "syncedToPartner": sync_result["success"],
-                        "syncError": sync_result.get("error"),
-                        "syncedAt": datetime.now(timezone.utc).isoformat() if sync_result["success"] else None,
-                    }
-                },
-            )
+            return await self._sync_to_partner_db(partner, new_limit)
 
         except Exception as e:
             logger.error(
                 f"Failed to write concurrency limit for {partner.partnerName}: {e}"
             )
-            sync_result = {"success": False, "error": str(e)}
+            return {"success": False, "error": str(e)}
 
-        return sync_result
+    async def _save_history(
+        self, written: List[Tuple[PartnerConfig, int, dict]], reason: str
+    ) -> None:
+        """Record one concurrency_history row per written partner, in a single insert."""
+        try:
+            docs = []
+            for partner, new_limit, sync_result in written:
+                history = ConcurrencyHistory(
+                    partnerId=partner.id,
+                    oldLimit=partner.concurrencyLimit,
+                    newLimit=new_limit,
+                    reason=reason,
+                    changedBy="auto_allocator",
+                    syncedToPartner=sync_result["success"],
+                    syncError=sync_result.get("error"),
+                )
+                history_dict = history.model_dump()
+                history_dict["changedAt"] = history_dict["changedAt"].isoformat()
+                history_dict["syncedAt"] = history_dict["changedAt"] if sync_result["success"] else None
+                docs.append(history_dict)
+            await self.db.concurrency_history.insert_many(docs)
+        except Exception as e:
+            logger.error(f"Failed to save concurrency history: {e}")
 
     async def _sync_to_partner_db(
-        self, partner: PartnerConfig, new_limit: int, old_limit: int
+        self, partner: PartnerConfig, new_limit: int
     ) -> dict:
-        """Sync concurrency limit to partner MySQL. Returns {success, error}."""
+        """Sync concurrency limit to partner MySQL in one tunnel/transaction. Returns {success, error}."""
         try:
-            # First verify the setting row exists
-            check_query = "SELECT value FROM settings WHERE name = 'callConcurrency'"
-            rows = await self.ssh_service.execute_query(partner, check_query)
-            if not rows:
+            result = await self.ssh_service.update_setting_with_audit(
+                partner, "callConcurrency", new_limit
+            )
+            if not result["exists"]:
                 msg = f"callConcurrency setting does not exist in {partner.partnerName}"
                 logger.warning(msg)
                 return {"success": False, "error": msg}
 
-            current_value = int(rows[0].get("value", 0))
-            if current_value == new_limit:
+            if not result["updated"]:
                 logger.info(
                     f"Concurrency already {new_limit} in {partner.partnerName}, no update needed"
                 )
                 return {"success": True}
 
-            update_query = "UPDATE settings SET value = %s WHERE name = 'callConcurrency'"
-            await self.ssh_service.execute_update(
-                partner, update_query, (new_limit,)
-            )
-            try:
-                audit_query = (
-                    "INSERT INTO settings_auditlogs (userid, oldvalue, newvalue, createdat) "
-                    "VALUES (9999999999, %s, %s, NOW())"
+            if result["auditError"]:
+                # audit log failure is non-fatal
+                logger.warning(
+                    f"Audit log failed for {partner.partnerName}: {result['auditError']}"
                 )
-                await self.ssh_service.execute_update(
-                    partner, audit_query, (old_limit, new_limit)
-                )
-            except Exception:
-                pass  # audit log failure is non-fatal
             logger.info(
                 f"Synced concurrency {new_limit} to partner {partner.partnerName}"
             )
@@ -507,6 +630,7 @@ class ConcurrencyAllocator:
             {"$set": {"key": SETTINGS_KEY, "value": settings.model_dump()}},
             upsert=True,
         )
+        self._settings = settings
 
     # ------------------------------------------------------------------
     # Data loaders
@@ -515,7 +639,7 @@ class ConcurrencyAllocator:
     async def _load_active_partners(self) -> List[PartnerConfig]:
         docs = await self.db.partner_configs.find(
             {"isActive": True}, {"_id": 0}
-        ).to_list(1000)
+        ).to_list(None)
         return [PartnerConfig(**d) for d in docs]
 
     async def _load_latest_snapshots(self, partner_ids: List[str]) -> Dict:
@@ -530,6 +654,40 @@ class ConcurrencyAllocator:
             snapshots[pid] = doc or {}
         return snapshots
 
+    async def _forecast_demand(
+        self, partners: List[PartnerConfig], settings: ConcurrencyAllocationSettings
+    ) -> Optional[Dict[str, float]]:
+        """Forecast next-interval in-flight calls per partner; None if history can't be loaded."""
+        try:
+            history = await self._load_snapshot_history(
+                [p.id for p in partners], settings.forecastWindow
+            )
+            return forecast_demand(history, settings.forecastAlpha)
+        except Exception as e:
+            logger.warning(f"Demand forecast unavailable, allocating on current demand: {e}")
+            return None
+
+    async def _load_snapshot_history(
+        self, partner_ids: List[str], window: int
+    ) -> Dict[str, List[Dict]]:
+        """
+        Returns dict of partner_id -> last `window` snapshots, oldest first.
+
+        One query per partner (concurrently, on the partnerId/snapshotTime
+        index), so partners that sync often cannot crowd out sparse ones.
+        """
+        async def load(pid: str) -> List[Dict]:
+            docs = await self.db.dashboard_snapshots.find(
+                {"partnerId": pid},
+                {"_id": 0, "partnerId": 1, "snapshotTime": 1, "activeCalls": 1,
+                 "queuedCalls": 1, "completedCallsToday": 1},
+            ).sort("snapshotTime", -1).limit(window).to_list(None)
+            docs.reverse()
+            return docs
+
+        results = await asyncio.gather(*(load(pid) for pid in partner_ids))
+        return dict(zip(partner_ids, results))
+
     async def _save_run(self, run: AllocationRun) -> None:
         try:
             run_dict = run.model_dump()
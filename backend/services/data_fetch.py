@@ -1,22 +1,31 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import logging
 import asyncio
 from typing import List
 from models import PartnerConfig, DashboardSnapshot, AlertLevel, SyncStatus
 from services.ssh_connection import SSHConnectionService
-from services.alert import AlertService
+from services.alert import ALERT_STATE_RECONCILE_SECONDS, AlertService
+from services.alert_rules import AlertRuleEngine
 import time
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# A partner is stale when its newest snapshot is older than this
+STALE_SNAPSHOT_MINUTES = 10
+# Stale checks closer together than this are skipped
+STALE_CHECK_MIN_INTERVAL_SECONDS = 60
+
 class DataFetchService:
     def __init__(self, db, ssh_service: SSHConnectionService, alert_service: AlertService, allocator=None):
         self.db = db
         self.ssh_service = ssh_service
         self.alert_service = alert_service
         self.allocator = allocator
+        self.alert_rules = AlertRuleEngine(db)
+        self._allocation_tasks = set()
+        self._stale_check_at = None
         self.scheduler = AsyncIOScheduler()
         self.is_running = False
     
@@ -58,6 +67,15 @@ class DataFetchService:
                 id='stale_data_check',
                 replace_existing=True
             )
+
+            # Pick up alerts dismissed or edited outside AlertService
+            self.scheduler.add_job(
+                self.alert_service.reconcile_alert_state,
+                'interval',
+                seconds=ALERT_STATE_RECONCILE_SECONDS,
+                id='alert_state_reconcile',
+                replace_existing=True
+            )
     
     def stop_scheduler(self):
         """Stop scheduler"""
@@ -71,6 +89,12 @@ class DataFetchService:
         try:
             partners = await self.db.partner_configs.find({"isActive": True}, {"_id": 0}).to_list(1000)
             logger.info(f"Fetching data for {len(partners)} partners")
+
+            # Pick up threshold changes once per cycle; keep the previous rules on error
+            try:
+                await self.alert_rules.refresh()
+            except Exception as e:
+                logger.error(f"Failed to load alert thresholds: {e}")
             
             tasks = []
             for partner in partners:
@@ -94,6 +118,9 @@ class DataFetchService:
                 await self._create_sync_summary_alert(failed_names, len(partners))
                 logger.warning(f"Failed partners: {failed_names}")
             
+            # One email for all critical alerts raised this cycle
+            await self.alert_service.flush_digest()
+
             # Check for stale data
             await self._check_stale_snapshots()
             
@@ -129,7 +156,11 @@ class DataFetchService:
                 utilization = (metrics['activeCalls'] / partner.concurrencyLimit * 100) if partner.concurrencyLimit > 0 else 0
                 
                 # Determine alert level
-                alert_level, alert_message = self._calculate_alert_level(metrics, partner.concurrencyLimit, utilization)
+                alert_level, alert_message, alert_rule = self.alert_rules.evaluate({
+                    **metrics,
+                    "concurrencyLimit": partner.concurrencyLimit,
+                    "utilization": utilization,
+                })
                 
                 # Create snapshot with EST timestamp
                 utc_now = datetime.now(timezone.utc)
@@ -150,6 +181,7 @@ class DataFetchService:
                     utilizationPercent=round(utilization, 2),
                     alertLevel=alert_level,
                     alertMessage=alert_message,
+                    alertRule=alert_rule,
                     snapshotTime=utc_now,
                     snapshotTimeEST=est_now,
                     dataFetchTimeMs=int((time.time() - start_time) * 1000)
@@ -164,6 +196,10 @@ class DataFetchService:
                 
                 # Generate alerts
                 await self.alert_service.generate_alert(partner, snapshot)
+
+                # Re-balance this partner's tier without waiting for the whole sync pass
+                if self.allocator:
+                    self._trigger_incremental_allocation(partner.id, snapshot_dict)
                 
                 # Update partner sync status and reset failure counter
                 await self.db.partner_configs.update_one(
@@ -214,6 +250,18 @@ class DataFetchService:
             
             return None
     
+    def _trigger_incremental_allocation(self, partner_id: str, snapshot: dict):
+        """Run the allocator's incremental pass in the background (it serializes itself)."""
+        task = asyncio.create_task(self._run_incremental_allocation(partner_id, snapshot))
+        self._allocation_tasks.add(task)
+        task.add_done_callback(self._allocation_tasks.discard)
+
+    async def _run_incremental_allocation(self, partner_id: str, snapshot: dict):
+        try:
+            await self.allocator.on_snapshot(partner_id, snapshot)
+        except Exception as alloc_err:
+            logger.error(f"Incremental allocation failed for {partner_id}: {alloc_err}")
+
     async def _fetch_partner_metrics_real(self, partner: PartnerConfig):
         """Fetch REAL data from partner MySQL database via SSH tunnel"""
         try:
@@ -390,42 +438,6 @@ class DataFetchService:
             logger.error(traceback.format_exc())
             return None
     
-    def _calculate_alert_level(self, metrics: dict, concurrency_limit: int, utilization: float) -> tuple:
-        """Calculate alert level based on metrics"""
-        queued = metrics['queuedCalls']
-        active = metrics['activeCalls']
-        running = metrics['runningCampaigns']
-        
-        # Critical alerts
-        if queued > 200 and utilization < 30:
-            return AlertLevel.CRITICAL, f"High queue ({queued}) with low utilization ({utilization:.1f}%)"
-        if active >= concurrency_limit and queued > 100:
-            return AlertLevel.CRITICAL, f"At max capacity with {queued} calls queued"
-        if running > 50 and concurrency_limit < 10:
-            return AlertLevel.CRITICAL, f"{running} campaigns running with only {concurrency_limit} concurrent slots"
-        
-        # High priority alerts
-        if 100 <= queued <= 200 and utilization < 40:
-            return AlertLevel.HIGH, f"Growing queue ({queued}) with low utilization ({utilization:.1f}%)"
-        if 30 <= running <= 50 and concurrency_limit < 15:
-            return AlertLevel.HIGH, f"{running} campaigns with limited concurrency ({concurrency_limit})"
-        
-        # Medium priority alerts
-        if 50 <= queued <= 100 and 40 <= utilization <= 60:
-            return AlertLevel.MEDIUM, f"Moderate queue ({queued}) and utilization ({utilization:.1f}%)"
-        if 15 <= running <= 30 and concurrency_limit < 20:
-            return AlertLevel.MEDIUM, f"{running} campaigns, consider increasing concurrency"
-        
-        # Idle state
-        if running == 0 and active == 0 and queued == 0:
-            return AlertLevel.IDLE, "No active campaigns"
-        
-        # Normal
-        if utilization > 60 or queued < 50:
-            return AlertLevel.NORMAL, "Operating normally"
-        
-        return AlertLevel.NORMAL, "All metrics within normal range"
-    
     async def _create_partner_failure_alert(self, partner_name, error_msg):
         """Create alert for persistent partner failures"""
         try:
@@ -496,27 +508,38 @@ class DataFetchService:
     
     async def _check_stale_snapshots(self):
         """Check for stale partner data"""
+        # Runs on its own schedule and after every sync; one check per window is enough
+        now = time.monotonic()
+        if self._stale_check_at is not None and now - self._stale_check_at < STALE_CHECK_MIN_INTERVAL_SECONDS:
+            return
+        self._stale_check_at = now
+
         try:
-            from datetime import timedelta
-            
-            cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=10)
-            partners = await self.db.partner_configs.find({"isActive": True}, {"id": 1, "partnerName": 1, "_id": 0}).to_list(1000)
-            
-            stale_partners = []
-            for partner in partners:
-                snapshot = await self.db.dashboard_snapshots.find_one(
-                    {"partnerId": partner["id"]},
-                    {"snapshotTime": 1, "_id": 0},
-                    sort=[("snapshotTime", -1)]
-                )
-                
-                if not snapshot:
-                    stale_partners.append(partner["partnerName"])
-                else:
-                    snapshot_time = datetime.fromisoformat(snapshot["snapshotTime"].replace('Z', '+00:00'))
-                    if snapshot_time < cutoff_time:
-                        stale_partners.append(partner["partnerName"])
-            
+            cutoff = (datetime.now(timezone.utc) - timedelta(minutes=STALE_SNAPSHOT_MINUTES)).isoformat()
+
+            # Active partners whose newest snapshot is missing or older than the
+            # cutoff, in one query (uses the partnerId/snapshotTime index)
+            stale = await self.db.partner_configs.aggregate([
+                {"$match": {"isActive": True}},
+                {"$lookup": {
+                    "from": "dashboard_snapshots",
+                    "let": {"pid": "$id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$partnerId", "$$pid"]}}},
+                        {"$sort": {"snapshotTime": -1}},
+                        {"$limit": 1},
+                        {"$project": {"_id": 0, "snapshotTime": 1}},
+                    ],
+                    "as": "latest",
+                }},
+                {"$match": {"$or": [
+                    {"latest": {"$size": 0}},
+                    {"latest.0.snapshotTime": {"$lt": cutoff}},
+                ]}},
+                {"$project": {"_id": 0, "partnerName": 1}},
+            ]).to_list(None)
+
+            stale_partners = [p["partnerName"] for p in stale]
             if stale_partners:
                 await self._create_stale_alert(stale_partners)
         
@@ -532,7 +555,7 @@ class DataFetchService:
                 partnerId="SYSTEM",
                 partnerName="System",
                 alertLevel=AlertLevel.MEDIUM,
-                alertMessage=f"Stale data detected: {', '.join(stale_partners)} (no updates >10min)",
+                alertMessage=f"Stale data detected: {', '.join(stale_partners)} (no updates >{STALE_SNAPSHOT_MINUTES}min)",
                 createdAt=datetime.now(timezone.utc),
                 isResolved=False,
                 isDismissed=False
@@ -0,0 +1,54 @@
+"""
+Next-interval demand forecast for the concurrency allocator.
+
+Per partner, from its recent dashboard snapshots (oldest first):
+  arrivals_t    = max(inFlight_t - inFlight_{t-1} + completed_t, 0)
+  completions_t = completedCallsToday_t - completedCallsToday_{t-1}
+                  (the raw counter when it resets at midnight)
+Both rates are smoothed with an exponentially weighted moving average, and
+  forecast = max(inFlight_now + ewma(arrivals) - ewma(completions), 0)
+where inFlight = activeCalls + queuedCalls.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def forecast_demand(history: Dict[str, List[Dict]], alpha: float) -> Dict[str, float]:
+    """Return partnerId -> forecast in-flight calls for the next interval."""
+    ids = [pid for pid, snaps in history.items() if snaps]
+    if not ids:
+        return {}
+
+    depth = max(len(snaps) for snaps in history.values())
+    in_flight = np.zeros((len(ids), depth))
+    completed = np.zeros((len(ids), depth))
+    valid = np.zeros((len(ids), depth), dtype=bool)
+
+    # Right-align each partner's history so column -1 is the latest snapshot
+    for row, pid in enumerate(ids):
+        snaps = history[pid]
+        offset = depth - len(snaps)
+        for col, snap in enumerate(snaps, start=offset):
+            in_flight[row, col] = snap.get("activeCalls", 0) + snap.get("queuedCalls", 0)
+            completed[row, col] = snap.get("completedCallsToday", 0) or 0
+            valid[row, col] = True
+
+    arrivals_ewma = np.zeros(len(ids))
+    completions_ewma = np.zeros(len(ids))
+    seen = np.zeros(len(ids), dtype=bool)
+
+    for col in range(1, depth):
+        step = valid[:, col] & valid[:, col - 1]
+        done = completed[:, col] - completed[:, col - 1]
+        done = np.where(done < 0, completed[:, col], done)
+        arrived = np.maximum(in_flight[:, col] - in_flight[:, col - 1] + done, 0.0)
+
+        # First observed step seeds the average instead of decaying from 0
+        weight = np.where(seen, alpha, 1.0)
+        arrivals_ewma = np.where(step, weight * arrived + (1 - weight) * arrivals_ewma, arrivals_ewma)
+        completions_ewma = np.where(step, weight * done + (1 - weight) * completions_ewma, completions_ewma)
+        seen |= step
+
+    forecast = np.maximum(in_flight[:, -1] + arrivals_ewma - completions_ewma, 0.0)
+    return {pid: float(forecast[row]) for row, pid in enumerate(ids)}
@@ -0,0 +1,215 @@
+"""
+Persistent email outbox with background senders.
+
+enqueue() stores a message in `email_outbox` and returns at once; API
+handlers and the sync loop never wait on SMTP. Sender tasks claim due
+messages in batches and send each batch over one pooled, authenticated SMTP
+connection (EmailService.send_messages) in a worker thread.
+
+Message states: pending -> sending -> sent, or back to pending with
+exponential backoff on failure, and failed after MAX_ATTEMPTS. Each claim
+carries a token and a `claimedAt` time, and results are only recorded under
+the token that claimed the message. Messages whose claim is older than
+SENDING_LEASE_SECONDS belong to a process that died mid-send and go back to
+pending; messages other live processes are sending are left alone.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from services.email_service import SMTP_POOL_SIZE, EmailService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 30  # 30s, 1m, 2m, 4m, 8m between attempts
+IDLE_POLL_SECONDS = 5
+# Well above the time one batch can spend in SMTP timeouts and retries
+SENDING_LEASE_SECONDS = int(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", "600"))
+RECOVERY_INTERVAL_SECONDS = 60
+
+
+class EmailOutbox:
+    def __init__(
+        self, db, email_service: EmailService,
+        senders: int = SMTP_POOL_SIZE, batch_size: int = BATCH_SIZE,
+    ):
+        self.db = db
+        self.email_service = email_service
+        self.senders = max(senders, 1)
+        self.batch_size = max(batch_size, 1)
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._recovered_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        await self.db.email_outbox.create_index([("status", 1), ("nextAttemptAt", 1)])
+        await self.db.email_outbox.create_index([("status", 1), ("claimedAt", 1)])
+        await self._recover_stale()
+        pending = await self.db.email_outbox.count_documents({"status": "pending"})
+        if pending:
+            logger.info(f"Email outbox resuming with {pending} pending messages")
+        self._tasks = [asyncio.create_task(self._sender(i)) for i in range(self.senders)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.email_service.close_smtp_pool)
+
+    async def _recover_stale(self) -> None:
+        """Return messages whose sending claim outlived SENDING_LEASE_SECONDS to pending."""
+        self._recovered_at = time.monotonic()
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=SENDING_LEASE_SECONDS)).isoformat()
+        await self.db.email_outbox.update_many(
+            {"status": "sending", "claimedAt": {"$lt": cutoff}},
+            {"$set": {"status": "pending", "claim": None}},
+        )
+
+    # ------------------------------------------------------------------
+    # Enqueue
+    # ------------------------------------------------------------------
+
+    async def enqueue(
+        self,
+        to_addresses: List[str],
+        subject: str,
+        html_body: str,
+        text_body: str,
+        cc_addresses: Optional[List[str]] = None,
+        attachments: Optional[List[Tuple[str, Any, str]]] = None,
+        category: str = "email",
+    ) -> str:
+        """Store a message for the senders.
+
+        Attachment content is bytes or an open binary file, which is read from
+        its current position straight into the stored document.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        message_id = str(uuid.uuid4())
+        await self.db.email_outbox.insert_one({
+            "id": message_id,
+            "category": category,
+            "toAddresses": list(to_addresses),
+            "ccAddresses": list(cc_addresses or []),
+            "subject": subject,
+            "htmlBody": html_body,
+            "textBody": text_body,
+            "attachments": [
+                {
+                    "filename": name,
+                    "content": content.read() if hasattr(content, "read") else content,
+                    "mimeType": mime,
+                }
+                for name, content, mime in attachments or []
+            ],
+            "status": "pending",
+            "attempts": 0,
+            "lastError": None,
+            "createdAt": now,
+            "nextAttemptAt": now,
+            "sentAt": None,
+            "claim": None,
+            "claimedAt": None,
+        })
+        logger.info(f"Queued {category} email {message_id}: {subject[:80]}")
+        self._wakeup.set()
+        return message_id
+
+    # ------------------------------------------------------------------
+    # Senders
+    # ------------------------------------------------------------------
+
+    async def _sender(self, index: int) -> None:
+        while True:
+            try:
+                self._wakeup.clear()
+                batch = await self._claim_batch()
+                if not batch:
+                    if time.monotonic() - self._recovered_at >= RECOVERY_INTERVAL_SECONDS:
+                        await self._recover_stale()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=IDLE_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._send_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email outbox sender {index} error: {e}")
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        now = datetime.now(timezone.utc).isoformat()
+        claim = str(uuid.uuid4())
+        while len(batch) < self.batch_size:
+            doc = await self.db.email_outbox.find_one_and_update(
+                {"status": "pending", "nextAttemptAt": {"$lte": now}},
+                {"$set": {"status": "sending", "claim": claim, "claimedAt": now}, "$inc": {"attempts": 1}},
+                projection={"_id": 0},
+                sort=[("nextAttemptAt", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if not doc:
+                break
+            batch.append(doc)
+        return batch
+
+    async def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        messages = [
+            {
+                "to_addresses": doc["toAddresses"],
+                "subject": doc["subject"],
+                "html_body": doc["htmlBody"],
+                "text_body": doc["textBody"],
+                "cc_addresses": doc.get("ccAddresses") or None,
+                "attachments": [
+                    (a["filename"], bytes(a["content"]), a["mimeType"]) for a in doc.get("attachments") or []
+                ] or None,
+            }
+            for doc in batch
+        ]
+        errors = await asyncio.to_thread(self.email_service.send_messages, messages)
+
+        sent = 0
+        for doc, error in zip(batch, errors):
+            if error is None:
+                sent += 1
+            await self._record_result(doc, error)
+        logger.info(f"Email outbox sent {sent}/{len(batch)} messages")
+
+    async def _record_result(self, doc: Dict[str, Any], error: Optional[str]) -> None:
+        now = datetime.now(timezone.utc)
+        if error is None:
+            # Attachments can be large; keep only the delivery record
+            update = {
+                "status": "sent", "sentAt": now.isoformat(), "lastError": None, "attachments": [], "claim": None,
+            }
+        elif doc["attempts"] >= MAX_ATTEMPTS:
+            logger.error(f"Email {doc['id']} failed after {doc['attempts']} attempts: {error}")
+            update = {"status": "failed", "lastError": error, "claim": None}
+        else:
+            delay = RETRY_BASE_SECONDS * 2 ** (doc["attempts"] - 1)
+            logger.warning(f"Email {doc['id']} attempt {doc['attempts']} failed, retrying in {delay}s: {error}")
+            update = {
+                "status": "pending",
+                "lastError": error,
+                "claim": None,
+                "nextAttemptAt": (now + timedelta(seconds=delay)).isoformat(),
+            }
+        # A message reclaimed after its lease expired is no longer ours to update
+        await self.db.email_outbox.update_one({"id": doc["id"], "claim": doc["claim"]}, {"$set": update})
@@ -1,6 +1,7 @@
 import smtplib
 import ssl
 import asyncio
+import threading
 import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -10,8 +11,16 @@ import os
 import logging
 from typing import Dict, Any, List, Optional, Tuple
 
+from services.qa_report import MAX_ATTACHMENT_BYTES, build_qa_report, upload_qa_report
+
 logger = logging.getLogger(__name__)
 
+# Authenticated SMTP connections kept open between sends
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '2'))
+# Idle connections older than this are closed instead of reused (SES drops them)
+SMTP_IDLE_SECONDS = 60
+
+
 class EmailService:
     def __init__(self):
         self.smtp_host = os.environ.get('SMTP_HOST', 'email-smtp.us-east-1.amazonaws.com')
@@ -20,6 +29,146 @@ class EmailService:
         self.smtp_password = os.environ.get('SMTP_PASSWORD', '')
         self.from_email = os.environ.get('SMTP_FROM_EMAIL', 'noreply@jobtalk.com')
         self.app_name = os.environ.get('APP_NAME', 'JobTalk')
+        # Set by EmailOutbox; when present, alert and report emails are queued
+        # instead of sent inline
+        self.outbox = None
+        # Set at startup: where oversized QA reports are uploaded (S3Service and
+        # the report bucket's s3Config)
+        self.s3_service = None
+        self.report_s3_config: Optional[Dict[str, Any]] = None
+        self._smtp_idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._smtp_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # SMTP connection pool (blocking; call from a worker thread)
+    # ------------------------------------------------------------------
+
+    def _open_smtp(self) -> smtplib.SMTP:
+        context = ssl.create_default_context()
+        t0 = time.time()
+        if self.smtp_port == 465:
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context)
+        else:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+            server.starttls(context=context)
+        server.login(self.smtp_username, self.smtp_password)
+        logger.info(f"[EMAIL] SMTP connection to {self.smtp_host}:{self.smtp_port} opened in {time.time() - t0:.3f}s")
+        return server
+
+    def _checkout_smtp(self) -> smtplib.SMTP:
+        """Reuse the most recently returned live connection, or open a new one."""
+        while True:
+            with self._smtp_lock:
+                if not self._smtp_idle:
+                    break
+                server, returned_at = self._smtp_idle.pop()
+            if time.monotonic() - returned_at > SMTP_IDLE_SECONDS:
+                self._discard_smtp(server)
+                continue
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard_smtp(server)
+        return self._open_smtp()
+
+    def _checkin_smtp(self, server: smtplib.SMTP) -> None:
+        with self._smtp_lock:
+            if len(self._smtp_idle) < SMTP_POOL_SIZE:
+                self._smtp_idle.append((server, time.monotonic()))
+                return
+        self._discard_smtp(server)
+
+    @staticmethod
+    def _discard_smtp(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def close_smtp_pool(self) -> None:
+        with self._smtp_lock:
+            idle, self._smtp_idle = self._smtp_idle, []
+        for server, _ in idle:
+            self._discard_smtp(server)
+
+    def _build_message(
+        self,
+        to_addresses: List[str],
+        subject: str,
+        html_body: str,
+        text_body: str,
+        cc_addresses: Optional[List[str]] = None,
+        attachments: Optional[List[Tuple[str, bytes, str]]] = None,
+    ) -> Tuple[str, List[str]]:
+        """Return (MIME message text, all recipients)."""
+        if attachments:
+            # mixed: body + attachments at top level
+            msg = MIMEMultipart('mixed')
+            body_part = MIMEMultipart('alternative')
+            body_part.attach(MIMEText(text_body, 'plain'))
+            body_part.attach(MIMEText(html_body, 'html'))
+            msg.attach(body_part)
+
+            for filename, content, mime_type in attachments:
+                maintype, subtype = mime_type.split('/', 1)
+                part = MIMEBase(maintype, subtype)
+                part.set_payload(content)
+                encoders.encode_base64(part)
+                part.add_header('Content-Disposition', 'attachment', filename=filename)
+                msg.attach(part)
+        else:
+            msg = MIMEMultipart('alternative')
+            msg.attach(MIMEText(text_body, 'plain'))
+            msg.attach(MIMEText(html_body, 'html'))
+
+        msg['Subject'] = subject
+        msg['From'] = self.from_email
+        msg['To'] = ', '.join(to_addresses)
+        if cc_addresses:
+            msg['Cc'] = ', '.join(cc_addresses)
+
+        all_recipients = list(to_addresses)
+        if cc_addresses:
+            all_recipients.extend(cc_addresses)
+        return msg.as_string(), all_recipients
+
+    def send_messages(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Send several messages over one pooled connection.
+
+        Each message is a dict of send_email's arguments (to_addresses,
+        subject, html_body, text_body, cc_addresses, attachments). Returns one
+        entry per message: None when sent, otherwise the error text. If the
+        connection breaks, that message and the rest of the batch fail.
+        """
+        errors: List[Optional[str]] = []
+        try:
+            server = self._checkout_smtp()
+        except Exception as e:
+            logger.error(f"[EMAIL] SMTP connect failed: {type(e).__name__}: {e}")
+            return [f"{type(e).__name__}: {e}"] * len(messages)
+
+        healthy = True
+        for i, message in enumerate(messages):
+            try:
+                body, recipients = self._build_message(**message)
+                server.sendmail(self.from_email, recipients, body)
+                errors.append(None)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                # Rejected message; the connection is still usable
+                errors.append(f"{type(e).__name__}: {e}")
+            except Exception as e:
+                healthy = False
+                error = f"{type(e).__name__}: {e}"
+                errors.extend([error] * (len(messages) - i))
+                break
+
+        if healthy:
+            self._checkin_smtp(server)
+        else:
+            self._discard_smtp(server)
+        return errors
 
     def send_email(
         self,
@@ -30,86 +179,47 @@ class EmailService:
         cc_addresses: Optional[List[str]] = None,
         attachments: Optional[List[Tuple[str, bytes, str]]] = None,
     ) -> bool:
-        """Send email via SES SMTP.
+        """Send email via SES SMTP, reusing a pooled connection.
 
         attachments: list of (filename, content_bytes, mime_type) tuples, e.g.
                      [("report.csv", b"id,name\\n1,John", "text/csv")]
         """
         t_start = time.time()
-        logger.info(f"[QA-EMAIL] ====== send_email START ======")
         logger.info(f"[QA-EMAIL] To: {to_addresses}, CC: {cc_addresses}, Subject: {subject[:80]}")
-        logger.info(f"[QA-EMAIL] SMTP config: host={self.smtp_host}, port={self.smtp_port}, from={self.from_email}")
-        try:
-            t0 = time.time()
-
-            if attachments:
-                # mixed: body + attachments at top level
-                msg = MIMEMultipart('mixed')
-                body_part = MIMEMultipart('alternative')
-                body_part.attach(MIMEText(text_body, 'plain'))
-                body_part.attach(MIMEText(html_body, 'html'))
-                msg.attach(body_part)
-
-                for filename, content, mime_type in attachments:
-                    maintype, subtype = mime_type.split('/', 1)
-                    part = MIMEBase(maintype, subtype)
-                    part.set_payload(content)
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', 'attachment', filename=filename)
-                    msg.attach(part)
-            else:
-                msg = MIMEMultipart('alternative')
-                msg.attach(MIMEText(text_body, 'plain'))
-                msg.attach(MIMEText(html_body, 'html'))
-
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = ', '.join(to_addresses)
-            if cc_addresses:
-                msg['Cc'] = ', '.join(cc_addresses)
-
-            all_recipients = list(to_addresses)
-            if cc_addresses:
-                all_recipients.extend(cc_addresses)
-            logger.info(f"[QA-EMAIL] Message built in {time.time() - t0:.3f}s | HTML size: {len(html_body)} chars")
-
-            context = ssl.create_default_context()
-
-            t1 = time.time()
-            if self.smtp_port == 465:
-                logger.info(f"[QA-EMAIL] Connecting via SMTP_SSL (port 465) to {self.smtp_host} ...")
-                server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context)
-                logger.info(f"[QA-EMAIL] SMTP_SSL connect done in {time.time() - t1:.3f}s")
-            else:
-                logger.info(f"[QA-EMAIL] Connecting via SMTP + STARTTLS (port {self.smtp_port}) to {self.smtp_host} ...")
-                server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-                logger.info(f"[QA-EMAIL] SMTP connect done in {time.time() - t1:.3f}s")
-
-                t2 = time.time()
-                server.starttls(context=context)
-                logger.info(f"[QA-EMAIL] STARTTLS done in {time.time() - t2:.3f}s")
-
-            t3 = time.time()
-            server.login(self.smtp_username, self.smtp_password)
-            logger.info(f"[QA-EMAIL] Login done in {time.time() - t3:.3f}s")
-
-            t4 = time.time()
-            server.sendmail(self.from_email, all_recipients, msg.as_string())
-            logger.info(f"[QA-EMAIL] sendmail done in {time.time() - t4:.3f}s | recipients: {len(all_recipients)}")
-
-            t5 = time.time()
-            server.quit()
-            logger.info(f"[QA-EMAIL] SMTP quit done in {time.time() - t5:.3f}s")
+        error = self.send_messages([{
+            "to_addresses": to_addresses,
+            "subject": subject,
+            "html_body": html_body,
+            "text_body": text_body,
+            "cc_addresses": cc_addresses,
+            "attachments": attachments,
+        }])[0]
+        total = time.time() - t_start
+        if error:
+            logger.error(f"[QA-EMAIL] send_email FAILED after {total:.3f}s: {error}")
+            return False
+        logger.info(f"[QA-EMAIL] send_email SUCCESS in {total:.3f}s")
+        return True
 
-            total = time.time() - t_start
-            logger.info(f"[QA-EMAIL] ====== send_email SUCCESS in {total:.3f}s ======")
+    async def _deliver(
+        self,
+        to_addresses: List[str],
+        subject: str,
+        html_body: str,
+        text_body: str,
+        cc_addresses: Optional[List[str]] = None,
+        attachments: Optional[List[Tuple[str, bytes, str]]] = None,
+        category: str = "email",
+    ) -> bool:
+        """Queue through the outbox when one is attached, else send in a worker thread."""
+        if self.outbox is not None:
+            await self.outbox.enqueue(
+                to_addresses, subject, html_body, text_body, cc_addresses, attachments, category
+            )
             return True
-
-        except Exception as e:
-            total = time.time() - t_start
-            logger.error(f"[QA-EMAIL] ====== send_email FAILED after {total:.3f}s ======")
-            logger.error(f"[QA-EMAIL] Error: {type(e).__name__}: {str(e)}")
-            return False
+        return await asyncio.to_thread(
+            self.send_email, to_addresses, subject, html_body, text_body, cc_addresses, attachments
+        )
 
     async def send_alert_email(self, partner_name: str, alert_level: str, message: str, metrics: Dict[str, Any]) -> bool:
         """Send alert email via SES SMTP"""
@@ -155,14 +265,79 @@ class EmailService:
             # In production, fetch recipient list from settings
             to_email = "admin@jobtalk.com"
 
-            return await asyncio.to_thread(
-                self.send_email, [to_email], subject, html_body, text_body
-            )
+            return await self._deliver([to_email], subject, html_body, text_body, category="alert")
 
         except Exception as e:
             logger.error(f"Error sending alert email: {str(e)}")
             return False
 
+    async def send_alert_digest_email(self, alerts: List[Dict[str, Any]], to_addresses: List[str]) -> bool:
+        """Send several partners' alerts as one email.
+
+        alerts: dicts with partnerName, alertLevel, message and metrics (as in
+                send_alert_email).
+        """
+        if len(alerts) == 1:
+            alert = alerts[0]
+            subject = f"[{self.app_name}] {alert['alertLevel']} Alert: {alert['partnerName']}"
+        else:
+            levels = sorted({a["alertLevel"] for a in alerts})
+            subject = f"[{self.app_name}] {'/'.join(levels)} Alerts: {len(alerts)} partners"
+
+        rows = []
+        lines = []
+        for alert in alerts:
+            metrics = alert.get("metrics") or {}
+            rows.append(f"""
+                <tr>
+                    <td style="padding: 6px; border: 1px solid #ddd;"><strong>{alert['partnerName']}</strong></td>
+                    <td style="padding: 6px; border: 1px solid #ddd; color: #DC2626;">{alert['alertLevel']}</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{alert['message']}</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{metrics.get('queuedCalls', 0)}</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{metrics.get('activeCalls', 0)}</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{metrics.get('utilization', 0):.1f}%</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{metrics.get('runningCampaigns', 0)}</td>
+                </tr>""")
+            lines.append(
+                f"- {alert['partnerName']} [{alert['alertLevel']}]: {alert['message']} "
+                f"(queued {metrics.get('queuedCalls', 0)}, active {metrics.get('activeCalls', 0)}, "
+                f"utilization {metrics.get('utilization', 0):.1f}%, running campaigns {metrics.get('runningCampaigns', 0)})"
+            )
+
+        html_body = f"""
+            <html>
+            <head></head>
+            <body>
+                <h2 style="color: #DC2626;">{len(alerts)} partner alert{'s' if len(alerts) != 1 else ''}</h2>
+                <table style="border-collapse: collapse;">
+                    <tr>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Partner</th>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Level</th>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Alert Message</th>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Queued</th>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Active</th>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Utilization</th>
+                        <th style="padding: 6px; border: 1px solid #ddd;">Running Campaigns</th>
+                    </tr>{''.join(rows)}
+                </table>
+
+                <p><em>This is an automated alert from {self.app_name} Admin Dashboard.</em></p>
+            </body>
+            </html>
+            """
+
+        text_body = (
+            f"{len(alerts)} partner alert{'s' if len(alerts) != 1 else ''}\n\n"
+            + "\n".join(lines)
+            + f"\n\nThis is an automated alert from {self.app_name} Admin Dashboard.\n"
+        )
+
+        try:
+            return await self._deliver(to_addresses, subject, html_body, text_body, category="alert")
+        except Exception as e:
+            logger.error(f"Error sending alert digest email: {str(e)}")
+            return False
+
     async def send_qa_report_email(
         self,
         calls: List[Dict[str, Any]],
@@ -173,53 +348,48 @@ class EmailService:
         cc: Optional[List[str]] = None,
         custom_message: Optional[str] = None,
     ) -> bool:
-        """Send QA report email with call scores as CSV attachment via SES SMTP."""
-        import csv
-        import io
+        """Send QA report email with call scores as a (compressed) CSV attachment via SES SMTP.
 
+        Reports larger than MAX_ATTACHMENT_BYTES are uploaded to S3 and linked
+        from the body instead, when a report bucket is configured. Otherwise an
+        uncompressed report is rebuilt as a zip, and one that is still too
+        large is not sent.
+        """
         t_start = time.time()
         logger.info(f"[QA-EMAIL] ====== send_qa_report_email START ======")
         logger.info(f"[QA-EMAIL] Partner: {partner_name}, Date: {date}, Calls: {len(calls)}, ScoreFilter: {score_filter}, CC: {cc}")
+        report = None
         try:
             label = partner_name or "All Partners"
             subject = f"QA Report — {label} — {date} ({len(calls)} calls)"
 
-            def _format_duration(seconds):
-                if not seconds:
-                    return "0:00"
-                m, s = divmod(int(seconds), 60)
-                return f"{m}:{s:02d}"
-
-            # Build CSV
-            csv_buffer = io.StringIO()
-            writer = csv.writer(csv_buffer)
-            writer.writerow([
-                "Call ID", "Contact", "Phone", "Campaign", "Duration",
-                "AI Voice Quality", "AI Latency", "AI Conversation Quality",
-                "Human Voice Quality", "Human Latency", "Human Conversation Quality",
-                "Notes",
-            ])
-            for call in calls:
-                qa = call.get("qaAnalysis") or {}
-                contact_name = f"{call.get('contactFirstName', '') or ''} {call.get('contactLastName', '') or ''}".strip()
-                writer.writerow([
-                    call.get("id", ""),
-                    contact_name,
-                    call.get("contactPhone", "") or "",
-                    call.get("campaignName", "") or "",
-                    _format_duration(call.get("duration")),
-                    qa.get("aiVoiceQuality", ""),
-                    qa.get("aiLatency", ""),
-                    qa.get("aiConversationQuality", ""),
-                    qa.get("humanVoiceQuality", ""),
-                    qa.get("humanLatency", ""),
-                    qa.get("humanConversationQuality", ""),
-                    qa.get("aiNotes", "") or "",
-                ])
-
-            csv_bytes = csv_buffer.getvalue().encode("utf-8")
             safe_partner = (partner_name or "all").replace(" ", "_").lower()
-            csv_filename = f"qa_report_{safe_partner}_{date}.csv"
+            base_name = f"qa_report_{safe_partner}_{date}"
+            filename, report, mime_type, size = await asyncio.to_thread(build_qa_report, calls, base_name)
+            download_url = None
+            if size > MAX_ATTACHMENT_BYTES:
+                download_url = await upload_qa_report(
+                    self.s3_service, self.report_s3_config, report, filename, mime_type
+                )
+                if not download_url and mime_type == "text/csv":
+                    report.close()
+                    filename, report, mime_type, size = await asyncio.to_thread(
+                        build_qa_report, calls, base_name, "zip"
+                    )
+                    logger.info(f"[QA-EMAIL] Report not linked, rebuilt as {filename} ({size} bytes)")
+                if not download_url and size > MAX_ATTACHMENT_BYTES:
+                    logger.error(
+                        f"[QA-EMAIL] Report is {size} bytes, over the {MAX_ATTACHMENT_BYTES} byte attachment "
+                        f"limit, and could not be linked from S3 (is QA_REPORT_S3_BUCKET set?); not sending"
+                    )
+                    return False
+            if download_url:
+                attachments = None
+            elif self.outbox is not None:
+                # The outbox reads the file straight into the message it stores
+                attachments = [(filename, report, mime_type)]
+            else:
+                attachments = [(filename, report.read(), mime_type)]
 
             # Build email body (summary only, details in CSV)
             filter_label = f" (scores ≤ {score_filter})" if score_filter else ""
@@ -227,12 +397,19 @@ class EmailService:
             if custom_message:
                 message_block = f'<p style="margin-bottom:16px; padding:12px; background:#f0f4ff; border-radius:6px;">{custom_message}</p>'
 
+            if download_url:
+                html_details = f'<p>The report is too large to attach. <a href="{download_url}">Download {filename}</a> (link valid for 7 days).</p>'
+                text_details = f"The report is too large to attach. Download it (link valid for 7 days):\n{download_url}\n"
+            else:
+                html_details = f"<p>Please find the detailed call scores in the attached file ({filename}).</p>"
+                text_details = f"Please find the detailed call scores in the attached file ({filename}).\n"
+
             html_body = f"""
             <html>
             <body style="font-family: Arial, sans-serif; padding: 20px; color: #333;">
                 <h2 style="color: #2c3e50;">QA Report — {label} — {date}</h2>
                 {message_block}
-                <p>Please find the detailed call scores in the attached CSV file.</p>
+                {html_details}
             </body>
             </html>
             """
@@ -240,18 +417,20 @@ class EmailService:
             text_body = f"QA Report — {label} — {date} ({len(calls)} calls)\n\n"
             if custom_message:
                 text_body += f"{custom_message}\n\n"
-            text_body += "Please find the detailed call scores in the attached CSV file.\n"
+            text_body += text_details
 
             recipients = to_addresses or ["bhavdipm@aptask.com"]
 
-            logger.info(f"[QA-EMAIL] CSV built: {len(calls)} rows, {len(csv_bytes)} bytes | file: {csv_filename}")
+            logger.info(
+                f"[QA-EMAIL] Report built: {len(calls)} rows, {size} bytes | file: {filename}"
+                f"{' | linked from S3' if download_url else ''}"
+            )
             logger.info(f"[QA-EMAIL] Recipients: {recipients}")
-            logger.info(f"[QA-EMAIL] Handing off to send_email via thread ...")
 
-            result = await asyncio.to_thread(
-                self.send_email,
+            result = await self._deliver(
                 recipients, subject, html_body, text_body, cc,
-                attachments=[(csv_filename, csv_bytes, "text/csv")],
+                attachments=attachments,
+                category="qa_report",
             )
 
             total = time.time() - t_start
@@ -263,3 +442,6 @@ class EmailService:
             logger.error(f"[QA-EMAIL] ====== send_qa_report_email EXCEPTION after {total:.3f}s ======")
             logger.error(f"[QA-EMAIL] Error: {type(e).__name__}: {str(e)}")
             return False
+        finally:
+            if report is not None:
+                report.close()
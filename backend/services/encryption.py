@@ -1,13 +1,28 @@
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import io
 import os
 import base64
+import threading
+import paramiko
+
+# Decrypted credentials and parsed SSH keys kept in memory (LRU entries)
+CREDENTIAL_CACHE_SIZE = 512
+# Key types tried in order when parsing a PEM/OpenSSH private key
+_PKEY_CLASSES = (paramiko.RSAKey, paramiko.ECDSAKey, paramiko.Ed25519Key)
 
 class EncryptionService:
     def __init__(self):
         # Get encryption key from environment (must be 32 bytes for AES-256)
         key_str = os.environ.get('ENCRYPTION_KEY', 'this-is-a-32-byte-encryption-key-for-aes256-change-me')
         self.key = key_str.encode()[:32].ljust(32, b'\x00')
+        # Keyed by ciphertext: every encrypt() uses a fresh IV, so a changed
+        # credential never hits a stale entry. Memory only, never persisted.
+        self._plaintexts: "OrderedDict[str, str]" = OrderedDict()
+        self._pkeys: "OrderedDict[tuple, paramiko.PKey]" = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def encrypt(self, plaintext: str) -> str:
         """Encrypt plaintext using AES-256-CBC"""
@@ -40,7 +55,75 @@ class EncryptionService:
             raise Exception(f"Encryption error: {str(e)}")
     
     def decrypt(self, encrypted: str) -> str:
-        """Decrypt ciphertext using AES-256-CBC"""
+        """Decrypt ciphertext using AES-256-CBC (cached per ciphertext)"""
+        if not encrypted:
+            return ""
+
+        with self._cache_lock:
+            plaintext = self._plaintexts.get(encrypted)
+            if plaintext is not None:
+                self._plaintexts.move_to_end(encrypted)
+                return plaintext
+
+        plaintext = self._decrypt(encrypted)
+        with self._cache_lock:
+            self._plaintexts[encrypted] = plaintext
+            while len(self._plaintexts) > CREDENTIAL_CACHE_SIZE:
+                self._plaintexts.popitem(last=False)
+        return plaintext
+
+    def load_private_key(self, encrypted_key: str, encrypted_passphrase: Optional[str] = None) -> paramiko.PKey:
+        """Decrypt and parse an SSH private key, cached as a paramiko key object"""
+        cache_key = (encrypted_key, encrypted_passphrase or "")
+        with self._cache_lock:
+            pkey = self._pkeys.get(cache_key)
+            if pkey is not None:
+                self._pkeys.move_to_end(cache_key)
+                return pkey
+
+        key_str = self._decrypt(encrypted_key)
+        passphrase = self._decrypt(encrypted_passphrase) if encrypted_passphrase else None
+        pkey = None
+        errors = []
+        for key_class in _PKEY_CLASSES:
+            try:
+                pkey = key_class.from_private_key(io.StringIO(key_str), password=passphrase)
+                break
+            except paramiko.PasswordRequiredException:
+                raise Exception("SSH private key is encrypted and no passphrase is configured")
+            except (paramiko.SSHException, ValueError) as e:
+                errors.append(f"{key_class.__name__}: {e}")
+        if pkey is None:
+            raise Exception(f"Unsupported or invalid SSH private key ({'; '.join(errors)})")
+
+        with self._cache_lock:
+            self._pkeys[cache_key] = pkey
+            while len(self._pkeys) > CREDENTIAL_CACHE_SIZE:
+                self._pkeys.popitem(last=False)
+        return pkey
+
+    def forget(self, *encrypted_values: Optional[str]):
+        """Drop cached plaintexts and parsed keys derived from these ciphertexts"""
+        values = {v for v in encrypted_values if v}
+        if not values:
+            return
+        with self._cache_lock:
+            for value in values:
+                self._plaintexts.pop(value, None)
+            for cache_key in [k for k in self._pkeys if values.intersection(k)]:
+                del self._pkeys[cache_key]
+
+    def forget_partner(self, partner_data: Dict[str, Any]):
+        """Drop every cached credential of a stored partner config (on update or delete)"""
+        ssh = partner_data.get('sshConfig') or {}
+        s3 = partner_data.get('s3Config') or {}
+        self.forget(
+            partner_data.get('dbPassword'),
+            ssh.get('password'), ssh.get('privateKey'), ssh.get('passphrase'),
+            s3.get('accessKeyId'), s3.get('secretAccessKey'),
+        )
+
+    def _decrypt(self, encrypted: str) -> str:
         if not encrypted:
             return ""
         
@@ -0,0 +1,172 @@
+"""
+In-memory stand-in for the subset of the Motor (async MongoDB) API this
+backend uses: find/find_one/count_documents with simple query operators,
+sort/limit cursors, inserts, $set/$inc/$setOnInsert updates (with upsert)
+and find_one_and_update.
+
+Used by the allocation simulator and benchmarks to run service code without
+a database, and by the unit tests as a Mongo test double.
+"""
+import copy
+from typing import Any, Dict, List, Optional
+
+
+def _matches(doc: Dict, query: Dict) -> bool:
+    for field, cond in query.items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            for op, operand in cond.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$lte" and not (value is not None and value <= operand):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        return {k: copy.deepcopy(doc[k]) for k in included if k in doc}
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+
+def _sorted(docs: List[Dict], sort: Optional[List]) -> List[Dict]:
+    for field, direction in reversed(sort or []):
+        docs = sorted(docs, key=lambda d: (d.get(field) is None, d.get(field)), reverse=direction < 0)
+    return docs
+
+
+class InMemoryCursor:
+    def __init__(self, docs: List[Dict], projection: Optional[Dict]):
+        self._docs = docs
+        self._projection = projection
+        self._limit = 0
+
+    def sort(self, key, direction=None):
+        sort = key if isinstance(key, list) else [(key, direction if direction is not None else 1)]
+        self._docs = _sorted(self._docs, sort)
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        docs = self._docs
+        for n in (self._limit, length):
+            if n:
+                docs = docs[:n]
+        return [_project(d, self._projection) for d in docs]
+
+
+class InMemoryCollection:
+    """Async subset of the Motor collection API used by the allocator.
+
+    Equality lookups on `index_field` are served from a hash index so that
+    per-partner queries stay O(1) at fleet scale.
+    """
+
+    def __init__(self, index_field: Optional[str] = None):
+        self.docs: List[Dict] = []
+        self.index_field = index_field
+        self._index: Dict[Any, List[Dict]] = {}
+
+    def _candidates(self, query: Dict) -> List[Dict]:
+        key = query.get(self.index_field) if self.index_field else None
+        if key is not None and not isinstance(key, dict):
+            return self._index.get(key, [])
+        return self.docs
+
+    def _add(self, doc: Dict) -> None:
+        self.docs.append(doc)
+        if self.index_field and self.index_field in doc:
+            self._index.setdefault(doc[self.index_field], []).append(doc)
+
+    def clear(self) -> None:
+        self.docs = []
+        self._index = {}
+
+    async def find_one(self, query: Dict = None, projection: Dict = None, sort: List = None):
+        docs = [d for d in self._candidates(query or {}) if _matches(d, query or {})]
+        docs = _sorted(docs, sort)
+        return _project(docs[0], projection) if docs else None
+
+    def find(self, query: Dict = None, projection: Dict = None) -> InMemoryCursor:
+        docs = [d for d in self._candidates(query or {}) if _matches(d, query or {})]
+        return InMemoryCursor(docs, projection)
+
+    async def count_documents(self, query: Dict) -> int:
+        return sum(1 for d in self._candidates(query) if _matches(d, query))
+
+    async def insert_one(self, doc: Dict):
+        self._add(dict(doc))
+
+    async def insert_many(self, docs: List[Dict]):
+        for doc in docs:
+            self._add(dict(doc))
+
+    @staticmethod
+    def _apply(doc: Dict, update: Dict) -> None:
+        doc.update(copy.deepcopy(update.get("$set", {})))
+        for field, inc in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + inc
+
+    async def update_one(self, query: Dict, update: Dict, upsert: bool = False):
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                self._apply(doc, update)
+                return
+        if upsert:
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            doc.update(copy.deepcopy(update.get("$setOnInsert", {})))
+            self._apply(doc, update)
+            self._add(doc)
+
+    async def update_many(self, query: Dict, update: Dict):
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                self._apply(doc, update)
+
+    async def find_one_and_update(
+        self, query: Dict, update: Dict, projection: Dict = None,
+        sort: List = None, return_document: bool = False,
+    ):
+        docs = _sorted([d for d in self._candidates(query) if _matches(d, query)], sort)
+        if not docs:
+            return None
+        before = _project(docs[0], projection)
+        self._apply(docs[0], update)
+        return _project(docs[0], projection) if return_document else before
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+
+class InMemoryDB:
+    """Attribute-style collection access, like a Motor database."""
+
+    _INDEX_FIELDS = {"partner_configs": "id", "dashboard_snapshots": "partnerId"}
+
+    def __init__(self):
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(self._INDEX_FIELDS.get(name))
+        return self._collections[name]
@@ -0,0 +1,73 @@
+"""
+Sliding-window requests/tokens-per-minute limiter for outbound LLM calls.
+
+acquire(tokens) waits until one more request carrying `tokens` fits in both
+the RPM and the TPM budget over the last 60 seconds. A limit of 0 disables
+that dimension. Token counts are the caller's estimate (prompt + expected
+output), which is what provider rate limits are enforced on.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Tuple
+
+WINDOW_SECONDS = 60.0
+
+
+class LLMRateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._window: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        # Waiters queue up in arrival order instead of racing for freed capacity
+        self._lock = asyncio.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            _, tokens = self._window.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """Seconds until a request of `tokens` fits; 0 when it fits now."""
+        if not self._window:
+            return 0.0  # a single oversized request still goes through on an empty window
+
+        wait = 0.0
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            oldest = self._window[len(self._window) - self.requests_per_minute][0]
+            wait = max(wait, oldest + WINDOW_SECONDS - now)
+
+        if self.tokens_per_minute and self._tokens_in_window + tokens > self.tokens_per_minute:
+            # Walk forward until enough tokens have expired
+            freed = 0
+            need = self._tokens_in_window + tokens - self.tokens_per_minute
+            for ts, used in self._window:
+                freed += used
+                if freed >= need:
+                    wait = max(wait, ts + WINDOW_SECONDS - now)
+                    break
+            else:
+                # Larger than the whole budget — wait for the window to empty
+                wait = max(wait, self._window[-1][0] + WINDOW_SECONDS - now)
+        return wait
+
+    async def acquire(self, tokens: int = 0) -> None:
+        if not (self.requests_per_minute or self.tokens_per_minute):
+            return
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._window.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                await asyncio.sleep(wait)
@@ -0,0 +1,88 @@
+"""
+Micro-batcher that packs concurrent scoring requests into one LLM call.
+
+submit() parks a request until the open batch reaches max_items, adding the
+request would exceed max_tokens, or max_wait seconds pass since the batch
+opened. The batch is then handed to `send(items)`, which receives a list of
+(key, payload) pairs and returns {key: result}. Keys are the caller's label
+(a call id) made unique within the batch. A key missing from the result
+resolves to None; an exception from `send` is raised to every waiter. If
+every waiter of a batch is cancelled, the in-flight `send` is cancelled too.
+"""
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SendBatch = Callable[[List[Tuple[str, Any]]], Awaitable[Dict[str, Any]]]
+
+
+class LLMScoreBatcher:
+    def __init__(self, send: SendBatch, max_items: int, max_tokens: int, max_wait: float = 0.05):
+        self._send = send
+        self.max_items = max(max_items, 1)
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self._pending: List[Tuple[str, Any, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._seq = itertools.count(1)
+        self._tasks = set()
+
+    async def submit(self, label: Any, payload: Any, tokens: int) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._pending and self._pending_tokens + tokens > self.max_tokens:
+            self._flush()
+
+        key = str(label) if label is not None else ""
+        if not key or any(key == pending_key for pending_key, _, _ in self._pending):
+            key = f"item-{next(self._seq)}"
+        future = loop.create_future()
+        self._pending.append((key, payload, future))
+        self._pending_tokens += tokens
+
+        if len(self._pending) >= self.max_items or self._pending_tokens >= self.max_tokens:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        task = asyncio.create_task(self._dispatch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, Any, asyncio.Future]]) -> None:
+        live = [(key, payload, future) for key, payload, future in batch if not future.done()]
+        if not live:
+            return
+        send = asyncio.ensure_future(self._send([(key, payload) for key, payload, _ in live]))
+
+        def cancel_if_abandoned(_):
+            if all(future.cancelled() for _, _, future in live):
+                send.cancel()
+
+        for _, _, future in live:
+            future.add_done_callback(cancel_if_abandoned)
+        try:
+            results = await send
+        except asyncio.CancelledError:
+            for _, _, future in live:
+                future.cancel()
+            return
+        except Exception as e:
+            for _, _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, _, future in live:
+            if not future.done():
+                future.set_result(results.get(key))
@@ -2,103 +2,392 @@ import os
 import re
 import json
 import base64
+import hashlib
 import logging
 import asyncio
 import httpx
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
-from openai import OpenAI
+from typing import Optional, Dict, Any, List, Tuple
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from models import PartnerConfig
 from services.ssh_connection import SSHConnectionService
 from services.email_service import EmailService
+from services.audio_cache import AudioCache
+from services.llm_rate_limiter import LLMRateLimiter
+from services.llm_score_batcher import LLMScoreBatcher
 from services.qa_service import parse_messages_to_transcript
 
 logger = logging.getLogger(__name__)
 
 OPENROUTER_MODEL = "google/gemini-2.5-flash:nitro"
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 MAX_AUDIO_SIZE_MB = 20
+AUDIO_DOWNLOAD_TIMEOUT = 60
 TRANSCRIPTION_TIMEOUT = 300  # 5 minutes
 ANALYSIS_TIMEOUT = 120  # 2 minutes
 MAX_RETRY_ATTEMPTS = 3
 RETRY_DELAY_SECONDS = 5
 SAVE_BATCH_SIZE = 10
+# Calls scored at once (download + transcription + scoring), shared by all batches
+LLM_CONCURRENCY = int(os.environ.get("QA_LLM_CONCURRENCY", "8"))
+# Provider rate limits; 0 = unlimited
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("QA_LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("QA_LLM_TOKENS_PER_MINUTE", "0"))
+# Rough token estimates fed to the limiter
+CHARS_PER_TOKEN = 4
+AUDIO_BYTES_PER_TOKEN = 500  # ~32 tokens/s of 128kbps mp3
+TRANSCRIPT_OUTPUT_TOKENS = 2000
+ANALYSIS_OUTPUT_TOKENS = 150
+# Part of the LLM result cache key — bump whenever the analysis prompt changes
+PROMPT_VERSION = "qa-v1"
+DEDUPE_CHUNK_SIZE = 500
+# Calls packed into one scoring request (1 = one request per call) and the
+# estimated prompt + output token budget of such a request
+SCORING_BATCH_SIZE = int(os.environ.get("QA_SCORING_BATCH_SIZE", "5"))
+SCORING_BATCH_TOKENS = int(os.environ.get("QA_SCORING_BATCH_TOKENS", "8000"))
+SCORING_BATCH_WAIT_SECONDS = 0.05
+
+SCORE_FIELDS = ("voiceQuality", "latency", "conversationQuality")
+SCORING_RUBRIC = (
+    "Scoring:\n"
+    "- voiceQuality: audio/speech clarity, coherence, absence of artifacts or garbled text\n"
+    "- latency: natural pacing, absence of awkward pauses, AI responsiveness\n"
+    "- conversationQuality: goal achievement, professionalism, candidate engagement\n\n"
+)
+
+
+class _Base64Accumulator:
+    """Base64-encodes a byte stream chunk by chunk.
+
+    Only the encoded output is kept, so a download never holds both the raw
+    recording and its base64 copy in full.
+    """
+
+    def __init__(self):
+        self._out = bytearray()
+        self._carry = b""
+        self.size = 0
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        data = self._carry + chunk if self._carry else chunk
+        cut = len(data) - len(data) % 3
+        self._out += base64.b64encode(memoryview(data)[:cut])
+        self._carry = bytes(data[cut:])
+
+    def reset(self) -> None:
+        self._out = bytearray()
+        self._carry = b""
+        self.size = 0
+
+    def finish(self) -> str:
+        """Return the encoded text and release the buffer."""
+        out, self._out = self._out, bytearray()
+        out += base64.b64encode(self._carry)
+        self._carry = b""
+        return out.decode("ascii")
 
 
 class QAAnalysisService:
-    def __init__(self, db, ssh_service: SSHConnectionService, email_service: EmailService):
+    def __init__(
+        self, db, ssh_service: SSHConnectionService, email_service: EmailService,
+        llm_concurrency: int = LLM_CONCURRENCY, limiter: Optional[LLMRateLimiter] = None,
+        audio_cache: Optional[AudioCache] = None, scoring_batch_size: int = SCORING_BATCH_SIZE,
+    ):
         self.db = db
         self.ssh_service = ssh_service
         self.email_service = email_service
+        self.llm_concurrency = max(llm_concurrency, 1)
+        self.limiter = limiter or LLMRateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+        self.audio_cache = audio_cache or AudioCache()
+        # One pooled client for recording downloads; at most one download per LLM slot
+        self._http = httpx.AsyncClient(
+            timeout=AUDIO_DOWNLOAD_TIMEOUT,
+            limits=httpx.Limits(max_connections=self.llm_concurrency),
+        )
+        self._llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        self.scoring_batch_size = max(scoring_batch_size, 1)
+        self._score_batcher = LLMScoreBatcher(
+            self._score_batch, self.scoring_batch_size, SCORING_BATCH_TOKENS, SCORING_BATCH_WAIT_SECONDS
+        )
 
         api_key = os.environ.get("OPENROUTER_API_KEY", "")
-        self.openrouter = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
+        # Async client on its own connection pool, one connection per LLM slot.
+        # No threads are involved, and cancelling a caller aborts its request.
+        self.openrouter = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
             api_key=api_key,
             default_headers={
                 "HTTP-Referer": "https://jobtalk.ai/",
                 "X-Title": "qaAnalysis",
             },
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.llm_concurrency,
+                    max_keepalive_connections=self.llm_concurrency,
+                ),
+            ),
         )
 
+    async def _complete(self, messages: List[Dict[str, Any]], timeout: int, est_tokens: int):
+        """One chat completion, bounded by the LLM worker slots and the RPM/TPM limiter."""
+        async with self._llm_slots:
+            await self.limiter.acquire(est_tokens)
+            return await self.openrouter.chat.completions.create(
+                model=OPENROUTER_MODEL,
+                messages=messages,
+                timeout=timeout,
+            )
+
+    async def close(self) -> None:
+        await self._http.aclose()
+        await self.openrouter.close()
+
     async def transcribe_audio(self, recording_url: str) -> Optional[str]:
-        """Download audio and transcribe using Gemini via OpenRouter."""
+        """Download audio and transcribe using Gemini via OpenRouter.
+
+        Recordings and transcripts are cached on disk and looked up before any
+        request: a recording cached with an ETag is fetched with If-None-Match,
+        so an unchanged one costs a bodyless 304; one cached without an ETag
+        needs no request at all. Downloads are streamed and base64-encoded as
+        they arrive, and abandoned as soon as they pass MAX_AUDIO_SIZE_MB.
+        """
         if not recording_url:
             return None
 
+        max_bytes = MAX_AUDIO_SIZE_MB * 1024 * 1024
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                resp = await client.get(recording_url)
-                if resp.status_code != 200:
-                    logger.warning(f"Failed to download audio: HTTP {resp.status_code}")
-                    return None
-
-                audio_bytes = resp.content
-                size_mb = len(audio_bytes) / (1024 * 1024)
-                if size_mb > MAX_AUDIO_SIZE_MB:
-                    logger.warning(f"Audio too large ({size_mb:.1f}MB), skipping transcription")
-                    return None
-
-                audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
-
-            # Run blocking OpenAI call in thread pool
-            def _transcribe():
-                return self.openrouter.chat.completions.create(
-                    model=OPENROUTER_MODEL,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "input_audio",
-                                    "input_audio": {
-                                        "data": audio_b64,
-                                        "format": "mp3",
-                                    },
-                                },
-                                {
-                                    "type": "text",
-                                    "text": "Transcribe this audio recording exactly as spoken. Output only the transcription text, nothing else.",
-                                },
-                            ],
-                        }
-                    ],
-                    timeout=TRANSCRIPTION_TIMEOUT,
+            encoder = _Base64Accumulator()
+            known = await self.audio_cache.lookup(recording_url)
+            content_hash, transcript = None, None
+            if known and not known[0]:
+                # Cached without an ETag: the URL alone identifies the recording
+                content_hash = known[1]
+                transcript = await self._from_cache(content_hash, encoder)
+            if not transcript and encoder.size == 0:
+                content_hash, transcript = await self._fetch_audio(
+                    recording_url, known if known and known[0] else None, encoder, max_bytes
                 )
+            if transcript:
+                return transcript
+            if encoder.size == 0:
+                return None
 
-            response = await asyncio.to_thread(_transcribe)
+            audio_size = encoder.size
+            audio_b64 = encoder.finish()
+
+            response = await self._complete(
+                [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "input_audio",
+                                "input_audio": {
+                                    "data": audio_b64,
+                                    "format": "mp3",
+                                },
+                            },
+                            {
+                                "type": "text",
+                                "text": "Transcribe this audio recording exactly as spoken. Output only the transcription text, nothing else.",
+                            },
+                        ],
+                    }
+                ],
+                TRANSCRIPTION_TIMEOUT,
+                audio_size // AUDIO_BYTES_PER_TOKEN + TRANSCRIPT_OUTPUT_TOKENS,
+            )
             transcript = (response.choices[0].message.content or "").strip()
+            if transcript and content_hash:
+                try:
+                    await self.audio_cache.put_transcript(content_hash, OPENROUTER_MODEL, transcript)
+                except OSError as e:
+                    logger.warning(f"Could not cache transcript: {e}")
             return transcript if transcript else None
 
         except Exception as e:
             logger.error(f"Transcription error: {str(e)}")
             return None
 
-    async def analyze_call(
-        self, transcript: Optional[str], summary: Optional[str],
+    async def _from_cache(self, content_hash: str, encoder: "_Base64Accumulator") -> Optional[str]:
+        """Cached transcript for the recording, else load its cached audio (if any) into the encoder."""
+        transcript = await self.audio_cache.get_transcript(content_hash, OPENROUTER_MODEL)
+        if transcript:
+            return transcript
+        cached_audio = await self.audio_cache.get_audio(content_hash)
+        if cached_audio is not None:
+            encoder.update(cached_audio)
+        return None
+
+    async def _fetch_audio(
+        self, recording_url: str, known: Optional[Tuple[str, str]],
+        encoder: "_Base64Accumulator", max_bytes: int,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """GET the recording, revalidating the cached copy when its ETag is known.
+
+        Returns (content hash, cached transcript). The encoder is left empty
+        when no usable audio was found.
+        """
+        headers = {"If-None-Match": known[0]} if known else None
+        async with self._http.stream("GET", recording_url, headers=headers) as resp:
+            if resp.status_code == 304 and known:
+                transcript = await self._from_cache(known[1], encoder)
+                if transcript or encoder.size:
+                    return known[1], transcript
+            elif resp.status_code != 200:
+                logger.warning(f"Failed to download audio: HTTP {resp.status_code}")
+                return None, None
+            else:
+                etag = resp.headers.get("etag")
+                return await self._download_audio(resp, recording_url, etag, encoder, max_bytes), None
+        # Not modified, but evicted since the lookup
+        return await self._fetch_audio(recording_url, None, encoder, max_bytes)
+
+    async def _download_audio(
+        self, resp: httpx.Response, recording_url: str, etag: Optional[str],
+        encoder: "_Base64Accumulator", max_bytes: int,
+    ) -> Optional[str]:
+        """Stream the body into the encoder and the disk cache, giving up past max_bytes.
+
+        Returns the cached content hash, or None if caching failed. Leaves the
+        encoder empty when the recording is too large.
+        """
+        declared = resp.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            logger.warning(f"Audio too large ({int(declared) / (1024 * 1024):.1f}MB), skipping transcription")
+            return None
+
+        try:
+            writer = self.audio_cache.open_writer()
+        except OSError as e:
+            logger.warning(f"Could not cache recording: {e}")
+            writer = None
+
+        try:
+            async for chunk in resp.aiter_bytes():
+                if encoder.size + len(chunk) > max_bytes:
+                    logger.warning(f"Audio over {MAX_AUDIO_SIZE_MB}MB, aborting download")
+                    encoder.reset()
+                    if writer:
+                        writer.abort()
+                    return None
+                encoder.update(chunk)
+                if writer:
+                    writer.write(chunk)
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+
+        if not writer:
+            return None
+        try:
+            return await writer.commit(recording_url, etag)
+        except OSError as e:
+            logger.warning(f"Could not cache recording: {e}")
+            return None
+
+    async def find_scored_call_ids(self, partner: PartnerConfig, call_ids: List[int]) -> set:
+        """Return the call IDs that already have AI scores in the partner's qa_analysis table.
+
+        Failed analyses are stored with score 0 and are not counted, so they get retried.
+        """
+        if not call_ids:
+            return set()
+        queries = []
+        for start in range(0, len(call_ids), DEDUPE_CHUNK_SIZE):
+            chunk = list(call_ids[start:start + DEDUPE_CHUNK_SIZE])
+            placeholders = ", ".join(["%s"] * len(chunk))
+            queries.append({
+                "query": f"SELECT callId FROM qa_analysis WHERE callId IN ({placeholders}) AND aiVoiceQuality > 0",
+                "params": tuple(chunk),
+            })
+        try:
+            results = await self.ssh_service.execute_batch_queries(partner, queries)
+        except Exception as e:
+            logger.warning(f"Could not check existing QA scores, analyzing all calls: {e}")
+            return set()
+        return {row["callId"] for rows in results for row in rows}
+
+    async def fetch_calls_data(self, partner: PartnerConfig, call_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Load analysis inputs for calls sent by ID only, keyed by call ID.
+
+        One `WHERE c.id IN (...)` query per chunk, all in a single tunnel
+        session. Calls missing from the partner DB are absent from the result.
+        """
+        if not call_ids:
+            return {}
+        queries = []
+        for start in range(0, len(call_ids), DEDUPE_CHUNK_SIZE):
+            chunk = list(call_ids[start:start + DEDUPE_CHUNK_SIZE])
+            placeholders = ", ".join(["%s"] * len(chunk))
+            queries.append({
+                "query": f"""
+                    SELECT c.id, c.tenantId, c.duration, c.endReason, c.recordingUrl,
+                           c.messages, c.summary,
+                           camp.name AS campaignName,
+                           cont.firstName AS contactFirstName,
+                           cont.lastName AS contactLastName,
+                           cont.phone AS contactPhone
+                    FROM calls c
+                    LEFT JOIN campaigns camp ON c.campaignId = camp.id
+                    LEFT JOIN contacts cont ON c.contactId = cont.id
+                    WHERE c.id IN ({placeholders})
+                """,
+                "params": tuple(chunk),
+            })
+        results = await self.ssh_service.execute_batch_queries(partner, queries)
+
+        calls = {}
+        for rows in results:
+            for row in rows:
+                call = {k: v for k, v in row.items() if k != "messages"}
+                call["transcript"] = parse_messages_to_transcript(row.get("messages"))
+                calls[row["id"]] = call
+        return calls
+
+    @staticmethod
+    def _analysis_cache_key(
+        transcript: Optional[str], summary: Optional[str],
         duration: Optional[int], end_reason: Optional[str]
-    ) -> Optional[Dict[str, Any]]:
-        """Send transcript to LLM for QA scoring."""
+    ) -> str:
+        payload = json.dumps(
+            [PROMPT_VERSION, OPENROUTER_MODEL, transcript, summary, duration, end_reason]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _get_cached_analysis(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = await self.db.qa_llm_cache.find_one({"key": key}, {"_id": 0, "scores": 1})
+            return doc["scores"] if doc else None
+        except Exception as e:
+            logger.warning(f"QA analysis cache lookup failed: {e}")
+            return None
+
+    async def _store_cached_analysis(self, key: str, scores: Dict[str, Any]) -> None:
+        try:
+            await self.db.qa_llm_cache.update_one(
+                {"key": key},
+                {"$set": {
+                    "key": key,
+                    "scores": scores,
+                    "promptVersion": PROMPT_VERSION,
+                    "model": OPENROUTER_MODEL,
+                    "createdAt": datetime.now(timezone.utc).isoformat(),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"QA analysis cache write failed: {e}")
+
+    @staticmethod
+    def _call_context(
+        transcript: Optional[str], summary: Optional[str],
+        duration: Optional[int], end_reason: Optional[str]
+    ) -> Optional[str]:
+        """The per-call part of a scoring prompt, or None if there is nothing to score."""
         source_parts = []
         if transcript:
             source_parts.append("transcript")
@@ -113,51 +402,124 @@ class QAAnalysisService:
             text_for_analysis += f"Transcript: {transcript[:2500]}"
 
         if not text_for_analysis.strip():
+            return None
+        return (
+            f"Duration: {duration or 0}s | End reason: {end_reason or 'unknown'} | Source: {source}\n"
+            f"{text_for_analysis}"
+        )
+
+    async def analyze_call(
+        self, transcript: Optional[str], summary: Optional[str],
+        duration: Optional[int], end_reason: Optional[str], call_id: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Send transcript to LLM for QA scoring. Identical inputs are served from qa_llm_cache.
+
+        With scoring_batch_size > 1, concurrent calls are packed into one
+        request; `call_id` labels this call inside it.
+        """
+        context = self._call_context(transcript, summary, duration, end_reason)
+        if context is None:
             logger.warning("No transcript or summary available for analysis")
             return None
 
+        cache_key = self._analysis_cache_key(transcript, summary, duration, end_reason)
+        cached = await self._get_cached_analysis(cache_key)
+        if cached:
+            return cached
+
+        try:
+            if self.scoring_batch_size > 1:
+                scores = await self._score_batcher.submit(
+                    call_id, context, len(context) // CHARS_PER_TOKEN + ANALYSIS_OUTPUT_TOKENS
+                )
+            else:
+                scores = await self._score_single(context)
+        except Exception as e:
+            logger.error(f"Analysis error: {str(e)}")
+            return None
+
+        if scores:
+            await self._store_cached_analysis(cache_key, scores)
+        return scores
+
+    async def _score_single(self, context: str) -> Optional[Dict[str, Any]]:
         prompt = (
             "You are a QA analyst reviewing a recruitment AI voice call. "
             "Score the call on three dimensions from 1 to 10 (10 = best). "
             'Respond ONLY with valid JSON:\n'
             '{"voiceQuality": <1-10>, "latency": <1-10>, "conversationQuality": <1-10>, "notes": "<one sentence issue summary>"}\n\n'
-            "Scoring:\n"
-            "- voiceQuality: audio/speech clarity, coherence, absence of artifacts or garbled text\n"
-            "- latency: natural pacing, absence of awkward pauses, AI responsiveness\n"
-            "- conversationQuality: goal achievement, professionalism, candidate engagement\n\n"
-            f"Duration: {duration or 0}s | End reason: {end_reason or 'unknown'} | Source: {source}\n"
-            f"{text_for_analysis}"
+            f"{SCORING_RUBRIC}{context}"
         )
+        response = await self._complete(
+            [{"role": "user", "content": prompt}],
+            ANALYSIS_TIMEOUT,
+            len(prompt) // CHARS_PER_TOKEN + ANALYSIS_OUTPUT_TOKENS,
+        )
+        content = (response.choices[0].message.content or "").strip()
 
-        try:
-            def _analyze():
-                return self.openrouter.chat.completions.create(
-                    model=OPENROUTER_MODEL,
-                    messages=[{"role": "user", "content": prompt}],
-                    timeout=ANALYSIS_TIMEOUT,
-                )
-
-            response = await asyncio.to_thread(_analyze)
-            content = (response.choices[0].message.content or "").strip()
-
-            # Extract JSON from response
-            json_match = re.search(r"\{[\s\S]*\}", content)
-            if not json_match:
-                logger.error(f"No JSON in analysis response: {content[:200]}")
-                return None
+        # Extract JSON from response
+        json_match = re.search(r"\{[\s\S]*\}", content)
+        if not json_match:
+            logger.error(f"No JSON in analysis response: {content[:200]}")
+            return None
+        return json.loads(json_match.group(0))
 
-            scores = json.loads(json_match.group(0))
-            return scores
+    async def _score_batch(self, items: List[Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Score several calls in one request; calls it cannot parse are scored one by one."""
+        if len(items) == 1:
+            key, context = items[0]
+            return {key: await self._score_single(context)}
 
-        except Exception as e:
-            logger.error(f"Analysis error: {str(e)}")
-            return None
+        calls_text = "\n\n".join(f"### Call {key}\n{context}" for key, context in items)
+        prompt = (
+            "You are a QA analyst reviewing recruitment AI voice calls. "
+            "Score each call below on three dimensions from 1 to 10 (10 = best). "
+            "Respond ONLY with a valid JSON object keyed by call id:\n"
+            '{"<call id>": {"voiceQuality": <1-10>, "latency": <1-10>, "conversationQuality": <1-10>, "notes": "<one sentence issue summary>"}, ...}\n\n'
+            f"{SCORING_RUBRIC}{calls_text}"
+        )
+        response = await self._complete(
+            [{"role": "user", "content": prompt}],
+            ANALYSIS_TIMEOUT,
+            len(prompt) // CHARS_PER_TOKEN + ANALYSIS_OUTPUT_TOKENS * len(items),
+        )
+        content = (response.choices[0].message.content or "").strip()
+
+        parsed = None
+        json_match = re.search(r"\{[\s\S]*\}", content)
+        if json_match:
+            try:
+                parsed = json.loads(json_match.group(0))
+            except ValueError:
+                pass
+
+        results = {}
+        if isinstance(parsed, dict):
+            for key, _ in items:
+                scores = parsed.get(key)
+                if isinstance(scores, dict) and all(
+                    isinstance(scores.get(field), (int, float)) for field in SCORE_FIELDS
+                ):
+                    results[key] = scores
+
+        missing = [(key, context) for key, context in items if key not in results]
+        if missing:
+            logger.warning(
+                f"Batched scoring returned no usable scores for {len(missing)}/{len(items)} calls, "
+                f"scoring them individually"
+            )
+            singles = await asyncio.gather(
+                *(self._score_single(context) for _, context in missing), return_exceptions=True
+            )
+            for (key, _), scores in zip(missing, singles):
+                results[key] = scores if isinstance(scores, dict) else None
+        return results
 
-    async def _process_single_call(
+    async def process_single_call(
         self, call_data: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Score a single call using LLM. Uses call data provided directly (no SSH fetch).
-        Returns scores without saving to partner DB — batch_analyze handles batched saves.
+        Returns scores without saving to partner DB — the QA job queue batches the saves.
         """
         call_id = call_data["id"]
 
@@ -177,7 +539,8 @@ class QAAnalysisService:
             for attempt in range(1, MAX_RETRY_ATTEMPTS + 1):
                 try:
                     scores = await self.analyze_call(
-                        transcript, summary, call_data.get("duration"), call_data.get("endReason")
+                        transcript, summary, call_data.get("duration"), call_data.get("endReason"),
+                        call_id=call_id,
                     )
                     if scores:
                         break
@@ -207,10 +570,10 @@ class QAAnalysisService:
             logger.error(f"Error processing call {call_id}: {str(e)}")
             return {"callId": call_id, "status": "failed", "error": str(e)}
 
-    async def _flush_batch_save(
+    async def flush_batch_save(
         self, partner: PartnerConfig, pending_saves: List[Dict[str, Any]]
-    ):
-        """Save scores for a batch of calls in a single SSH tunnel."""
+    ) -> bool:
+        """Save scores for a batch of calls in a single SSH tunnel. Returns False if the save failed."""
         upsert_query = """
             INSERT INTO qa_analysis (callId, tenantId, aiVoiceQuality, aiLatency, aiConversationQuality, aiNotes, createdAt, updatedAt)
             VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
@@ -240,160 +603,10 @@ class QAAnalysisService:
         try:
             await self.ssh_service.execute_batch_updates(partner, queries)
             logger.info(f"Batch saved {len(queries)} call scores in single tunnel")
+            return True
         except Exception as e:
             logger.error(f"Batch save failed for {len(queries)} calls: {e}")
-
-    async def batch_analyze(
-        self, partner: PartnerConfig, calls_data: List[Dict[str, Any]], partner_name: str,
-        report_date: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """Process multiple calls: LLM scoring with batched DB saves via single SSH tunnels."""
-        total = len(calls_data)
-        logger.info(f"Starting batch analysis for {partner_name}: {total} calls")
-
-        # Process calls sequentially (LLM scoring) and collect results for batched saves
-        results = []
-        pending_saves = []
-        completed = 0
-        failed = 0
-
-        for call_data in calls_data:
-            result = await self._process_single_call(call_data)
-            results.append(result)
-
-            if result["status"] == "completed":
-                completed += 1
-                pending_saves.append(result)
-            else:
-                failed += 1
-
-            # Flush batch saves when batch is full
-            if len(pending_saves) >= SAVE_BATCH_SIZE:
-                await self._flush_batch_save(partner, pending_saves)
-                pending_saves = []
-
-        # Flush remaining saves
-        if pending_saves:
-            await self._flush_batch_save(partner, pending_saves)
-
-        logger.info(f"Batch analysis complete for {partner_name}: {completed} completed, {failed} failed")
-
-        # Send final summary email with all analyzed calls
-        await self._send_analysis_summary_email(results, partner_name, report_date)
-
-        return {
-            "total": total,
-            "completed": completed,
-            "failed": failed,
-            "results": results,
-        }
-
-    async def batch_analyze_legacy(
-        self, partner: PartnerConfig, call_ids: List[int], partner_name: str,
-        report_date: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """Legacy path: fetch data via SSH per call. Used when frontend sends only call IDs."""
-        total = len(call_ids)
-        logger.info(f"Starting legacy batch analysis for {partner_name}: {total} calls")
-
-        results = []
-        completed = 0
-        failed = 0
-        for cid in call_ids:
-            result = await self._process_single_call_legacy(partner, cid)
-            results.append(result)
-            if result["status"] == "completed":
-                completed += 1
-            else:
-                failed += 1
-
-        logger.info(f"Legacy batch analysis complete for {partner_name}: {completed} completed, {failed} failed")
-
-        # Send final summary email with all analyzed calls
-        await self._send_analysis_summary_email(results, partner_name, report_date)
-
-        return {
-            "total": total,
-            "completed": completed,
-            "failed": failed,
-            "results": results,
-        }
-
-    async def _process_single_call_legacy(
-        self, partner: PartnerConfig, call_id: int
-    ) -> Dict[str, Any]:
-        """Legacy: fetch data via SSH, analyze, save via SSH. One tunnel per operation."""
-        try:
-            query = """
-                SELECT c.id, c.tenantId, c.duration, c.endReason, c.recordingUrl,
-                       c.messages, c.summary,
-                       camp.name AS campaignName,
-                       cont.firstName AS contactFirstName,
-                       cont.lastName AS contactLastName,
-                       cont.phone AS contactPhone
-                FROM calls c
-                LEFT JOIN campaigns camp ON c.campaignId = camp.id
-                LEFT JOIN contacts cont ON c.contactId = cont.id
-                WHERE c.id = %s
-            """
-            results = await self.ssh_service.execute_query(partner, query, (call_id,))
-            if not results:
-                raise Exception(f"Call {call_id} not found in partner database")
-
-            call = results[0]
-            transcript = parse_messages_to_transcript(call.get("messages"))
-            summary = call.get("summary")
-            recording_url = call.get("recordingUrl")
-
-            if not transcript and recording_url:
-                logger.info(f"Transcribing call {call_id}...")
-                transcript = await self.transcribe_audio(recording_url)
-
-            scores = None
-            last_error = None
-            for attempt in range(1, MAX_RETRY_ATTEMPTS + 1):
-                try:
-                    scores = await self.analyze_call(
-                        transcript, summary, call.get("duration"), call.get("endReason")
-                    )
-                    if scores:
-                        break
-                except Exception as e:
-                    last_error = str(e)
-                    logger.warning(f"Analysis attempt {attempt}/{MAX_RETRY_ATTEMPTS} failed for call {call_id}: {e}")
-                    if attempt < MAX_RETRY_ATTEMPTS:
-                        await asyncio.sleep(RETRY_DELAY_SECONDS * attempt)
-
-            if not scores:
-                scores = {
-                    "voiceQuality": 0,
-                    "latency": 0,
-                    "conversationQuality": 0,
-                    "notes": f"Analysis failed: {last_error or 'No transcript/summary available'}",
-                }
-
-            tenant_id = call.get("tenantId")
-            upsert_query = """
-                INSERT INTO qa_analysis (callId, tenantId, aiVoiceQuality, aiLatency, aiConversationQuality, aiNotes, createdAt, updatedAt)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-                ON DUPLICATE KEY UPDATE
-                    aiVoiceQuality = VALUES(aiVoiceQuality),
-                    aiLatency = VALUES(aiLatency),
-                    aiConversationQuality = VALUES(aiConversationQuality),
-                    aiNotes = VALUES(aiNotes),
-                    updatedAt = NOW()
-            """
-            await self.ssh_service.execute_update(
-                partner, upsert_query,
-                (call_id, tenant_id, scores.get("voiceQuality"), scores.get("latency"),
-                 scores.get("conversationQuality"), scores.get("notes", "")),
-            )
-
-            return {"callId": call_id, "status": "completed", "scores": scores, "call": call}
-
-        except Exception as e:
-            logger.error(f"Error processing call {call_id}: {str(e)}")
-            return {"callId": call_id, "status": "failed", "error": str(e)}
+            return False
 
     async def _get_qa_report_recipients(self) -> List[str]:
         """Fetch QA report email recipients from system settings."""
@@ -409,7 +622,7 @@ class QAAnalysisService:
             logger.warning(f"Failed to fetch QA report recipients setting: {e}")
         return None
 
-    async def _send_analysis_summary_email(
+    async def send_analysis_summary_email(
         self, results: List[Dict[str, Any]], partner_name: str,
         report_date: Optional[str] = None
     ):
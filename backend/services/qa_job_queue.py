@@ -0,0 +1,400 @@
+"""
+Persistent QA analysis queue.
+
+Each analyze request becomes a QAJob in `qa_jobs`, and each of its calls one
+document in `qa_job_calls` owned by that job. That document is the unit of
+work and of idempotency: while a call is active (pending, running or scored)
+a unique index keeps any other job from queueing it again.
+
+Call states: pending -> running -> scored -> completed, or -> failed.
+"scored" means the LLM result is stored in Mongo but not yet written to the
+partner DB. A worker claims a call with a fresh `claim` token and every later
+state change is conditional on that token, so several API processes can share
+the queue. Calls whose claim is older than CLAIM_LEASE_SECONDS belong to a
+process that died (or a save that failed): running ones go back to pending,
+scored ones are saved again. A crash therefore loses at most the in-flight
+LLM requests.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models import PartnerConfig, QAJob
+from services.qa_analysis_service import (
+    LLM_CONCURRENCY, SAVE_BATCH_SIZE, SCORING_BATCH_SIZE, QAAnalysisService,
+)
+
+logger = logging.getLogger(__name__)
+
+# Enough calls in flight to fill every LLM slot with a full scoring batch
+QUEUE_WORKERS = int(os.environ.get("QA_QUEUE_WORKERS", str(LLM_CONCURRENCY * max(SCORING_BATCH_SIZE, 1))))
+IDLE_POLL_SECONDS = 5
+ACTIVE_STATES = ["pending", "running", "scored"]
+# Longest a call may stay claimed (transcription + LLM retries + batched save)
+CLAIM_LEASE_SECONDS = int(os.environ.get("QA_QUEUE_LEASE_SECONDS", "1800"))
+RECOVERY_INTERVAL_SECONDS = 60
+
+
+class QAJobQueue:
+    def __init__(self, db, analysis_service: QAAnalysisService, workers: int = QUEUE_WORKERS):
+        self.db = db
+        self.analysis = analysis_service
+        self.workers = max(workers, 1)
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        # partnerId -> scored results waiting for a batched partner DB save
+        self._pending_saves: Dict[str, List[Dict[str, Any]]] = {}
+        self._recovered_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Create indexes, recover work abandoned by dead processes and start workers."""
+        await self.db.qa_job_calls.create_index(
+            [("partnerId", 1), ("callId", 1)], unique=True, name="qa_job_calls_active_call",
+            partialFilterExpression={"active": True},
+        )
+        await self.db.qa_job_calls.create_index([("state", 1), ("enqueuedAt", 1)])
+        await self.db.qa_job_calls.create_index([("state", 1), ("startedAt", 1)])
+        await self.db.qa_job_calls.create_index("jobId")
+        await self.db.qa_job_calls.create_index("claim")
+
+        await self._recover_stale()
+        pending = await self.db.qa_job_calls.count_documents({"state": "pending"})
+        if pending:
+            logger.info(f"QA queue resuming with {pending} pending calls")
+
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _recover_stale(self) -> None:
+        """Take back calls whose claim outlived CLAIM_LEASE_SECONDS.
+
+        Only expired claims are touched, so calls other live processes are
+        working on are left alone.
+        """
+        self._recovered_at = time.monotonic()
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(seconds=CLAIM_LEASE_SECONDS)).isoformat()
+
+        await self.db.qa_job_calls.update_many(
+            {"state": "running", "startedAt": {"$lt": cutoff}},
+            {"$set": {"state": "pending", "claim": None}},
+        )
+        # Scored calls are claimed one by one, each under its own token, and saved
+        recovered = 0
+        while True:
+            item = await self.db.qa_job_calls.find_one_and_update(
+                {"state": "scored", "startedAt": {"$lt": cutoff}},
+                {"$set": {"claim": str(uuid.uuid4()), "startedAt": now.isoformat()}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if item is None:
+                break
+            self._pending_saves.setdefault(item["partnerId"], []).append(self._save_entry(item))
+            recovered += 1
+        if recovered:
+            logger.info(f"QA queue saving {recovered} scored calls left by an earlier attempt")
+            for partner_id in list(self._pending_saves):
+                await self._flush_partner(partner_id)
+
+    # ------------------------------------------------------------------
+    # Enqueue / progress
+    # ------------------------------------------------------------------
+
+    async def enqueue(
+        self, partner: PartnerConfig, call_ids: List[int], report_date: Optional[str] = None,
+        calls_data: Optional[List[Dict[str, Any]]] = None, force: bool = False,
+    ) -> QAJob:
+        """
+        Queue calls for analysis. Without calls_data, call details are fetched
+        by ID (legacy) in one batched query up front. Calls that already have
+        AI scores are left out unless `force` is set.
+        """
+        job = QAJob(
+            partnerId=partner.id,
+            partnerName=partner.partnerName,
+            reportDate=report_date,
+            legacy=calls_data is None,
+        )
+
+        if not force:
+            scored = await self.analysis.find_scored_call_ids(partner, call_ids)
+            job.alreadyScored = len(scored)
+            call_ids = [cid for cid in call_ids if cid not in scored]
+
+        active = await self.db.qa_job_calls.find(
+            {"partnerId": partner.id, "callId": {"$in": call_ids}, "active": True},
+            {"_id": 0, "callId": 1},
+        ).to_list(None)
+        skip = {doc["callId"] for doc in active}
+        if calls_data is not None:
+            data_by_id = {c["id"]: c for c in calls_data}
+        else:
+            data_by_id = await self._prefetch_legacy(partner, [cid for cid in call_ids if cid not in skip])
+
+        now = datetime.now(timezone.utc).isoformat()
+        queued = 0
+        for call_id in dict.fromkeys(call_ids):
+            if call_id in skip:
+                continue
+            try:
+                # An active duplicate queued meanwhile hits the unique index
+                await self.db.qa_job_calls.insert_one({
+                    "jobId": job.id,
+                    "partnerId": partner.id,
+                    "callId": call_id,
+                    "state": "pending",
+                    "active": True,
+                    "claim": None,
+                    "legacy": job.legacy,
+                    "callData": data_by_id.get(call_id),
+                    "scores": None,
+                    "error": None,
+                    "attempts": 0,
+                    "enqueuedAt": now,
+                    "startedAt": None,
+                    "finishedAt": None,
+                })
+                queued += 1
+            except DuplicateKeyError:
+                skip.add(call_id)
+
+        job.total = queued
+        job.skipped = len(skip)
+        if not queued:
+            job.status = "completed"
+            job.finishedAt = job.createdAt
+
+        job_dict = job.model_dump()
+        job_dict["createdAt"] = job_dict["createdAt"].isoformat()
+        if job_dict["finishedAt"]:
+            job_dict["finishedAt"] = job_dict["finishedAt"].isoformat()
+        await self.db.qa_jobs.insert_one(job_dict)
+
+        logger.info(
+            f"QA job {job.id} queued for {partner.partnerName}: "
+            f"{queued} calls, {job.skipped} already in progress, {job.alreadyScored} already scored"
+        )
+        self._wakeup.set()
+        return job
+
+    async def _prefetch_legacy(self, partner: PartnerConfig, call_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        # On failure the workers fetch each call themselves
+        try:
+            return await self.analysis.fetch_calls_data(partner, call_ids)
+        except Exception as e:
+            logger.warning(f"Could not prefetch {len(call_ids)} calls for {partner.partnerName}: {e}")
+            return {}
+
+    async def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.db.qa_jobs.find_one({"id": job_id}, {"_id": 0})
+        if not job:
+            return None
+
+        if job["status"] == "completed":
+            counts = {"completed": job["completed"], "failed": job["failed"]}
+        else:
+            counts = {}
+            items = await self.db.qa_job_calls.find(
+                {"jobId": job_id}, {"_id": 0, "state": 1}
+            ).to_list(None)
+            for item in items:
+                counts[item["state"]] = counts.get(item["state"], 0) + 1
+
+        done = counts.get("completed", 0) + counts.get("failed", 0)
+        remaining = max(job["total"] - done, 0)
+        until = datetime.fromisoformat(job["finishedAt"]) if job.get("finishedAt") else datetime.now(timezone.utc)
+        elapsed = (until - datetime.fromisoformat(job["createdAt"])).total_seconds()
+        rate = done / elapsed if done and elapsed > 0 else None
+
+        return {
+            **job,
+            "counts": counts,
+            "done": done,
+            "remaining": remaining,
+            "percent": round(done / job["total"] * 100, 1) if job["total"] else 100.0,
+            "callsPerMinute": round(rate * 60, 2) if rate else None,
+            "etaSeconds": 0 if not remaining else (round(remaining / rate) if rate else None),
+        }
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                self._wakeup.clear()
+                item = await self._claim_next()
+                if item is None:
+                    # Nothing left to claim here: save what this process still buffers
+                    for partner_id in list(self._pending_saves):
+                        await self._flush_partner(partner_id)
+                    if time.monotonic() - self._recovered_at >= RECOVERY_INTERVAL_SECONDS:
+                        await self._recover_stale()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=IDLE_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process_item(item)
+                await self._flush_if_idle(item["partnerId"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"QA queue worker {index} error: {e}")
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+
+    async def _claim_next(self) -> Optional[Dict[str, Any]]:
+        return await self.db.qa_job_calls.find_one_and_update(
+            {"state": "pending"},
+            {
+                "$set": {
+                    "state": "running",
+                    "claim": str(uuid.uuid4()),
+                    "startedAt": datetime.now(timezone.utc).isoformat(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            projection={"_id": 0},
+            sort=[("enqueuedAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _process_item(self, item: Dict[str, Any]) -> None:
+        partner_doc = await self.db.partner_configs.find_one({"id": item["partnerId"]}, {"_id": 0})
+        if not partner_doc:
+            await self._mark_failed(item, "Partner not found")
+            return
+        partner = PartnerConfig(**partner_doc)
+
+        if item.get("legacy") and not item.get("callData"):
+            # Not prefetched at enqueue time (partner DB was unreachable)
+            try:
+                fetched = await self.analysis.fetch_calls_data(partner, [item["callId"]])
+            except Exception as e:
+                await self._mark_failed(item, f"Could not fetch call data: {e}")
+                return
+            if item["callId"] not in fetched:
+                await self._mark_failed(item, f"Call {item['callId']} not found in partner database")
+                return
+            item["callData"] = fetched[item["callId"]]
+            await self._set_state([item["claim"]], "running", {"callData": item["callData"]})
+
+        result = await self.analysis.process_single_call(item["callData"] or {"id": item["callId"]})
+        if result["status"] != "completed":
+            await self._mark_failed(item, result.get("error"))
+            return
+
+        await self._set_state([item["claim"]], "scored", {"scores": result["scores"]})
+        item["scores"] = result["scores"]
+        self._pending_saves.setdefault(item["partnerId"], []).append(self._save_entry(item))
+
+    async def _flush_if_idle(self, partner_id: str) -> None:
+        """Save a partner's buffered scores once the batch is full or none of its calls are left to score.
+
+        Runs after every processed call, scored or failed, so the last call of
+        a job releases the scores buffered before it.
+        """
+        saves = self._pending_saves.get(partner_id)
+        if not saves:
+            return
+        if len(saves) < SAVE_BATCH_SIZE:
+            in_progress = await self.db.qa_job_calls.count_documents(
+                {"partnerId": partner_id, "state": {"$in": ["pending", "running"]}}
+            )
+            if in_progress:
+                return
+        await self._flush_partner(partner_id)
+
+    @staticmethod
+    def _save_entry(item: Dict[str, Any]) -> Dict[str, Any]:
+        call = item.get("callData") or {}
+        return {
+            "callId": item["callId"],
+            "jobId": item["jobId"],
+            "claim": item["claim"],
+            "tenantId": call.get("tenantId"),
+            "scores": item["scores"],
+        }
+
+    async def _flush_partner(self, partner_id: str) -> None:
+        # Take the buffer before awaiting so concurrent workers don't double-save
+        saves = self._pending_saves.pop(partner_id, [])
+        if not saves:
+            return
+        partner_doc = await self.db.partner_configs.find_one({"id": partner_id}, {"_id": 0})
+        if not partner_doc:
+            await self._set_state([s["claim"] for s in saves], "failed", {"error": "Partner not found"})
+        else:
+            partner = PartnerConfig(**partner_doc)
+            if not await self.analysis.flush_batch_save(partner, saves):
+                # Stay "scored": the stored scores are saved again on recovery
+                logger.warning(f"QA scores for {len(saves)} calls of {partner.partnerName} not saved, will retry")
+                return
+            await self._set_state([s["claim"] for s in saves], "completed")
+        for job_id in dict.fromkeys(s["jobId"] for s in saves):
+            await self._finalize_job(job_id)
+
+    async def _mark_failed(self, item: Dict[str, Any], error: Optional[str]) -> None:
+        await self._set_state([item["claim"]], "failed", {"error": error})
+        await self._finalize_job(item["jobId"])
+
+    async def _set_state(self, claims: List[str], state: str, fields: Optional[Dict] = None) -> None:
+        """Move the calls held under `claims`; calls whose claim expired and was taken over are left alone."""
+        update = {"state": state, **(fields or {})}
+        if state in ("completed", "failed"):
+            update["finishedAt"] = datetime.now(timezone.utc).isoformat()
+            update["active"] = False
+        await self.db.qa_job_calls.update_many({"claim": {"$in": claims}}, {"$set": update})
+
+    async def _finalize_job(self, job_id: str) -> None:
+        """Close the job and send its summary email once no call is left in flight."""
+        active = await self.db.qa_job_calls.count_documents(
+            {"jobId": job_id, "state": {"$in": ACTIVE_STATES}}
+        )
+        if active:
+            return
+
+        items = await self.db.qa_job_calls.find({"jobId": job_id}, {"_id": 0}).to_list(None)
+        completed = sum(1 for i in items if i["state"] == "completed")
+        failed = len(items) - completed
+
+        # Only the worker that flips the status sends the email
+        job = await self.db.qa_jobs.find_one_and_update(
+            {"id": job_id, "status": {"$ne": "completed"}},
+            {"$set": {
+                "status": "completed",
+                "completed": completed,
+                "failed": failed,
+                "finishedAt": datetime.now(timezone.utc).isoformat(),
+            }},
+            projection={"_id": 0},
+        )
+        if not job:
+            return
+
+        results = [
+            {"callId": i["callId"], "status": "completed", "scores": i.get("scores"), "call": i.get("callData")}
+            if i["state"] == "completed"
+            else {"callId": i["callId"], "status": "failed", "error": i.get("error")}
+            for i in items
+        ]
+        logger.info(f"QA job {job_id} complete for {job['partnerName']}: {completed} completed, {failed} failed")
+        await self.analysis.send_analysis_summary_email(results, job["partnerName"], job.get("reportDate"))
@@ -0,0 +1,147 @@
+"""
+QA report files for email delivery.
+
+Rows are written straight into the (optionally compressed) output, which is a
+SpooledTemporaryFile: small reports stay in memory, large ones spill to disk,
+and at no point is the whole CSV held as a string. Reports above
+MAX_ATTACHMENT_BYTES are uploaded to QA_REPORT_S3_BUCKET through S3Service and
+linked instead of attached; without a bucket they are zipped, and refused if
+still too large, so SES message limits are never hit.
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import tempfile
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.s3_service import S3Service
+
+logger = logging.getLogger(__name__)
+
+REPORT_COMPRESSION = os.environ.get("QA_REPORT_COMPRESSION", "none")  # "none" | "gzip" | "zip"
+# SES caps messages at 10MB after base64 (+37%), so keep attachments well below
+MAX_ATTACHMENT_BYTES = int(float(os.environ.get("QA_REPORT_MAX_ATTACHMENT_MB", "7")) * 1024 * 1024)
+REPORT_S3_BUCKET = os.environ.get("QA_REPORT_S3_BUCKET", "")
+REPORT_S3_PREFIX = os.environ.get("QA_REPORT_S3_PREFIX", "qa-reports/")
+REPORT_S3_REGION = os.environ.get("QA_REPORT_S3_REGION", "us-east-1")
+REPORT_S3_ENDPOINT = os.environ.get("QA_REPORT_S3_ENDPOINT", "") or None  # S3-compatible storage
+REPORT_LINK_EXPIRY_SECONDS = 7 * 24 * 3600  # longest SigV4 presigned URL
+SPOOL_MAX_BYTES = 1024 * 1024
+
+REPORT_HEADER = [
+    "Call ID", "Contact", "Phone", "Campaign", "Duration",
+    "AI Voice Quality", "AI Latency", "AI Conversation Quality",
+    "Human Voice Quality", "Human Latency", "Human Conversation Quality",
+    "Notes",
+]
+
+_FORMATS = {
+    "none": (".csv", "text/csv"),
+    "gzip": (".csv.gz", "application/gzip"),
+    "zip": (".zip", "application/zip"),
+}
+
+
+def _format_duration(seconds) -> str:
+    if not seconds:
+        return "0:00"
+    m, s = divmod(int(seconds), 60)
+    return f"{m}:{s:02d}"
+
+
+def report_row(call: Dict[str, Any]) -> List[Any]:
+    qa = call.get("qaAnalysis") or {}
+    contact_name = f"{call.get('contactFirstName', '') or ''} {call.get('contactLastName', '') or ''}".strip()
+    return [
+        call.get("id", ""),
+        contact_name,
+        call.get("contactPhone", "") or "",
+        call.get("campaignName", "") or "",
+        _format_duration(call.get("duration")),
+        qa.get("aiVoiceQuality", ""),
+        qa.get("aiLatency", ""),
+        qa.get("aiConversationQuality", ""),
+        qa.get("humanVoiceQuality", ""),
+        qa.get("humanLatency", ""),
+        qa.get("humanConversationQuality", ""),
+        qa.get("aiNotes", "") or "",
+    ]
+
+
+def _write_csv(calls: Iterable[Dict[str, Any]], binary_out) -> None:
+    text = io.TextIOWrapper(binary_out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(REPORT_HEADER)
+    for call in calls:
+        writer.writerow(report_row(call))
+    text.flush()
+    text.detach()  # leave closing the underlying stream to the caller
+
+
+def build_qa_report(
+    calls: Iterable[Dict[str, Any]], base_name: str, compression: str = REPORT_COMPRESSION
+) -> Tuple[str, Any, str, int]:
+    """Write the report. Returns (filename, file rewound to 0, mime type, size in bytes).
+
+    The caller owns the returned file and must close it.
+    """
+    if compression not in _FORMATS:
+        logger.warning(f"Unknown QA report compression '{compression}', using none")
+        compression = "none"
+    extension, mime_type = _FORMATS[compression]
+
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        if compression == "gzip":
+            with gzip.GzipFile(filename=f"{base_name}.csv", mode="wb", fileobj=out) as gz:
+                _write_csv(calls, gz)
+        elif compression == "zip":
+            with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                with archive.open(f"{base_name}.csv", "w", force_zip64=True) as member:
+                    _write_csv(calls, member)
+        else:
+            _write_csv(calls, out)
+        size = out.tell()
+        out.seek(0)
+    except BaseException:
+        out.close()
+        raise
+    return f"{base_name}{extension}", out, mime_type, size
+
+
+def report_s3_config() -> Dict[str, Any]:
+    """The report bucket in the s3Config shape S3Service expects, with plain-text credentials."""
+    return {
+        "enabled": bool(REPORT_S3_BUCKET),
+        "bucket": REPORT_S3_BUCKET,
+        "region": REPORT_S3_REGION,
+        "accessKeyId": os.environ.get("QA_REPORT_S3_ACCESS_KEY_ID", ""),
+        "secretAccessKey": os.environ.get("QA_REPORT_S3_SECRET_ACCESS_KEY", ""),
+    }
+
+
+async def upload_qa_report(
+    s3_service: Optional[S3Service], s3_config: Optional[Dict[str, Any]],
+    fileobj, filename: str, mime_type: str,
+) -> Optional[str]:
+    """Upload an oversized report and return a download link, or None if that is not possible."""
+    if s3_service is None or not s3_config or not s3_config.get("enabled"):
+        logger.warning("QA report exceeds the attachment limit but QA_REPORT_S3_BUCKET is not set")
+        return None
+    try:
+        result = await s3_service.upload_fileobj(
+            s3_config, fileobj, f"{REPORT_S3_PREFIX}{filename}", mime_type,
+            endpoint_url=REPORT_S3_ENDPOINT, expiry=REPORT_LINK_EXPIRY_SECONDS, decrypted=True,
+        )
+    except Exception as e:
+        logger.error(f"QA report upload failed: {type(e).__name__}: {e}")
+        return None
+    finally:
+        fileobj.seek(0)
+    if "error" in result:
+        logger.error(f"QA report upload failed: {result['error']}")
+        return None
+    return result["presignedUrl"]
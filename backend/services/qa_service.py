@@ -1,8 +1,10 @@
+import base64
+import binascii
 import json
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional
-from models import PartnerConfig, QACallResponse, QAAnalysisData, QAReviewRequest
+from typing import List, Optional, Tuple
+from models import PartnerConfig, QACallPage, QACallResponse, QAAnalysisData, QAReviewRequest
 from services.ssh_connection import SSHConnectionService
 
 logger = logging.getLogger(__name__)
@@ -33,25 +35,15 @@ def parse_messages_to_transcript(messages_raw) -> Optional[str]:
         return None
 
 
-class QAService:
-    def __init__(self, ssh_service: SSHConnectionService):
-        self.ssh_service = ssh_service
-
-    async def get_qa_calls(
-        self, partner: PartnerConfig, date: str, min_minutes: int = 2
-    ) -> List[QACallResponse]:
-        """Fetch QA calls for a given date with minimum duration filter."""
-        min_seconds = min_minutes * 60
-
-        query = """
-            SELECT
+# Columns shared by the list and single-call queries; `messages` is added
+# only when transcripts are wanted.
+QA_CALL_COLUMNS = """
                 c.id,
                 c.tenantId,
                 c.duration,
                 c.status,
                 c.endReason,
                 c.recordingUrl,
-                c.messages,
                 c.summary,
                 c.createdAt,
                 c.vmBeepAt,
@@ -67,99 +59,155 @@ class QAService:
                 qa.humanVoiceQuality,
                 qa.humanLatency,
                 qa.humanConversationQuality,
-                qa.humanNotes
+                qa.humanNotes"""
+
+QA_CALL_JOINS = """
             FROM calls c
             LEFT JOIN campaigns camp ON c.campaignId = camp.id
             LEFT JOIN contacts cont ON c.contactId = cont.id
-            LEFT JOIN qa_analysis qa ON qa.callId = c.id
-            WHERE DATE(c.createdAt) = %s
-              AND (c.duration IS NOT NULL AND c.duration >= %s)
-            ORDER BY c.createdAt DESC
-        """
+            LEFT JOIN qa_analysis qa ON qa.callId = c.id"""
+
+QA_SCORE_COLUMNS = (
+    "qa.aiVoiceQuality", "qa.aiLatency", "qa.aiConversationQuality",
+    "qa.humanVoiceQuality", "qa.humanLatency", "qa.humanConversationQuality",
+)
+
+
+def encode_qa_cursor(created_at, call_id: int) -> str:
+    """Opaque keyset cursor for the (createdAt, id) position of the last returned call."""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat(sep=" ")
+    raw = json.dumps([created_at, call_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
 
-        results = await self.ssh_service.execute_query(
-            partner, query, (date, min_seconds)
+def decode_qa_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of encode_qa_cursor. Raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, call_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), int(call_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _row_to_qa_call(row: dict, include_transcript: bool = True) -> QACallResponse:
+    qa_data = None
+    if row.get("aiVoiceQuality") is not None or row.get("humanVoiceQuality") is not None:
+        qa_data = QAAnalysisData(
+            aiVoiceQuality=row.get("aiVoiceQuality"),
+            aiLatency=row.get("aiLatency"),
+            aiConversationQuality=row.get("aiConversationQuality"),
+            aiNotes=row.get("aiNotes"),
+            humanVoiceQuality=row.get("humanVoiceQuality"),
+            humanLatency=row.get("humanLatency"),
+            humanConversationQuality=row.get("humanConversationQuality"),
+            humanNotes=row.get("humanNotes"),
         )
 
-        calls = []
-        for row in results:
-            qa_data = None
-            if row.get("aiVoiceQuality") is not None or row.get("humanVoiceQuality") is not None:
-                qa_data = QAAnalysisData(
-                    aiVoiceQuality=row.get("aiVoiceQuality"),
-                    aiLatency=row.get("aiLatency"),
-                    aiConversationQuality=row.get("aiConversationQuality"),
-                    aiNotes=row.get("aiNotes"),
-                    humanVoiceQuality=row.get("humanVoiceQuality"),
-                    humanLatency=row.get("humanLatency"),
-                    humanConversationQuality=row.get("humanConversationQuality"),
-                    humanNotes=row.get("humanNotes"),
-                )
-
-            created_at = row.get("createdAt")
-            if isinstance(created_at, datetime):
-                created_at = created_at.isoformat()
-
-            vm_beep_at = row.get("vmBeepAt")
-            if isinstance(vm_beep_at, datetime):
-                vm_beep_at = vm_beep_at.isoformat()
-
-            calls.append(
-                QACallResponse(
-                    id=row["id"],
-                    tenantId=row.get("tenantId"),
-                    duration=row.get("duration"),
-                    status=row.get("status"),
-                    endReason=row.get("endReason"),
-                    recordingUrl=row.get("recordingUrl"),
-                    transcript=parse_messages_to_transcript(row.get("messages")),
-                    summary=row.get("summary"),
-                    createdAt=created_at,
-                    campaignName=row.get("campaignName"),
-                    campaignId=row.get("campaignId"),
-                    contactFirstName=row.get("contactFirstName"),
-                    contactLastName=row.get("contactLastName"),
-                    contactPhone=row.get("contactPhone"),
-                    vmBeepAt=vm_beep_at,
-                    qaAnalysis=qa_data,
-                )
-            )
-
-        return calls
+    created_at = row.get("createdAt")
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+
+    vm_beep_at = row.get("vmBeepAt")
+    if isinstance(vm_beep_at, datetime):
+        vm_beep_at = vm_beep_at.isoformat()
+
+    return QACallResponse(
+        id=row["id"],
+        tenantId=row.get("tenantId"),
+        duration=row.get("duration"),
+        status=row.get("status"),
+        endReason=row.get("endReason"),
+        recordingUrl=row.get("recordingUrl"),
+        transcript=parse_messages_to_transcript(row.get("messages")) if include_transcript else None,
+        summary=row.get("summary"),
+        createdAt=created_at,
+        campaignName=row.get("campaignName"),
+        campaignId=row.get("campaignId"),
+        contactFirstName=row.get("contactFirstName"),
+        contactLastName=row.get("contactLastName"),
+        contactPhone=row.get("contactPhone"),
+        vmBeepAt=vm_beep_at,
+        qaAnalysis=qa_data,
+    )
+
+
+class QAService:
+    def __init__(self, ssh_service: SSHConnectionService):
+        self.ssh_service = ssh_service
+
+    async def get_qa_calls(
+        self, partner: PartnerConfig, date: str, min_minutes: int = 2,
+        max_minutes: Optional[int] = None, max_score: Optional[int] = None,
+        campaign_id: Optional[int] = None, limit: Optional[int] = None,
+        cursor: Optional[str] = None, include_transcript: bool = True,
+    ) -> QACallPage:
+        """Fetch QA calls for a given date, newest first.
+
+        With `limit`, returns one page and a `nextCursor` to pass back for the
+        next one; pages are keyed on (createdAt, id), so they stay stable while
+        new calls arrive. `max_score` keeps calls where any AI or human score
+        is at or below it. Without `include_transcript`, the `messages` blob is
+        not selected at all; fetch a single call for its transcript.
+        """
+        day = datetime.strptime(date, "%Y-%m-%d")
+        # Range on createdAt instead of DATE(createdAt) so the index can be used
+        conditions = [
+            "c.createdAt >= %s",
+            "c.createdAt < %s",
+            "(c.duration IS NOT NULL AND c.duration >= %s)",
+        ]
+        params: list = [
+            day.strftime("%Y-%m-%d"),
+            (day + timedelta(days=1)).strftime("%Y-%m-%d"),
+            min_minutes * 60,
+        ]
+        if max_minutes is not None:
+            conditions.append("c.duration <= %s")
+            params.append(max_minutes * 60)
+        if campaign_id is not None:
+            conditions.append("c.campaignId = %s")
+            params.append(campaign_id)
+        if max_score is not None:
+            conditions.append("(" + " OR ".join(f"{col} <= %s" for col in QA_SCORE_COLUMNS) + ")")
+            params.extend([max_score] * len(QA_SCORE_COLUMNS))
+        if cursor:
+            cursor_created_at, cursor_id = decode_qa_cursor(cursor)
+            conditions.append("(c.createdAt < %s OR (c.createdAt = %s AND c.id < %s))")
+            params.extend([cursor_created_at, cursor_created_at, cursor_id])
+
+        columns = QA_CALL_COLUMNS + (",\n                c.messages" if include_transcript else "")
+        query = (
+            f"SELECT{columns}{QA_CALL_JOINS}\n"
+            f"            WHERE " + "\n              AND ".join(conditions) + "\n"
+            "            ORDER BY c.createdAt DESC, c.id DESC"
+        )
+        if limit is not None:
+            # One extra row tells us whether there is a next page
+            query += "\n            LIMIT %s"
+            params.append(limit + 1)
+
+        results = await self.ssh_service.execute_query(partner, query, tuple(params))
+
+        next_cursor = None
+        if limit is not None and len(results) > limit:
+            results = results[:limit]
+            last = results[-1]
+            next_cursor = encode_qa_cursor(last.get("createdAt"), last["id"])
+
+        return QACallPage(
+            calls=[_row_to_qa_call(row, include_transcript) for row in results],
+            nextCursor=next_cursor,
+        )
 
     async def get_qa_call(
         self, partner: PartnerConfig, call_id: int
     ) -> Optional[QACallResponse]:
         """Fetch a single QA call by ID."""
-        query = """
-            SELECT
-                c.id,
-                c.tenantId,
-                c.duration,
-                c.status,
-                c.endReason,
-                c.recordingUrl,
-                c.messages,
-                c.summary,
-                c.createdAt,
-                c.vmBeepAt,
-                c.campaignId,
-                camp.name AS campaignName,
-                cont.firstName AS contactFirstName,
-                cont.lastName AS contactLastName,
-                cont.phone AS contactPhone,
-                qa.aiVoiceQuality,
-                qa.aiLatency,
-                qa.aiConversationQuality,
-                qa.aiNotes,
-                qa.humanVoiceQuality,
-                qa.humanLatency,
-                qa.humanConversationQuality,
-                qa.humanNotes
-            FROM calls c
-            LEFT JOIN campaigns camp ON c.campaignId = camp.id
-            LEFT JOIN contacts cont ON c.contactId = cont.id
-            LEFT JOIN qa_analysis qa ON qa.callId = c.id
+        query = f"""
+            SELECT{QA_CALL_COLUMNS},
+                c.messages{QA_CALL_JOINS}
             WHERE c.id = %s
         """
 
@@ -168,47 +216,7 @@ class QAService:
         if not results:
             return None
 
-        row = results[0]
-
-        qa_data = None
-        if row.get("aiVoiceQuality") is not None or row.get("humanVoiceQuality") is not None:
-            qa_data = QAAnalysisData(
-                aiVoiceQuality=row.get("aiVoiceQuality"),
-                aiLatency=row.get("aiLatency"),
-                aiConversationQuality=row.get("aiConversationQuality"),
-                aiNotes=row.get("aiNotes"),
-                humanVoiceQuality=row.get("humanVoiceQuality"),
-                humanLatency=row.get("humanLatency"),
-                humanConversationQuality=row.get("humanConversationQuality"),
-                humanNotes=row.get("humanNotes"),
-            )
-
-        created_at = row.get("createdAt")
-        if isinstance(created_at, datetime):
-            created_at = created_at.isoformat()
-
-        vm_beep_at = row.get("vmBeepAt")
-        if isinstance(vm_beep_at, datetime):
-            vm_beep_at = vm_beep_at.isoformat()
-
-        return QACallResponse(
-            id=row["id"],
-            tenantId=row.get("tenantId"),
-            duration=row.get("duration"),
-            status=row.get("status"),
-            endReason=row.get("endReason"),
-            recordingUrl=row.get("recordingUrl"),
-            transcript=parse_messages_to_transcript(row.get("messages")),
-            summary=row.get("summary"),
-            createdAt=created_at,
-            campaignName=row.get("campaignName"),
-            campaignId=row.get("campaignId"),
-            contactFirstName=row.get("contactFirstName"),
-            contactLastName=row.get("contactLastName"),
-            contactPhone=row.get("contactPhone"),
-            vmBeepAt=vm_beep_at,
-            qaAnalysis=qa_data,
-        )
+        return _row_to_qa_call(results[0])
 
     async def update_qa_review(
         self, partner: PartnerConfig, call_id: int, review: QAReviewRequest
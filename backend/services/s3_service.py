@@ -1,7 +1,11 @@
 import os
 import re
+import time
+import asyncio
+import hashlib
 import logging
 import httpx
+from collections import OrderedDict
 from urllib.parse import urlparse, unquote
 from typing import Optional, Dict, Any, Tuple, Generator
 
@@ -13,10 +17,149 @@ from services.encryption import EncryptionService
 
 logger = logging.getLogger(__name__)
 
+# Clients kept per credential fingerprint (partner count is small)
+S3_CLIENT_CACHE_SIZE = 64
+PRESIGNED_URL_CACHE_SIZE = 5000
+# A cached presigned URL is handed out only while it has at least this much life left
+PRESIGNED_URL_MIN_REMAINING_SECONDS = 900
+
 
 class S3Service:
-    def __init__(self, encryption_service: EncryptionService):
+    def __init__(self, encryption_service: EncryptionService, clock=time.monotonic):
         self.encryption_service = encryption_service
+        self._clock = clock
+        self._clients: "OrderedDict[str, Any]" = OrderedDict()
+        # (fingerprint, bucket, key, content type, expiry) -> (url, expires at)
+        self._presigned: "OrderedDict[tuple, Tuple[str, float]]" = OrderedDict()
+
+    @staticmethod
+    def _credential_fingerprint(s3_config: dict, endpoint_url: Optional[str], decrypted: bool = False) -> str:
+        """Identifies a client configuration without decrypting anything.
+
+        Built from the stored (encrypted) key blobs, so editing a partner's
+        credentials changes the fingerprint and the old client is never reused.
+        """
+        parts = [
+            "plain" if decrypted else "encrypted",
+            s3_config.get("accessKeyId", ""),
+            s3_config.get("secretAccessKey", ""),
+            s3_config.get("region", "us-east-1"),
+            endpoint_url or "",
+        ]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _build_client(self, s3_config: dict, endpoint_url: Optional[str], decrypted: bool = False):
+        """Decrypt credentials (unless already `decrypted`) and construct a client.
+
+        Blocking; run off the event loop.
+        """
+        access_key = s3_config.get("accessKeyId", "")
+        secret_key = s3_config.get("secretAccessKey", "")
+        if not decrypted:
+            access_key = self.encryption_service.decrypt(access_key)
+            secret_key = self.encryption_service.decrypt(secret_key)
+        if not access_key or not secret_key:
+            return None
+
+        boto_config = BotoConfig(
+            retries={"max_attempts": 3, "mode": "adaptive"},
+            signature_version="s3v4",
+        )
+        if endpoint_url:
+            boto_config = boto_config.merge(
+                BotoConfig(s3={"addressing_style": "path"})
+            )
+        # A fresh session per client: the default session is not thread-safe
+        return boto3.session.Session().client(
+            "s3",
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=s3_config.get("region", "us-east-1"),
+            endpoint_url=endpoint_url,
+            config=boto_config,
+        )
+
+    async def _get_client(
+        self, s3_config: dict, endpoint_url: Optional[str], decrypted: bool = False
+    ) -> Tuple[Optional[Any], str]:
+        """Cached client for this partner's credentials, plus its fingerprint."""
+        fingerprint = self._credential_fingerprint(s3_config, endpoint_url, decrypted)
+        client = self._clients.get(fingerprint)
+        if client is not None:
+            self._clients.move_to_end(fingerprint)
+            return client, fingerprint
+
+        client = await asyncio.to_thread(self._build_client, s3_config, endpoint_url, decrypted)
+        if client is not None:
+            self._clients[fingerprint] = client
+            if len(self._clients) > S3_CLIENT_CACHE_SIZE:
+                self._clients.popitem(last=False)
+        return client, fingerprint
+
+    async def _presign_get(
+        self, client, fingerprint: str, bucket: str, key: str, content_type: str, expiry: int
+    ) -> str:
+        """Presigned GET URL, reused until it gets close to expiring."""
+        cache_key = (fingerprint, bucket, key, content_type, expiry)
+        now = self._clock()
+        cached = self._presigned.get(cache_key)
+        if cached and cached[1] - now >= min(PRESIGNED_URL_MIN_REMAINING_SECONDS, expiry / 2):
+            self._presigned.move_to_end(cache_key)
+            return cached[0]
+
+        url = await asyncio.to_thread(
+            client.generate_presigned_url,
+            "get_object",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "ResponseContentType": content_type,
+            },
+            ExpiresIn=expiry,
+        )
+        self._presigned[cache_key] = (url, now + expiry)
+        self._presigned.move_to_end(cache_key)
+        if len(self._presigned) > PRESIGNED_URL_CACHE_SIZE:
+            self._presigned.popitem(last=False)
+        return url
+
+    async def upload_fileobj(
+        self,
+        s3_config: dict,
+        fileobj,
+        key: str,
+        content_type: str,
+        endpoint_url: Optional[str] = None,
+        expiry: int = 3600,
+        decrypted: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Upload a file to the configured bucket and return a presigned GET URL for it.
+
+        The file is streamed from its current position by boto3 in a worker
+        thread; the caller keeps ownership of it. Pass `decrypted=True` when
+        s3_config holds plain-text credentials rather than stored encrypted ones.
+        """
+        bucket = s3_config.get("bucket") if s3_config else None
+        if not bucket:
+            return {"error": "No S3 bucket configured"}
+
+        try:
+            client, fingerprint = await self._get_client(s3_config, endpoint_url, decrypted)
+            if client is None:
+                logger.error("[S3] Missing decrypted credentials")
+                return {"error": "Missing AWS credentials after decryption"}
+
+            await asyncio.to_thread(
+                client.upload_fileobj, fileobj, bucket, key, ExtraArgs={"ContentType": content_type}
+            )
+            presigned = await self._presign_get(client, fingerprint, bucket, key, content_type, expiry)
+            logger.info(f"[S3] Uploaded {key} to {bucket}")
+            return {"presignedUrl": presigned, "contentType": content_type}
+
+        except ClientError as e:
+            logger.error(f"[S3] Upload of {key} failed: {e}")
+            return {"error": f"S3 client error: {str(e)}"}
 
     def _parse_s3_url(self, url: str) -> tuple[Optional[str], Optional[str]]:
         """
@@ -94,7 +237,7 @@ class S3Service:
         }
         return ext_map.get(ext, fallback)
 
-    def get_playable_url(
+    async def get_playable_url(
         self, s3_config: dict, recording_url: str, expiry: int = 3600
     ) -> Dict[str, Any]:
         """
@@ -108,6 +251,10 @@ class S3Service:
 
         The browser's native <audio> handles range requests, buffering, and
         seek — no file-size limit and zero server memory overhead.
+
+        Clients are cached per credential fingerprint and presigned URLs until
+        shortly before they expire, so replaying a recording costs no boto3
+        work at all; a cache miss runs boto3 in a worker thread.
         """
         parsed = urlparse(recording_url)
         hostname = parsed.hostname or ""
@@ -119,15 +266,9 @@ class S3Service:
             return {"presignedUrl": recording_url, "contentType": content_type}
 
         # ── Private S3 (Linode, etc.) — generate presigned URL ──
-        access_key = self.encryption_service.decrypt(s3_config.get("accessKeyId", ""))
-        secret_key = self.encryption_service.decrypt(s3_config.get("secretAccessKey", ""))
         region = s3_config.get("region", "us-east-1")
         config_bucket = s3_config.get("bucket")
 
-        if not access_key or not secret_key:
-            logger.error("[S3] Missing decrypted credentials")
-            return {"error": "Missing AWS credentials after decryption"}
-
         bucket, key, endpoint_url = self._resolve_bucket_key(recording_url, config_bucket)
         if not bucket or not key:
             return {"error": f"Cannot parse bucket/key from URL: {recording_url[:100]}"}
@@ -139,65 +280,35 @@ class S3Service:
 
         content_type = self._detect_content_type(key)
 
-        boto_config = BotoConfig(
-            retries={"max_attempts": 3, "mode": "adaptive"},
-            signature_version="s3v4",
-        )
-        if endpoint_url:
-            boto_config = boto_config.merge(
-                BotoConfig(s3={"addressing_style": "path"})
-            )
-
         try:
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=access_key,
-                aws_secret_access_key=secret_key,
-                region_name=region,
-                endpoint_url=endpoint_url,
-                config=boto_config,
-            )
+            s3_client, fingerprint = await self._get_client(s3_config, endpoint_url)
+            if s3_client is None:
+                logger.error("[S3] Missing decrypted credentials")
+                return {"error": "Missing AWS credentials after decryption"}
 
-            presigned = s3_client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": bucket,
-                    "Key": key,
-                    "ResponseContentType": content_type,
-                },
-                ExpiresIn=expiry,
-            )
-            logger.info(f"[S3] Presigned URL generated for private S3")
+            presigned = await self._presign_get(s3_client, fingerprint, bucket, key, content_type, expiry)
             return {"presignedUrl": presigned, "contentType": content_type}
 
         except ClientError as e:
             logger.error(f"[S3] Failed to generate presigned URL: {e}")
             return {"error": f"S3 client error: {str(e)}"}
 
-    def generate_presigned_url(
+    async def generate_presigned_url(
         self,
         s3_config: dict,
         recording_url: str,
         expiry: int = 3600,
     ) -> Dict[str, Any]:
         """
-        Generate a presigned URL for a private S3 object.
+        Generate a presigned URL for a private S3 object after checking it exists.
         Returns dict with presignedUrl and debug info.
         """
         if not s3_config or not s3_config.get("enabled"):
             return {"error": "S3 not enabled"}
 
-        access_key = self.encryption_service.decrypt(s3_config.get("accessKeyId", ""))
-        secret_key = self.encryption_service.decrypt(s3_config.get("secretAccessKey", ""))
         region = s3_config.get("region", "us-east-1")
         config_bucket = s3_config.get("bucket")
 
-        if not access_key or not secret_key:
-            logger.error("[S3] Missing decrypted AWS credentials")
-            return {"error": "Missing AWS credentials after decryption"}
-
-        logger.info(f"[S3] Decrypted access_key starts with: {access_key[:4]}...")
-
         bucket, key = self._parse_s3_url(recording_url)
         logger.info(f"[S3] Parsed URL: bucket={bucket}, key={key}, input={recording_url[:120]}")
         if not bucket or not key:
@@ -207,31 +318,18 @@ class S3Service:
             else:
                 return {"error": f"Cannot parse bucket/key from URL: {recording_url[:100]}"}
 
-        # Detect content type from file extension
-        ext = os.path.splitext(key)[1].lower()
-        content_type_map = {
-            ".mp3": "audio/mpeg",
-            ".wav": "audio/wav",
-            ".ogg": "audio/ogg",
-            ".m4a": "audio/mp4",
-            ".flac": "audio/flac",
-            ".webm": "audio/webm",
-            ".aac": "audio/aac",
-        }
-        content_type = content_type_map.get(ext, "audio/mpeg")
-        logger.info(f"[S3] bucket={bucket}, key={key}, ext='{ext}', content_type={content_type}, region={region}")
+        content_type = self._detect_content_type(key)
+        logger.info(f"[S3] bucket={bucket}, key={key}, content_type={content_type}, region={region}")
 
         try:
-            client = boto3.client(
-                "s3",
-                aws_access_key_id=access_key,
-                aws_secret_access_key=secret_key,
-                region_name=region,
-            )
+            client, fingerprint = await self._get_client(s3_config, None)
+            if client is None:
+                logger.error("[S3] Missing decrypted AWS credentials")
+                return {"error": "Missing AWS credentials after decryption"}
 
             # First: HEAD the object to verify it exists and get its actual content type
             try:
-                head = client.head_object(Bucket=bucket, Key=key)
+                head = await asyncio.to_thread(client.head_object, Bucket=bucket, Key=key)
                 actual_ct = head.get("ContentType", "unknown")
                 size = head.get("ContentLength", 0)
                 logger.info(f"[S3] HEAD success: ContentType={actual_ct}, Size={size} bytes")
@@ -248,15 +346,7 @@ class S3Service:
                     "key": key,
                 }
 
-            presigned = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": bucket,
-                    "Key": key,
-                    "ResponseContentType": content_type,
-                },
-                ExpiresIn=expiry,
-            )
+            presigned = await self._presign_get(client, fingerprint, bucket, key, content_type, expiry)
             logger.info(f"[S3] Presigned URL generated successfully")
             return {"presignedUrl": presigned, "contentType": content_type}
 
@@ -1,8 +1,10 @@
 import paramiko
 import pymysql
+import asyncio
 import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
 from models import PartnerConfig, ConnectionStatus, TestConnectionResponse, ConnectionLog
 from services.encryption import EncryptionService
@@ -18,7 +20,6 @@ class SSHConnectionService:
     async def test_connection(self, partner: PartnerConfig) -> TestConnectionResponse:
         """Test SSH tunnel and MySQL connection"""
         from sshtunnel import SSHTunnelForwarder
-        import tempfile
         
         start_time = time.time()
         
@@ -33,22 +34,7 @@ class SSHConnectionService:
                 # Test SSH connection with tunnel
                 try:
                     # Prepare SSH authentication
-                    ssh_pkey = None
-                    ssh_password = None
-                    
-                    if partner.sshConfig.privateKey:
-                        # Use private key authentication
-                        private_key_str = self.encryption_service.decrypt(partner.sshConfig.privateKey)
-                        
-                        # Write key to temp file for sshtunnel
-                        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.pem') as key_file:
-                            key_file.write(private_key_str)
-                            key_file_path = key_file.name
-                        
-                        ssh_pkey = key_file_path
-                    elif partner.sshConfig.password:
-                        # Use password authentication
-                        ssh_password = self.encryption_service.decrypt(partner.sshConfig.password)
+                    ssh_pkey, ssh_password = self._ssh_credentials(partner)
                     
                     # Create SSH tunnel
                     tunnel = SSHTunnelForwarder(
@@ -84,12 +70,6 @@ class SSHConnectionService:
                     
                     # Clean up
                     tunnel.stop()
-                    if ssh_pkey:
-                        import os
-                        try:
-                            os.remove(ssh_pkey)
-                        except Exception:
-                            pass
                     
                     await self._log_connection(partner.id, ConnectionStatus.SUCCESS, None, response_time)
                     
@@ -109,12 +89,6 @@ class SSHConnectionService:
                             tunnel.stop()
                         except:
                             pass
-                    if ssh_pkey:
-                        import os
-                        try:
-                            os.remove(ssh_pkey)
-                        except:
-                            pass
                     
                     await self._log_connection(partner.id, ConnectionStatus.SSH_FAILED, str(e), response_time)
                     return TestConnectionResponse(
@@ -172,7 +146,6 @@ class SSHConnectionService:
     async def execute_query(self, partner: PartnerConfig, query: str, params: tuple = None):
         """Execute SQL query on partner database through SSH tunnel"""
         from sshtunnel import SSHTunnelForwarder
-        import tempfile
         
         try:
             if not partner.sshConfig.enabled:
@@ -192,22 +165,7 @@ class SSHConnectionService:
                 db_password = self.encryption_service.decrypt(partner.dbPassword)
                 
                 # Prepare SSH authentication
-                ssh_pkey = None
-                ssh_password = None
-                
-                if partner.sshConfig.privateKey:
-                    # Use private key authentication
-                    private_key_str = self.encryption_service.decrypt(partner.sshConfig.privateKey)
-                    
-                    # Write key to temp file for sshtunnel
-                    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.pem') as key_file:
-                        key_file.write(private_key_str)
-                        key_file_path = key_file.name
-                    
-                    ssh_pkey = key_file_path
-                elif partner.sshConfig.password:
-                    # Use password authentication
-                    ssh_password = self.encryption_service.decrypt(partner.sshConfig.password)
+                ssh_pkey, ssh_password = self._ssh_credentials(partner)
                 
                 # Create SSH tunnel
                 tunnel = SSHTunnelForwarder(
@@ -244,13 +202,6 @@ class SSHConnectionService:
                     
                 finally:
                     tunnel.stop()
-                    # Clean up temp key file
-                    if ssh_pkey:
-                        import os
-                        try:
-                            os.remove(ssh_pkey)
-                        except Exception:
-                            pass
             
             # For direct connection (no SSH)
             cursor = mysql_conn.cursor()
@@ -266,213 +217,52 @@ class SSHConnectionService:
             raise
     
     async def execute_batch_queries(self, partner: PartnerConfig, queries: list) -> list:
-        """Execute multiple queries through a single SSH tunnel connection for efficiency"""
-        from sshtunnel import SSHTunnelForwarder
-        import tempfile
-        
+        """Execute multiple queries through a single SSH tunnel connection for efficiency.
+
+        Blocking I/O runs in a worker thread.
+        """
         try:
-            if not partner.sshConfig.enabled:
-                # Direct connection without SSH
-                db_password = self.encryption_service.decrypt(partner.dbPassword)
-                mysql_conn = pymysql.connect(
-                    host=partner.dbHost,
-                    port=partner.dbPort,
-                    user=partner.dbUsername,
-                    password=db_password,
-                    database=partner.dbName,
-                    connect_timeout=30,
-                    cursorclass=pymysql.cursors.DictCursor
-                )
-                
-                results = []
-                cursor = mysql_conn.cursor()
-                for query_info in queries:
-                    query = query_info['query']
-                    params = query_info.get('params', None)
-                    cursor.execute(query, params)
-                    results.append(cursor.fetchall())
-                cursor.close()
-                mysql_conn.close()
-                
-                return results
-            else:
-                # Connection through SSH tunnel - reuse tunnel for all queries
-                db_password = self.encryption_service.decrypt(partner.dbPassword)
-                
-                # Prepare SSH authentication
-                ssh_pkey = None
-                ssh_password = None
-                
-                if partner.sshConfig.privateKey:
-                    # Use private key authentication
-                    private_key_str = self.encryption_service.decrypt(partner.sshConfig.privateKey)
-                    
-                    # Write key to temp file for sshtunnel
-                    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.pem') as key_file:
-                        key_file.write(private_key_str)
-                        key_file_path = key_file.name
-                    
-                    ssh_pkey = key_file_path
-                elif partner.sshConfig.password:
-                    # Use password authentication
-                    ssh_password = self.encryption_service.decrypt(partner.sshConfig.password)
-                
-                # Create SSH tunnel (ONE tunnel for all queries)
-                tunnel = SSHTunnelForwarder(
-                    (partner.sshConfig.host, partner.sshConfig.port),
-                    ssh_username=partner.sshConfig.username,
-                    ssh_pkey=ssh_pkey if ssh_pkey else None,
-                    ssh_password=ssh_password if ssh_password else None,
-                    remote_bind_address=(partner.dbHost, partner.dbPort),
-                    local_bind_address=('127.0.0.1', 0)  # Use random local port
-                )
-                
-                tunnel.start()
-                
-                try:
-                    # Connect to MySQL through tunnel
-                    mysql_conn = pymysql.connect(
-                        host='127.0.0.1',
-                        port=tunnel.local_bind_port,
-                        user=partner.dbUsername,
-                        password=db_password,
-                        database=partner.dbName,
-                        connect_timeout=30,
-                        cursorclass=pymysql.cursors.DictCursor
-                    )
-                    
-                    # Execute all queries through same connection
-                    results = []
-                    cursor = mysql_conn.cursor()
-                    for query_info in queries:
-                        query = query_info['query']
-                        params = query_info.get('params', None)
-                        cursor.execute(query, params)
-                        results.append(cursor.fetchall())
-                    cursor.close()
-                    mysql_conn.close()
-                    
-                    return results
-                    
-                finally:
-                    tunnel.stop()
-                    # Clean up temp key file
-                    if ssh_pkey:
-                        import os
-                        try:
-                            os.remove(ssh_pkey)
-                        except Exception:
-                            pass
-            
+            return await asyncio.to_thread(self._execute_batch_queries_sync, partner, queries)
         except Exception as e:
             logger.error(f"Error executing batch queries: {str(e)}")
             raise
-    
+
+    def _execute_batch_queries_sync(self, partner: PartnerConfig, queries: list) -> list:
+        with self._connect(partner, cursorclass=pymysql.cursors.DictCursor) as mysql_conn:
+            results = []
+            cursor = mysql_conn.cursor()
+            for query_info in queries:
+                cursor.execute(query_info['query'], query_info.get('params', None))
+                results.append(cursor.fetchall())
+            cursor.close()
+            return results
+
     async def execute_batch_updates(self, partner: PartnerConfig, queries: list) -> list:
         """Execute multiple INSERT/UPDATE queries through a single SSH tunnel connection.
 
         Each entry in queries is a dict: {'query': str, 'params': tuple}.
-        Returns a list of affected row counts.
+        Returns a list of affected row counts. Blocking I/O runs in a worker thread.
         """
-        from sshtunnel import SSHTunnelForwarder
-        import tempfile
-
         try:
-            if not partner.sshConfig.enabled:
-                # Direct connection without SSH
-                db_password = self.encryption_service.decrypt(partner.dbPassword)
-                mysql_conn = pymysql.connect(
-                    host=partner.dbHost,
-                    port=partner.dbPort,
-                    user=partner.dbUsername,
-                    password=db_password,
-                    database=partner.dbName,
-                    connect_timeout=30
-                )
-
-                results = []
-                cursor = mysql_conn.cursor()
-                for query_info in queries:
-                    query = query_info['query']
-                    params = query_info.get('params', None)
-                    cursor.execute(query, params)
-                    results.append(cursor.rowcount)
-                mysql_conn.commit()
-                cursor.close()
-                mysql_conn.close()
-
-                return results
-            else:
-                # Connection through SSH tunnel - reuse tunnel for all updates
-                db_password = self.encryption_service.decrypt(partner.dbPassword)
-
-                # Prepare SSH authentication
-                ssh_pkey = None
-                ssh_password = None
-
-                if partner.sshConfig.privateKey:
-                    private_key_str = self.encryption_service.decrypt(partner.sshConfig.privateKey)
-
-                    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.pem') as key_file:
-                        key_file.write(private_key_str)
-                        key_file_path = key_file.name
-
-                    ssh_pkey = key_file_path
-                elif partner.sshConfig.password:
-                    ssh_password = self.encryption_service.decrypt(partner.sshConfig.password)
-
-                # Create SSH tunnel (ONE tunnel for all updates)
-                tunnel = SSHTunnelForwarder(
-                    (partner.sshConfig.host, partner.sshConfig.port),
-                    ssh_username=partner.sshConfig.username,
-                    ssh_pkey=ssh_pkey if ssh_pkey else None,
-                    ssh_password=ssh_password if ssh_password else None,
-                    remote_bind_address=(partner.dbHost, partner.dbPort),
-                    local_bind_address=('127.0.0.1', 0)
-                )
-
-                tunnel.start()
-
-                try:
-                    mysql_conn = pymysql.connect(
-                        host='127.0.0.1',
-                        port=tunnel.local_bind_port,
-                        user=partner.dbUsername,
-                        password=db_password,
-                        database=partner.dbName,
-                        connect_timeout=30
-                    )
-
-                    results = []
-                    cursor = mysql_conn.cursor()
-                    for query_info in queries:
-                        query = query_info['query']
-                        params = query_info.get('params', None)
-                        cursor.execute(query, params)
-                        results.append(cursor.rowcount)
-                    mysql_conn.commit()
-                    cursor.close()
-                    mysql_conn.close()
-
-                    return results
-
-                finally:
-                    tunnel.stop()
-                    if ssh_pkey:
-                        import os
-                        try:
-                            os.remove(ssh_pkey)
-                        except Exception:
-                            pass
-
+            return await asyncio.to_thread(self._execute_batch_updates_sync, partner, queries)
         except Exception as e:
             logger.error(f"Error executing batch updates: {str(e)}")
             raise
 
+    def _execute_batch_updates_sync(self, partner: PartnerConfig, queries: list) -> list:
+        with self._connect(partner) as mysql_conn:
+            results = []
+            cursor = mysql_conn.cursor()
+            for query_info in queries:
+                cursor.execute(query_info['query'], query_info.get('params', None))
+                results.append(cursor.rowcount)
+            mysql_conn.commit()
+            cursor.close()
+            return results
+
     async def execute_update(self, partner: PartnerConfig, query: str, params: tuple = None) -> int:
         """Execute UPDATE/INSERT query on partner database through SSH tunnel and return affected rows"""
         from sshtunnel import SSHTunnelForwarder
-        import tempfile
         
         try:
             if not partner.sshConfig.enabled:
@@ -491,22 +281,7 @@ class SSHConnectionService:
                 db_password = self.encryption_service.decrypt(partner.dbPassword)
                 
                 # Prepare SSH authentication
-                ssh_pkey = None
-                ssh_password = None
-                
-                if partner.sshConfig.privateKey:
-                    # Use private key authentication
-                    private_key_str = self.encryption_service.decrypt(partner.sshConfig.privateKey)
-                    
-                    # Write key to temp file for sshtunnel
-                    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.pem') as key_file:
-                        key_file.write(private_key_str)
-                        key_file_path = key_file.name
-                    
-                    ssh_pkey = key_file_path
-                elif partner.sshConfig.password:
-                    # Use password authentication
-                    ssh_password = self.encryption_service.decrypt(partner.sshConfig.password)
+                ssh_pkey, ssh_password = self._ssh_credentials(partner)
                 
                 # Create SSH tunnel
                 tunnel = SSHTunnelForwarder(
@@ -543,13 +318,6 @@ class SSHConnectionService:
                     
                 finally:
                     tunnel.stop()
-                    # Clean up temp key file
-                    if ssh_pkey:
-                        import os
-                        try:
-                            os.remove(ssh_pkey)
-                        except Exception:
-                            pass
             
             # For direct connection (no SSH)
             cursor = mysql_conn.cursor()
@@ -565,6 +333,130 @@ class SSHConnectionService:
             logger.error(f"Error executing update query: {str(e)}")
             raise
     
+    async def update_setting_with_audit(
+        self, partner: PartnerConfig, name: str, new_value, audit_user_id: int = 9999999999
+    ) -> Dict[str, Any]:
+        """Read-modify-write one `settings` row plus its settings_auditlogs entry.
+
+        The SELECT ... FOR UPDATE, the conditional UPDATE and the audit INSERT run
+        through a single tunnel, a single connection and a single transaction.
+        An audit failure is rolled back to a savepoint and reported, but does not
+        undo the setting change. Blocking I/O runs in a worker thread.
+
+        Returns {'exists': bool, 'oldValue': str|None, 'updated': bool, 'auditError': str|None}.
+        """
+        try:
+            return await asyncio.to_thread(
+                self._update_setting_with_audit_sync, partner, name, new_value, audit_user_id
+            )
+        except Exception as e:
+            logger.error(f"Error updating setting {name}: {str(e)}")
+            raise
+
+    def _update_setting_with_audit_sync(
+        self, partner: PartnerConfig, name: str, new_value, audit_user_id: int
+    ) -> Dict[str, Any]:
+        result = {"exists": False, "oldValue": None, "updated": False, "auditError": None}
+
+        with self._connect(partner) as mysql_conn:
+            cursor = mysql_conn.cursor()
+            try:
+                mysql_conn.begin()
+                cursor.execute("SELECT value FROM settings WHERE name = %s FOR UPDATE", (name,))
+                row = cursor.fetchone()
+                if row is None:
+                    mysql_conn.rollback()
+                    return result
+
+                result["exists"] = True
+                result["oldValue"] = row[0]
+                if str(row[0]).strip() == str(new_value):
+                    mysql_conn.rollback()
+                    return result
+
+                cursor.execute("UPDATE settings SET value = %s WHERE name = %s", (new_value, name))
+                result["updated"] = True
+
+                cursor.execute("SAVEPOINT audit_log")
+                try:
+                    cursor.execute(
+                        "INSERT INTO settings_auditlogs (userid, oldvalue, newvalue, createdat) "
+                        "VALUES (%s, %s, %s, NOW())",
+                        (audit_user_id, row[0], new_value),
+                    )
+                except Exception as audit_error:
+                    cursor.execute("ROLLBACK TO SAVEPOINT audit_log")
+                    result["auditError"] = str(audit_error)
+
+                mysql_conn.commit()
+                return result
+            except Exception:
+                mysql_conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _ssh_credentials(self, partner: PartnerConfig) -> Tuple[Optional[paramiko.PKey], Optional[str]]:
+        """(parsed private key, password) for the partner's SSH tunnel.
+
+        Keys are decrypted and parsed once and cached in memory by
+        EncryptionService; nothing is written to disk.
+        """
+        if partner.sshConfig.privateKey:
+            return self.encryption_service.load_private_key(
+                partner.sshConfig.privateKey, partner.sshConfig.passphrase
+            ), None
+        if partner.sshConfig.password:
+            return None, self.encryption_service.decrypt(partner.sshConfig.password)
+        return None, None
+
+    @contextmanager
+    def _connect(self, partner: PartnerConfig, cursorclass=None):
+        """Yield a MySQL connection to the partner DB, via SSH tunnel when enabled.
+
+        The connection and the tunnel are cleaned up on exit.
+        """
+        from sshtunnel import SSHTunnelForwarder
+
+        db_password = self.encryption_service.decrypt(partner.dbPassword)
+        connect_kwargs = {
+            "user": partner.dbUsername,
+            "password": db_password,
+            "database": partner.dbName,
+            "connect_timeout": 30,
+        }
+        if cursorclass is not None:
+            connect_kwargs["cursorclass"] = cursorclass
+
+        if not partner.sshConfig.enabled:
+            mysql_conn = pymysql.connect(host=partner.dbHost, port=partner.dbPort, **connect_kwargs)
+            try:
+                yield mysql_conn
+            finally:
+                mysql_conn.close()
+            return
+
+        ssh_pkey, ssh_password = self._ssh_credentials(partner)
+
+        tunnel = SSHTunnelForwarder(
+            (partner.sshConfig.host, partner.sshConfig.port),
+            ssh_username=partner.sshConfig.username,
+            ssh_pkey=ssh_pkey if ssh_pkey else None,
+            ssh_password=ssh_password if ssh_password else None,
+            remote_bind_address=(partner.dbHost, partner.dbPort),
+            local_bind_address=('127.0.0.1', 0)
+        )
+
+        try:
+            tunnel.start()
+            mysql_conn = pymysql.connect(host='127.0.0.1', port=tunnel.local_bind_port, **connect_kwargs)
+            try:
+                yield mysql_conn
+            finally:
+                mysql_conn.close()
+        finally:
+            tunnel.stop()
+
     async def _log_connection(self, partner_id: str, status: ConnectionStatus, error: Optional[str], response_time: int, query_type: str = "test"):
         """Log connection attempt"""
         log = ConnectionLog(
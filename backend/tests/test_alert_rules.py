@@ -0,0 +1,121 @@
+"""
+Unit tests for the declarative alert rule engine — pure NumPy evaluation plus
+threshold loading from an in-memory Mongo.
+Run with: python -m pytest tests/test_alert_rules.py -v
+"""
+import asyncio
+import random
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from services.alert import AlertService
+from services.alert_rules import AlertRuleEngine, compile_rules, parse_thresholds
+from services.in_memory_db import InMemoryDB
+from models import AlertLevel, DashboardSnapshot, PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def row(queued=0, active=0, running=0, limit=10, utilization=None):
+    if utilization is None:
+        utilization = active / limit * 100 if limit > 0 else 0
+    return {
+        "queuedCalls": queued, "activeCalls": active, "runningCampaigns": running,
+        "concurrencyLimit": limit, "utilization": utilization,
+    }
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# 1. Evaluation
+# ---------------------------------------------------------------------------
+
+class TestEvaluate:
+    @pytest.mark.parametrize("metrics,level,rule", [
+        (row(queued=250, active=2, running=5), AlertLevel.CRITICAL, "critical_queue_low_utilization"),
+        (row(queued=150, active=10, running=5), AlertLevel.CRITICAL, "critical_at_capacity"),
+        (row(queued=10, active=9, running=60, limit=9), AlertLevel.CRITICAL, "critical_campaigns_over_capacity"),
+        (row(queued=150, active=3, running=5), AlertLevel.HIGH, "high_growing_queue"),
+        (row(queued=10, active=9, running=40, limit=12), AlertLevel.HIGH, "high_campaigns_limited_concurrency"),
+        (row(queued=75, active=5, running=5), AlertLevel.MEDIUM, "medium_moderate_queue"),
+        (row(queued=60, active=9, running=20, limit=19, utilization=30), AlertLevel.MEDIUM, "medium_campaigns_need_concurrency"),
+        (row(), AlertLevel.IDLE, "idle"),
+        (row(queued=150, active=7, running=5), AlertLevel.NORMAL, "normal_high_utilization"),
+        (row(queued=10, active=1, running=1), AlertLevel.NORMAL, "normal_short_queue"),
+        (row(queued=75, active=2, running=1), AlertLevel.NORMAL, "normal"),
+    ])
+    def test_default_rules(self, metrics, level, rule):
+        result = compile_rules().evaluate(metrics)
+        assert (result.level, result.rule) == (level, rule)
+
+    def test_messages_are_formatted(self):
+        result = compile_rules().evaluate(row(queued=250, active=2, running=5))
+        assert result.message == "High queue (250) with low utilization (20.0%)"
+
+    def test_batch_matches_single_evaluation(self):
+        random.seed(7)
+        rows = [
+            row(
+                queued=random.choice([0, 49, 50, 100, 150, 200, 201]),
+                active=random.choice([0, 3, 6, 10]),
+                running=random.choice([0, 15, 30, 51]),
+                limit=random.choice([0, 9, 10, 14, 19]),
+            )
+            for _ in range(300)
+        ]
+        rules = compile_rules()
+        assert rules.evaluate_batch(rows) == [rules.evaluate(r) for r in rows]
+
+    def test_thresholds_from_settings(self):
+        metrics = row(queued=150, active=1, running=5)
+        assert compile_rules().evaluate(metrics).level == AlertLevel.HIGH
+
+        thresholds = parse_thresholds([
+            {"settingKey": "criticalQueuedThreshold", "settingValue": "120"},
+            {"settingKey": "highQueuedMin", "settingValue": "not a number"},
+            {"settingKey": "refreshInterval", "settingValue": 5},
+        ])
+        assert thresholds["criticalQueuedThreshold"] == 120
+        assert thresholds["highQueuedMin"] == 100
+        assert compile_rules(thresholds).evaluate(metrics).rule == "critical_queue_low_utilization"
+
+
+# ---------------------------------------------------------------------------
+# 2. Engine and alert recording
+# ---------------------------------------------------------------------------
+
+class TestAlertRuleEngine:
+    def test_refresh_recompiles_only_on_change(self):
+        db = InMemoryDB()
+        run(db.system_settings.insert_one({"settingKey": "criticalQueuedThreshold", "settingValue": 200}))
+        engine = AlertRuleEngine(db)
+        compiled = engine.rules
+
+        assert run(engine.refresh()) is compiled
+        run(db.system_settings.update_one({"settingKey": "criticalQueuedThreshold"}, {"$set": {"settingValue": 120}}))
+        assert run(engine.refresh()) is not compiled
+        assert engine.evaluate(row(queued=150, active=1, running=5)).level == AlertLevel.CRITICAL
+
+    def test_alert_records_the_rule(self):
+        partner = PartnerConfig(
+            id="p1", partnerName="P1", dbHost="h", dbName="d", dbUsername="u", dbPassword="p",
+            sshConfig=SSHConfig(enabled=False),
+        )
+        level, message, rule = compile_rules().evaluate(row(queued=150, active=3, running=5))
+        snapshot = DashboardSnapshot(partnerId="p1", alertLevel=level, alertMessage=message, alertRule=rule)
+        service = AlertService(InMemoryDB(), MagicMock())
+
+        run(service.generate_alert(partner, snapshot))
+
+        alert = run(service.db.alert_logs.find_one({"partnerId": "p1"}))
+        assert alert["alertRule"] == "high_growing_queue"
@@ -0,0 +1,194 @@
+"""
+Unit tests for AlertService — in-memory Mongo, email sending mocked.
+Run with: python -m pytest tests/test_alert_service.py -v
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.alert import AlertService
+from services.in_memory_db import InMemoryDB
+from models import AlertLevel, DashboardSnapshot, PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def make_partner(id):
+    return PartnerConfig(
+        id=id,
+        partnerName=f"Partner {id}",
+        dbHost="localhost",
+        dbName="test",
+        dbUsername="user",
+        dbPassword="pass",
+        sshConfig=SSHConfig(enabled=False),
+    )
+
+
+def make_snapshot(partner_id, level, queued=300):
+    return DashboardSnapshot(
+        partnerId=partner_id,
+        queuedCalls=queued,
+        alertLevel=level,
+        alertMessage=f"{level.value} for {partner_id}",
+    )
+
+
+def make_service(db=None, sent=True):
+    email = MagicMock()
+    email.send_alert_digest_email = AsyncMock(return_value=sent)
+    return AlertService(db or InMemoryDB(), email)
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+async def cycle(service, levels):
+    """One sync cycle: an alert per partner, then the digest."""
+    for partner_id, level in levels.items():
+        await service.generate_alert(make_partner(partner_id), make_snapshot(partner_id, level))
+    return await service.flush_digest()
+
+
+# ---------------------------------------------------------------------------
+# 1. Critical alert digest
+# ---------------------------------------------------------------------------
+
+class TestAlertDigest:
+    def test_one_email_per_cycle_for_all_critical_partners(self):
+        service = make_service()
+        included = run(cycle(service, {
+            "p1": AlertLevel.CRITICAL, "p2": AlertLevel.CRITICAL,
+            "p3": AlertLevel.HIGH, "p4": AlertLevel.CRITICAL,
+        }))
+
+        assert included == 3
+        service.email_service.send_alert_digest_email.assert_called_once()
+        alerts, recipients = service.email_service.send_alert_digest_email.call_args.args
+        assert [a["partnerName"] for a in alerts] == ["Partner p1", "Partner p2", "Partner p4"]
+        assert recipients == ["admin@jobtalk.com"]
+
+        emailed = run(service.db.alert_logs.find({"emailSent": True}).to_list(None))
+        assert sorted(a["partnerId"] for a in emailed) == ["p1", "p2", "p4"]
+        assert run(service.db.alert_email_throttle.count_documents({})) == 3
+
+    def test_recipients_come_from_settings(self):
+        db = InMemoryDB()
+        run(db.system_settings.insert_one({"settingKey": "alertRecipients", "settingValue": "a@x.com, b@x.com"}))
+        service = make_service(db)
+        run(cycle(service, {"p1": AlertLevel.CRITICAL}))
+        assert service.email_service.send_alert_digest_email.call_args.args[1] == ["a@x.com", "b@x.com"]
+
+    def test_partner_emailed_at_most_once_per_hour(self):
+        service = make_service()
+        run(cycle(service, {"p1": AlertLevel.CRITICAL}))
+        # Resolves, then goes critical again within the hour
+        run(cycle(service, {"p1": AlertLevel.NORMAL}))
+        assert run(cycle(service, {"p1": AlertLevel.CRITICAL, "p2": AlertLevel.CRITICAL})) == 1
+
+        last_alerts = service.email_service.send_alert_digest_email.call_args.args[0]
+        assert [a["partnerId"] for a in last_alerts] == ["p2"]
+
+    def test_no_email_when_nothing_critical(self):
+        service = make_service()
+        assert run(cycle(service, {"p1": AlertLevel.HIGH, "p2": AlertLevel.NORMAL})) is None
+        service.email_service.send_alert_digest_email.assert_not_called()
+
+    def test_failed_send_retried_next_cycle(self):
+        service = make_service(sent=False)
+        assert run(cycle(service, {"p1": AlertLevel.CRITICAL})) is None
+        service.email_service.send_alert_digest_email.return_value = True
+        assert run(service.flush_digest()) == 1
+        assert run(service.db.alert_logs.count_documents({"emailSent": True})) == 1
+
+    def test_throttle_survives_restart(self):
+        db = InMemoryDB()
+        recent = (datetime.now(timezone.utc) - timedelta(minutes=10)).isoformat()
+        old = (datetime.now(timezone.utc) - timedelta(hours=2)).isoformat()
+        run(db.alert_email_throttle.insert_many([
+            {"partnerId": "p1", "lastEmailSentAt": recent},
+            {"partnerId": "p2", "lastEmailSentAt": old},
+        ]))
+        service = make_service(db)
+        run(service.start())
+
+        run(cycle(service, {"p1": AlertLevel.CRITICAL, "p2": AlertLevel.CRITICAL}))
+        alerts = service.email_service.send_alert_digest_email.call_args.args[0]
+        assert [a["partnerId"] for a in alerts] == ["p2"]
+
+
+# ---------------------------------------------------------------------------
+# 2. Open-alert state cache
+# ---------------------------------------------------------------------------
+
+def forbid_reads(collection):
+    collection.find_one = MagicMock(side_effect=AssertionError("unexpected read"))
+    collection.find = MagicMock(side_effect=AssertionError("unexpected read"))
+
+
+class TestAlertStateCache:
+    def test_steady_cycles_do_not_read_alert_logs(self):
+        service = make_service()
+        run(service.start())
+        run(cycle(service, {"p1": AlertLevel.HIGH, "p2": AlertLevel.NORMAL}))
+
+        forbid_reads(service.db.alert_logs)
+        for _ in range(3):
+            run(cycle(service, {"p1": AlertLevel.HIGH, "p2": AlertLevel.NORMAL}))
+
+        assert run(service.db.alert_logs.count_documents({})) == 1
+
+    def test_transitions_update_the_cache(self):
+        service = make_service()
+        run(service.start())
+        forbid_reads(service.db.alert_logs)
+
+        run(cycle(service, {"p1": AlertLevel.MEDIUM}))
+        run(cycle(service, {"p1": AlertLevel.HIGH}))
+        run(cycle(service, {"p1": AlertLevel.HIGH}))
+        run(cycle(service, {"p1": AlertLevel.NORMAL}))
+
+        assert run(service.db.alert_logs.count_documents({})) == 2
+        assert run(service.db.alert_logs.count_documents({"isResolved": False})) == 0
+        assert service._open_alerts == {}
+
+    def test_start_loads_open_alerts(self):
+        db = InMemoryDB()
+        run(db.alert_logs.insert_many([
+            {"id": "a1", "partnerId": "p1", "alertLevel": "HIGH", "isResolved": False, "isDismissed": False,
+             "createdAt": "2026-03-02T10:00:00+00:00"},
+            {"id": "s1", "partnerId": "SYSTEM", "alertLevel": "HIGH", "isResolved": False, "isDismissed": False,
+             "createdAt": "2026-03-02T10:00:00+00:00"},
+        ]))
+        service = make_service(db)
+        run(service.start())
+
+        assert service._open_alerts == {"p1": {"id": "a1", "alertLevel": "HIGH"}}
+        run(cycle(service, {"p1": AlertLevel.HIGH}))
+        assert run(db.alert_logs.count_documents({})) == 2
+
+    def test_dismissal_and_reconcile(self):
+        service = make_service()
+        run(service.start())
+        run(cycle(service, {"p1": AlertLevel.HIGH, "p2": AlertLevel.HIGH}))
+        p1_alert = service._open_alerts["p1"]["id"]
+        p2_alert = service._open_alerts["p2"]["id"]
+
+        # Dismissed through the API: the cache is told directly
+        run(service.db.alert_logs.update_one({"id": p1_alert}, {"$set": {"isDismissed": True}}))
+        service.alert_dismissed(p1_alert)
+        # Changed behind the service's back: picked up on reconcile
+        run(service.db.alert_logs.update_one({"id": p2_alert}, {"$set": {"isDismissed": True}}))
+        run(service.reconcile_alert_state())
+
+        run(cycle(service, {"p1": AlertLevel.HIGH, "p2": AlertLevel.HIGH}))
+        open_alerts = run(service.db.alert_logs.find({"isResolved": False, "isDismissed": False}).to_list(None))
+        assert len(open_alerts) == 2
+        assert {a["id"] for a in open_alerts}.isdisjoint({p1_alert, p2_alert})
@@ -0,0 +1,67 @@
+"""
+Tests for the offline allocation simulator — runs entirely in memory.
+Run with: python -m pytest tests/test_allocation_simulator.py -v
+"""
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.allocation_simulator import (
+    recorded_trace,
+    simulate,
+    synthetic_trace,
+)
+from models import ConcurrencyAllocationSettings
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class TestSimulation:
+    def test_synthetic_run_reports_metrics(self):
+        settings = ConcurrencyAllocationSettings(globalMaxConcurrency=2000)
+        trace = synthetic_trace(n_clients=50, n_ticks=8, global_max=2000, seed=3)
+
+        report = run(simulate(trace, settings))
+
+        assert report.ticks == 8 and report.clients == 50
+        assert 0.0 < report.utilization <= 1.0
+        assert set(report.starvation) == {"p1", "p2", "p3", "p4"}
+        assert report.limitChanges > 0
+        assert report.cycleMs["p50"] > 0
+        assert sum(report.statusCounts.values()) == 8
+
+    def test_recorded_trace_uses_latest_snapshot_per_run(self):
+        runs = [
+            {"runAt": "2026-01-01T00:01:00+00:00", "allocations": [
+                {"partnerId": "a", "partnerName": "A", "priority": 1, "maxConcurrency": 50, "oldLimit": 7},
+            ]},
+            {"runAt": "2026-01-01T00:02:00+00:00", "allocations": []},
+        ]
+        snapshots = [
+            {"partnerId": "a", "snapshotTime": "2026-01-01T00:00:30+00:00", "activeCalls": 1, "queuedCalls": 0, "remainingCalls": 10},
+            {"partnerId": "a", "snapshotTime": "2026-01-01T00:00:50+00:00", "activeCalls": 4, "queuedCalls": 2, "remainingCalls": 9},
+            {"partnerId": "a", "snapshotTime": "2026-01-01T00:01:30+00:00", "activeCalls": 6, "queuedCalls": 0, "remainingCalls": 3},
+        ]
+
+        trace = recorded_trace(runs, snapshots)
+
+        assert [p.id for p in trace.partners] == ["a"]
+        assert trace.partners[0].concurrencyLimit == 7
+        assert trace.ticks[0]["a"]["activeCalls"] == 4
+        assert trace.ticks[1]["a"]["activeCalls"] == 6
+
+    def test_predictive_mode_keeps_global_cap(self):
+        trace = synthetic_trace(n_clients=40, n_ticks=12, global_max=1500, seed=5)
+        settings = ConcurrencyAllocationSettings(
+            globalMaxConcurrency=4000, predictiveAllocation=True, forecastWindow=4
+        )
+
+        report = run(simulate(trace, settings))
+
+        assert report.statusCounts == {"normal": 12}
+        assert report.peakLimitSum <= 4000
+        assert 0.0 < report.utilization <= 1.0
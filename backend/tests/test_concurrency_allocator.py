@@ -4,6 +4,7 @@ All DB and SSH calls are mocked.
 Run with: python -m pytest tests/test_concurrency_allocator.py -v
 """
 import asyncio
+import numpy as np
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timezone
@@ -12,7 +13,16 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.concurrency_allocator import ConcurrencyAllocator
+from services.allocation_engine import (
+    allocate,
+    compute_tier_pools,
+    damp_limits,
+    floor_with_remainder,
+    water_fill,
+)
+from services.demand_forecast import forecast_demand
+from services.in_memory_db import InMemoryDB
+from services.concurrency_allocator import WRITE_CONCURRENCY, ConcurrencyAllocator
 from models import (
     ConcurrencyAllocationSettings,
     PartnerConfig,
@@ -55,10 +65,11 @@ def make_settings(**kwargs):
 
 def make_allocator():
     db = MagicMock()
+    db.concurrency_history.insert_many = AsyncMock()
     ssh = MagicMock()
     allocator = ConcurrencyAllocator(db, ssh)
     # Silence writes for pure algorithm tests
-    allocator._write_single = AsyncMock()
+    allocator._write_single = AsyncMock(return_value={"success": True})
     return allocator
 
 
@@ -67,50 +78,27 @@ def make_allocator():
 # ---------------------------------------------------------------------------
 
 class TestTierPools:
+    # compute_tier_pools takes client counts and weights indexed P1..P4
+    WEIGHTS = np.array([40.0, 30.0, 20.0, 10.0])
+
     def test_all_tiers_active(self):
-        allocator = make_allocator()
-        tier_clients = {
-            1: [make_partner("a", "A", 1, 100)],
-            2: [make_partner("b", "B", 2, 100)],
-            3: [make_partner("c", "C", 3, 100)],
-            4: [make_partner("d", "D", 4, 100)],
-        }
-        weights = {1: 40, 2: 30, 3: 20, 4: 10}
-        pools = allocator._compute_tier_pools(tier_clients, weights, 100)
-        assert pools[1] == pytest.approx(40.0)
-        assert pools[2] == pytest.approx(30.0)
-        assert pools[3] == pytest.approx(20.0)
-        assert pools[4] == pytest.approx(10.0)
+        pools = compute_tier_pools(np.array([1, 1, 1, 1]), self.WEIGHTS, 100)
+        assert pools.tolist() == pytest.approx([40.0, 30.0, 20.0, 10.0])
 
     def test_p4_missing_renormalizes(self):
-        allocator = make_allocator()
-        tier_clients = {
-            1: [make_partner("a", "A", 1, 100)],
-            2: [make_partner("b", "B", 2, 100)],
-            3: [make_partner("c", "C", 3, 100)],
-            4: [],  # no demand
-        }
-        weights = {1: 40, 2: 30, 3: 20, 4: 10}
-        pools = allocator._compute_tier_pools(tier_clients, weights, 90)
-        total = pools[1] + pools[2] + pools[3] + pools[4]
-        assert total == pytest.approx(90.0, abs=0.1)
-        assert pools[4] == 0.0
+        pools = compute_tier_pools(np.array([1, 1, 1, 0]), self.WEIGHTS, 90)  # P4 has no demand
+        assert pools.sum() == pytest.approx(90.0, abs=0.1)
+        assert pools[3] == 0.0
         # P1 should get more than P2
-        assert pools[1] > pools[2] > pools[3]
+        assert pools[0] > pools[1] > pools[2]
 
     def test_only_p1_active_gets_everything(self):
-        allocator = make_allocator()
-        tier_clients = {1: [make_partner("a", "A", 1, 100)], 2: [], 3: [], 4: []}
-        weights = {1: 40, 2: 30, 3: 20, 4: 10}
-        pools = allocator._compute_tier_pools(tier_clients, weights, 120)
-        assert pools[1] == pytest.approx(120.0)
+        pools = compute_tier_pools(np.array([1, 0, 0, 0]), self.WEIGHTS, 120)
+        assert pools[0] == pytest.approx(120.0)
 
     def test_no_active_tiers_returns_zero_pools(self):
-        allocator = make_allocator()
-        tier_clients = {1: [], 2: [], 3: [], 4: []}
-        weights = {1: 40, 2: 30, 3: 20, 4: 10}
-        pools = allocator._compute_tier_pools(tier_clients, weights, 120)
-        assert all(v == 0.0 for v in pools.values())
+        pools = compute_tier_pools(np.array([0, 0, 0, 0]), self.WEIGHTS, 120)
+        assert all(v == 0.0 for v in pools)
 
 
 # ---------------------------------------------------------------------------
@@ -239,33 +227,14 @@ class TestRounding:
         assert total <= 100 + len(demand_entries)  # activeCalls offset tolerance
 
     def test_remainder_goes_to_highest_demand_client(self):
-        allocator = make_allocator()
-        # 3 clients, available=100 → remainder of 1 slot
-        partners = [
-            make_partner("a", "A", 1, 200),  # 500 remaining
-            make_partner("b", "B", 1, 200),  # 100 remaining
-            make_partner("c", "C", 1, 200),  # 50 remaining
-        ]
-        snapshots = {
-            "a": make_snap(active=0, queued=0, remaining=500),
-            "b": make_snap(active=0, queued=0, remaining=100),
-            "c": make_snap(active=0, queued=0, remaining=50),
-        }
-        settings = make_settings(globalMaxConcurrency=200)
+        # 3 clients splitting 100 slots → 33 each plus a remainder of 1 slot
+        slots = np.full(3, 100 / 3)
+        remaining = np.array([100, 500, 50])  # client 1 has most remaining contacts
 
-        raw = {
-            "a": 500 / 3,
-            "b": 100 / 3,
-            "c": 50 / 3,
-        }
-        alloc = {k: float(v) for k, v in raw.items()}
-        partner_map = {p.id: p for p in partners}
-        result = allocator._apply_floor_and_remainder(alloc, partner_map, snapshots)
+        floored = floor_with_remainder(slots, remaining)
 
-        # 'a' has most remaining contacts — should get the remainder slot
-        floored = {k: int(v) for k, v in raw.items()}
-        remainder_receiver = max(result, key=result.get)
-        assert remainder_receiver == "a"
+        assert floored.tolist() == [33.0, 34.0, 33.0]
+        assert floored.sum() == 100
 
 
 # ---------------------------------------------------------------------------
@@ -310,13 +279,15 @@ class TestSaturatedSystem:
                 "b": make_snap(active=30, queued=25, remaining=200),
             }
             settings = make_settings(globalMaxConcurrency=200, minConcurrencyPerClient=2)
-            total_in_flight = 205  # > globalMax
+            allocator._load_settings = AsyncMock(return_value=settings)
+            allocator._load_active_partners = AsyncMock(return_value=partners)
+            allocator._load_latest_snapshots = AsyncMock(return_value=snapshots)
+            allocator._save_run = AsyncMock()
 
-            run_result = await allocator._apply_saturated_floor(
-                partners, snapshots, settings, total_in_flight
-            )
+            run_result = await allocator.run_allocation_cycle()
 
             assert run_result.status == "saturated"
+            assert run_result.totalInFlight == 205  # > globalMax
             assert all(e.newLimit == 2 for e in run_result.allocations)
             assert allocator._write_single.call_count == 2
 
@@ -331,9 +302,10 @@ class TestFullCycle:
     def test_normal_cycle_end_to_end(self):
         async def run():
             db = MagicMock()
+            db.concurrency_history.insert_many = AsyncMock()
             ssh = MagicMock()
             allocator = ConcurrencyAllocator(db, ssh)
-            allocator._write_single = AsyncMock()
+            allocator._write_single = AsyncMock(return_value={"success": True})
 
             partners = [
                 make_partner("p1", "Client1", 1, 80),
@@ -382,6 +354,60 @@ class TestFullCycle:
 
         asyncio.get_event_loop().run_until_complete(run())
 
+    def test_dry_run_has_no_side_effects(self):
+        async def run():
+            allocator = make_allocator()
+            partners = [
+                make_partner("p1", "Client1", 1, 80),
+                make_partner("p2", "Client2", 2, 50, concurrency_limit=2),
+            ]
+            snapshots = {
+                "p1": make_snap(active=20, queued=10, remaining=5000),
+                "p2": make_snap(remaining=0),
+            }
+            allocator._load_settings = AsyncMock(return_value=make_settings())
+            allocator._load_active_partners = AsyncMock(return_value=partners)
+            allocator._load_latest_snapshots = AsyncMock(return_value=snapshots)
+            allocator._save_run = AsyncMock()
+
+            result = await allocator.run_allocation_cycle(dry_run=True)
+
+            assert result.status == "normal"
+            assert {e.partnerId: e.newLimit for e in result.allocations} == {"p1": 80, "p2": 2}
+            assert list(result.phaseMs) == [
+                "loadSettings", "loadPartners", "loadSnapshots", "compute", "write",
+            ]
+            allocator._write_single.assert_not_awaited()
+            allocator._save_run.assert_not_awaited()
+            assert allocator._allocated_demand == {}
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+    def test_dry_run_previews_candidate_settings(self):
+        async def run():
+            allocator = make_allocator()
+            partners = [make_partner("p1", "Client1", 1, 200)]
+            allocator._load_settings = AsyncMock(return_value=make_settings())
+            allocator._load_active_partners = AsyncMock(return_value=partners)
+            allocator._load_latest_snapshots = AsyncMock(
+                return_value={"p1": make_snap(active=20, remaining=5000)}
+            )
+            allocator._save_run = AsyncMock()
+
+            result = await allocator.run_allocation_cycle(
+                dry_run=True, settings=make_settings(globalMaxConcurrency=50)
+            )
+
+            assert result.globalMax == 50
+            assert result.allocations[0].newLimit == 50
+            allocator._load_settings.assert_not_awaited()
+            allocator._save_run.assert_not_awaited()
+
+            with pytest.raises(ValueError):
+                await allocator.run_allocation_cycle(settings=make_settings())
+
+        asyncio.get_event_loop().run_until_complete(run())
+
 
 # ---------------------------------------------------------------------------
 # 8. Settings validation (tierWeights must sum to 100)
@@ -394,15 +420,364 @@ class TestSettingsValidation:
 
     def test_custom_tier_weights(self):
         w = TierWeights(p1=50, p2=25, p3=15, p4=10)
+        pools = compute_tier_pools(
+            np.array([1, 1, 0, 0]), np.array([w.p1, w.p2, w.p3, w.p4], dtype=float), 100
+        )
+        # With only P1 and P2 active: P1=50/(50+25)*100=66.7, P2=25/75*100=33.3
+        assert pools[0] == pytest.approx(66.67, abs=0.1)
+        assert pools[1] == pytest.approx(33.33, abs=0.1)
+
+
+# ---------------------------------------------------------------------------
+# 9. Vectorized allocation engine (closed-form water-filling)
+# ---------------------------------------------------------------------------
+
+class TestAllocationEngine:
+    def test_water_fill_matches_cascade_example(self):
+        # Same shape as test_within_tier_surplus_goes_to_uncapped_sibling
+        slots = water_fill(
+            np.array([60.0, 60.0]), np.array([20.0, 200.0]), np.array([40.0, 40.0]), 120.0
+        )
+        assert slots.tolist() == pytest.approx([20.0, 100.0])
+
+    def test_water_fill_surplus_split_by_tier_weight(self):
+        # P1 capped at 10 → 38 surplus flows to P2/P3 in 30:20 ratio
+        slots = water_fill(
+            np.array([48.0, 36.0, 24.0]),
+            np.array([10.0, 200.0, 200.0]),
+            np.array([40.0, 30.0, 20.0]),
+            108.0,
+        )
+        assert slots[0] == pytest.approx(10.0)
+        assert slots[1] - 36.0 == pytest.approx(38.0 * 30 / 50)
+        assert slots[2] - 24.0 == pytest.approx(38.0 * 20 / 50)
+
+    def test_water_fill_long_cascade_needs_no_iteration_cap(self):
+        # Each cap is hit one after another — more rounds than the old 10-pass limit
+        n = 30
+        caps = np.arange(1, n + 1, dtype=float)
+        base = np.full(n, 10.0)
+        slots = water_fill(base, caps, np.ones(n), float(base.sum()))
+        assert np.all(slots <= caps + 1e-9)
+        assert slots.sum() == pytest.approx(min(base.sum(), caps.sum()))
+
+    def test_water_fill_all_capped_drops_surplus(self):
+        slots = water_fill(
+            np.array([30.0, 30.0]), np.array([15.0, 15.0]), np.array([40.0, 10.0]), 60.0
+        )
+        assert slots.tolist() == [15.0, 15.0]
+
+    def test_allocate_sum_within_available(self):
+        rng = np.random.default_rng(7)
+        n = 10_000
+        priorities = np.sort(rng.integers(1, 5, n))
+        _, new_limits = allocate(
+            priorities=priorities,
+            max_concurrency=rng.integers(1, 60, n),
+            in_flight=np.zeros(n, dtype=np.int64),
+            remaining=rng.integers(1, 5000, n),
+            tier_weights=np.array([40.0, 30.0, 20.0, 10.0]),
+            available=50_000,
+            min_per_client=0,
+        )
+        assert new_limits.sum() <= 50_000
+
+
+# ---------------------------------------------------------------------------
+# 10. Diff-only, parallel writes
+# ---------------------------------------------------------------------------
+
+class TestDiffOnlyWrites:
+    def test_unchanged_limits_are_not_written(self):
+        async def run():
+            db = MagicMock()
+            db.concurrency_history.insert_many = AsyncMock()
+            allocator = ConcurrencyAllocator(db, MagicMock())
+            allocator._write_single = AsyncMock(return_value={"success": True})
+
+            partners = [
+                make_partner("a", "A", 1, 100, concurrency_limit=2),   # already at floor
+                make_partner("b", "B", 2, 100, concurrency_limit=10),
+            ]
+            snapshots = {
+                "a": make_snap(active=100, queued=50, remaining=500),
+                "b": make_snap(active=30, queued=25, remaining=200),
+            }
+            allocator._load_settings = AsyncMock(
+                return_value=make_settings(globalMaxConcurrency=200, minConcurrencyPerClient=2)
+            )
+            allocator._load_active_partners = AsyncMock(return_value=partners)
+            allocator._load_latest_snapshots = AsyncMock(return_value=snapshots)
+            allocator._save_run = AsyncMock()
+
+            run_result = await allocator.run_allocation_cycle()  # 205 in flight: saturated
+
+            allocator._write_single.assert_awaited_once()
+            assert allocator._write_single.call_args.args[0].id == "b"
+            assert all(e.syncedToPartner for e in run_result.allocations)
+            history = db.concurrency_history.insert_many.call_args.args[0]
+            assert [h["partnerId"] for h in history] == ["b"]
+            assert history[0]["oldLimit"] == 10 and history[0]["newLimit"] == 2
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+    def test_writes_are_bounded_in_parallel(self):
+        async def run():
+            db = MagicMock()
+            db.concurrency_history.insert_many = AsyncMock()
+            allocator = ConcurrencyAllocator(db, MagicMock())
+            in_flight = 0
+            peak = 0
+
+            async def slow_write(partner, new_limit, reason):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                return {"success": True}
+
+            allocator._write_single = slow_write
+            partners = [make_partner(str(i), f"P{i}", 1, 100) for i in range(20)]
+            written = await allocator._write_changed(
+                [(p, 5, None) for p in partners], "auto_allocation"
+            )
+
+            assert written == 20
+            assert 1 < peak <= WRITE_CONCURRENCY
+            db.concurrency_history.insert_many.assert_awaited_once()
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+
+# ---------------------------------------------------------------------------
+# 11. Predictive (forecast-driven) allocation
+# ---------------------------------------------------------------------------
+
+class TestPredictiveAllocation:
+    def test_forecast_tracks_arrivals_and_completions(self):
+        history = {
+            # in-flight climbs 10 → 20 → 30 with 5 completions per interval
+            "rising": [
+                {"activeCalls": 10, "queuedCalls": 0, "completedCallsToday": 0},
+                {"activeCalls": 15, "queuedCalls": 5, "completedCallsToday": 5},
+                {"activeCalls": 20, "queuedCalls": 10, "completedCallsToday": 10},
+            ],
+            # completed counter reset at midnight — treated as a fresh count
+            "reset": [
+                {"activeCalls": 10, "queuedCalls": 0, "completedCallsToday": 900},
+                {"activeCalls": 10, "queuedCalls": 0, "completedCallsToday": 4},
+            ],
+            "empty": [],
+        }
+
+        forecast = forecast_demand(history, alpha=0.5)
+
+        assert set(forecast) == {"rising", "reset"}
+        assert forecast["rising"] == pytest.approx(40.0)
+        assert forecast["reset"] == pytest.approx(10.0)
+
+    def test_forecast_demand_is_served_first(self):
         allocator = make_allocator()
-        tier_clients = {
-            1: [make_partner("a", "A", 1, 100)],
-            2: [make_partner("b", "B", 2, 100)],
-            3: [], 4: [],
+        partners = [
+            make_partner("a", "A", 1, 100),
+            make_partner("b", "B", 1, 100),
+        ]
+        snapshots = {
+            "a": make_snap(active=10, remaining=5000),
+            "b": make_snap(active=10, remaining=5000),
         }
-        pools = allocator._compute_tier_pools(
-            tier_clients, {1: 50, 2: 25, 3: 15, 4: 10}, 100
+        settings = make_settings(globalMaxConcurrency=60)
+
+        # "a" is ramping up (+20 expected), "b" is flat; 40 slots to hand out
+        entries = allocator._compute_allocations(
+            partners, snapshots, settings, 40, forecasts={"a": 30.0, "b": 10.0}
         )
-        # With only P1 and P2 active: P1=50/(50+25)*100=66.7, P2=25/75*100=33.3
-        assert pools[1] == pytest.approx(66.67, abs=0.1)
-        assert pools[2] == pytest.approx(33.33, abs=0.1)
+
+        alloc = {e.partnerId: e for e in entries}
+        assert alloc["a"].newLimit == 40  # 10 active + 20 forecast + 10 of leftover
+        assert alloc["b"].newLimit == 20
+        assert alloc["a"].forecastDemand == 30.0
+        assert sum(e.newLimit for e in entries) <= settings.globalMaxConcurrency
+
+    def test_history_window_is_per_partner(self):
+        async def run():
+            db = InMemoryDB()
+            # "busy" syncs every minute, "sparse" only had two snapshots an hour ago
+            docs = [
+                {"partnerId": "busy", "snapshotTime": f"2026-01-01T10:{m:02d}:00+00:00", "activeCalls": m}
+                for m in range(30)
+            ] + [
+                {"partnerId": "sparse", "snapshotTime": f"2026-01-01T09:0{m}:00+00:00", "activeCalls": m}
+                for m in range(2)
+            ]
+            await db.dashboard_snapshots.insert_many(docs)
+            allocator = ConcurrencyAllocator(db, MagicMock())
+
+            history = await allocator._load_snapshot_history(["busy", "sparse"], 5)
+
+            assert [s["activeCalls"] for s in history["busy"]] == [25, 26, 27, 28, 29]
+            assert [s["activeCalls"] for s in history["sparse"]] == [0, 1]
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+    def test_cycle_without_history_falls_back_to_current_demand(self):
+        async def run():
+            allocator = make_allocator()
+            allocator.db.dashboard_snapshots.find = MagicMock(side_effect=Exception("boom"))
+            partners = [make_partner("a", "A", 1, 100)]
+            settings = make_settings(predictiveAllocation=True)
+
+            assert await allocator._forecast_demand(partners, settings) is None
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+
+# ---------------------------------------------------------------------------
+# 12. Incremental (per-snapshot) tier re-balance
+# ---------------------------------------------------------------------------
+
+class TestIncrementalAllocation:
+    def make_incremental_allocator(self, partners, snapshots, **settings):
+        db = MagicMock()
+        db.allocation_runs.insert_one = AsyncMock()
+        db.concurrency_history.insert_many = AsyncMock()
+        allocator = ConcurrencyAllocator(db, MagicMock())
+        allocator._write_single = AsyncMock(return_value={"success": True})
+        allocator._load_settings = AsyncMock(
+            return_value=make_settings(incrementalAllocation=True, **settings)
+        )
+        allocator._load_active_partners = AsyncMock(return_value=partners)
+        allocator._load_latest_snapshots = AsyncMock(return_value=snapshots)
+        return allocator
+
+    def test_spike_rebalances_only_its_tier_within_global_max(self):
+        async def run():
+            partners = [
+                make_partner("a", "A", 1, 100, concurrency_limit=50),
+                make_partner("b", "B", 1, 100, concurrency_limit=50),
+                make_partner("c", "C", 2, 100, concurrency_limit=80),
+            ]
+            spike = make_snap(active=40, remaining=500)
+            allocator = self.make_incremental_allocator(
+                partners, {"a": spike, "b": make_snap(active=10, remaining=500)}
+            )
+            allocator._allocated_demand = {"a": (10, True), "b": (10, True), "c": (30, True)}
+
+            run_result = await allocator.on_snapshot("a", spike)
+
+            assert run_result.status == "incremental"
+            limits = {e.partnerId: e.newLimit for e in run_result.allocations}
+            # P1 may use 200 - 80 (P2's limit) = 120: 50 in flight + 70 split evenly
+            assert limits == {"a": 75, "b": 45}
+            assert sum(limits.values()) + 80 <= 200
+            assert allocator._allocated_demand["a"] == (40, True)
+            written = [c.args[0].id for c in allocator._write_single.await_args_list]
+            assert sorted(written) == ["a", "b"]
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+    def test_small_change_or_unallocated_partner_is_ignored(self):
+        async def run():
+            partners = [make_partner("a", "A", 1, 100)]
+            allocator = self.make_incremental_allocator(partners, {}, incrementalDemandThreshold=10)
+            allocator._allocated_demand = {"a": (10, True)}
+
+            assert await allocator.on_snapshot("a", make_snap(active=15, remaining=5)) is None
+            assert await allocator.on_snapshot("new", make_snap(active=90, remaining=5)) is None
+            allocator._load_active_partners.assert_not_awaited()
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+    def test_settings_loaded_once_and_reused_from_full_cycle(self):
+        async def run():
+            partners = [make_partner("a", "A", 1, 100)]
+            allocator = self.make_incremental_allocator(partners, {}, incrementalDemandThreshold=10)
+            allocator._allocated_demand = {"a": (10, True)}
+
+            for _ in range(3):
+                await allocator.on_snapshot("a", make_snap(active=15, remaining=5))
+            assert allocator._load_settings.await_count == 1
+
+            allocator._settings = None
+            await allocator.run_allocation_cycle()
+            await allocator.on_snapshot("a", make_snap(active=15, remaining=5))
+            assert allocator._load_settings.await_count == 2
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+    def test_no_room_in_tier_defers_to_full_cycle(self):
+        async def run():
+            partners = [
+                make_partner("a", "A", 1, 100, concurrency_limit=20),
+                make_partner("c", "C", 2, 200, concurrency_limit=190),
+            ]
+            spike = make_snap(active=30, remaining=500)
+            allocator = self.make_incremental_allocator(partners, {"a": spike})
+            allocator._allocated_demand = {"a": (5, True)}
+
+            assert await allocator.on_snapshot("a", spike) is None
+            allocator._write_single.assert_not_awaited()
+
+        asyncio.get_event_loop().run_until_complete(run())
+
+
+# ---------------------------------------------------------------------------
+# 13. Churn damping (min delta, cooldown, rate cap)
+# ---------------------------------------------------------------------------
+
+class TestChurnDamping:
+    def test_small_changes_held_and_large_ones_clipped(self):
+        damped = damp_limits(
+            old=np.array([20, 20, 20]),
+            target=np.array([22, 50, 20]),
+            min_delta=3,
+            max_step=10,
+            frozen=np.zeros(3, dtype=bool),
+            budget=1000,
+        )
+        assert damped.tolist() == [20, 30, 20]
+
+    def test_held_limits_give_back_excess_to_keep_budget(self):
+        # "a" is frozen high while "b" is raised — a must yield to stay within 100
+        damped = damp_limits(
+            old=np.array([60, 20]),
+            target=np.array([30, 70]),
+            min_delta=0,
+            max_step=0,
+            frozen=np.array([True, False]),
+            budget=100,
+        )
+        assert damped.tolist() == [30, 70]
+
+        damped = damp_limits(
+            old=np.array([60, 40]),
+            target=np.array([40, 60]),
+            min_delta=0,
+            max_step=5,
+            frozen=np.zeros(2, dtype=bool),
+            budget=100,
+        )
+        assert damped.sum() <= 100
+        assert damped.tolist() == [55, 45]
+
+    def test_cooldown_keeps_recently_changed_partner(self):
+        allocator = make_allocator()
+        allocator._last_changed["a"] = datetime.now(timezone.utc)
+        partners = [
+            make_partner("a", "A", 1, 100, concurrency_limit=40),
+            make_partner("b", "B", 1, 100, concurrency_limit=40),
+        ]
+        snapshots = {
+            "a": make_snap(active=10, remaining=100),
+            "b": make_snap(active=10, remaining=100),
+        }
+        settings = make_settings(globalMaxConcurrency=120, limitCooldownSeconds=300)
+
+        entries = allocator._compute_allocations(partners, snapshots, settings, 100)
+        allocator._damp_allocations(entries, settings, settings.globalMaxConcurrency)
+
+        alloc = {e.partnerId: e for e in entries}
+        assert alloc["a"].newLimit == 40 and alloc["a"].targetLimit == 60
+        assert alloc["b"].newLimit == 60 and alloc["b"].targetLimit is None
+        assert sum(e.newLimit for e in entries) <= 120
@@ -0,0 +1,67 @@
+"""
+Unit tests for DataFetchService housekeeping — Mongo is mocked.
+Run with: python -m pytest tests/test_data_fetch.py -v
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_fetch import STALE_CHECK_MIN_INTERVAL_SECONDS, DataFetchService
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def make_service(stale_names):
+    db = MagicMock()
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[{"partnerName": n} for n in stale_names])
+    db.partner_configs.aggregate = MagicMock(return_value=cursor)
+    db.alert_logs.insert_one = AsyncMock()
+    return DataFetchService(db, MagicMock(), MagicMock())
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+class TestStaleSnapshotCheck:
+    def test_single_query_regardless_of_fleet_size(self):
+        service = make_service(["Acme", "Globex"])
+        run(service._check_stale_snapshots())
+
+        service.db.partner_configs.aggregate.assert_called_once()
+        service.db.dashboard_snapshots.find_one.assert_not_called()
+        alert = service.db.alert_logs.insert_one.call_args.args[0]
+        assert alert["alertMessage"].startswith("Stale data detected: Acme, Globex")
+
+    def test_cutoff_is_ten_minutes_back(self):
+        service = make_service([])
+        run(service._check_stale_snapshots())
+
+        pipeline = service.db.partner_configs.aggregate.call_args.args[0]
+        cutoff = datetime.fromisoformat(pipeline[2]["$match"]["$or"][1]["latest.0.snapshotTime"]["$lt"])
+        expected = datetime.now(timezone.utc) - timedelta(minutes=10)
+        assert abs((cutoff - expected).total_seconds()) < 5
+        service.db.alert_logs.insert_one.assert_not_called()
+
+    def test_runs_within_the_window_are_suppressed(self):
+        service = make_service([])
+        clock = [1000.0]
+        with patch("services.data_fetch.time.monotonic", side_effect=lambda: clock[0]):
+            run(service._check_stale_snapshots())
+            clock[0] += STALE_CHECK_MIN_INTERVAL_SECONDS - 1
+            run(service._check_stale_snapshots())
+            assert service.db.partner_configs.aggregate.call_count == 1
+            clock[0] += 2
+            run(service._check_stale_snapshots())
+        assert service.db.partner_configs.aggregate.call_count == 2
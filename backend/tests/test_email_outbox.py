@@ -0,0 +1,237 @@
+"""
+Tests for the email outbox and pooled SMTP sending — in-memory Mongo and a
+fake SMTP server, nothing leaves the process.
+Run with: python -m pytest tests/test_email_outbox.py -v
+"""
+import asyncio
+import smtplib
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.in_memory_db import InMemoryDB
+from services.email_outbox import MAX_ATTEMPTS, RETRY_BASE_SECONDS, SENDING_LEASE_SECONDS, EmailOutbox
+from services.email_service import EmailService
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.logins = 0
+        self.sent = []
+        self.broken = False
+        FakeSMTP.instances.append(self)
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def noop(self):
+        if self.broken:
+            raise smtplib.SMTPServerDisconnected("gone")
+        return (250, b"OK")
+
+    def sendmail(self, sender, recipients, body):
+        if self.broken:
+            raise smtplib.SMTPServerDisconnected("gone")
+        if "reject@" in recipients[0]:
+            raise smtplib.SMTPRecipientsRefused({recipients[0]: (550, b"no")})
+        self.sent.append(recipients)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_email_service():
+    FakeSMTP.instances = []
+    with patch.dict(os.environ, {"SMTP_PORT": "465"}):
+        return EmailService()
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+async def wait_until(predicate):
+    for _ in range(200):
+        if await predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+# ---------------------------------------------------------------------------
+# 1. Pooled SMTP
+# ---------------------------------------------------------------------------
+
+class TestSMTPPool:
+    def test_connection_reused_across_sends(self):
+        service = make_email_service()
+        with patch("services.email_service.smtplib.SMTP_SSL", FakeSMTP):
+            assert service.send_email(["a@x.com"], "s", "<p>h</p>", "t")
+            assert service.send_email(["b@x.com"], "s", "<p>h</p>", "t")
+        assert len(FakeSMTP.instances) == 1
+        assert FakeSMTP.instances[0].logins == 1
+        assert FakeSMTP.instances[0].sent == [["a@x.com"], ["b@x.com"]]
+
+    def test_broken_idle_connection_is_replaced(self):
+        service = make_email_service()
+        with patch("services.email_service.smtplib.SMTP_SSL", FakeSMTP):
+            service.send_email(["a@x.com"], "s", "h", "t")
+            FakeSMTP.instances[0].broken = True
+            assert service.send_email(["b@x.com"], "s", "h", "t")
+        assert len(FakeSMTP.instances) == 2
+
+    def test_rejected_message_does_not_fail_the_batch(self):
+        service = make_email_service()
+        message = {"subject": "s", "html_body": "h", "text_body": "t"}
+        with patch("services.email_service.smtplib.SMTP_SSL", FakeSMTP):
+            errors = service.send_messages([
+                {**message, "to_addresses": ["a@x.com"]},
+                {**message, "to_addresses": ["reject@x.com"]},
+                {**message, "to_addresses": ["c@x.com"]},
+            ])
+        assert errors[0] is None and errors[2] is None
+        assert "SMTPRecipientsRefused" in errors[1]
+
+
+# ---------------------------------------------------------------------------
+# 2. Outbox
+# ---------------------------------------------------------------------------
+
+class TestEmailOutbox:
+    def test_queued_messages_sent_in_one_batch(self):
+        async def scenario():
+            db = InMemoryDB()
+            service = make_email_service()
+            service.send_messages = MagicMock(side_effect=lambda msgs: [None] * len(msgs))
+            outbox = EmailOutbox(db, service, senders=1)
+            service.outbox = outbox
+
+            # Handlers only enqueue; nothing is sent until the sender runs
+            assert await service.send_alert_email("P", "CRITICAL", "queue backed up", {"utilization": 99.0})
+            await outbox.enqueue(["a@x.com"], "one", "h", "t", attachments=[("r.csv", b"1,2", "text/csv")])
+            await outbox.enqueue(["b@x.com"], "two", "h", "t")
+            service.send_messages.assert_not_called()
+
+            await outbox.start()
+            try:
+                await wait_until(lambda: _count(db, "sent", 3))
+            finally:
+                await outbox.stop()
+            return service, await db.email_outbox.find({}, {"_id": 0}).to_list(None)
+
+        service, docs = run(scenario())
+        service.send_messages.assert_called_once()
+        batch = service.send_messages.call_args.args[0]
+        assert [m["subject"] for m in batch][1:] == ["one", "two"]
+        assert batch[1]["attachments"] == [("r.csv", b"1,2", "text/csv")]
+        assert {d["category"] for d in docs} == {"alert", "email"}
+        assert all(d["attachments"] == [] for d in docs)
+
+    def test_failures_back_off_then_give_up(self):
+        async def scenario():
+            db = InMemoryDB()
+            service = make_email_service()
+            service.send_messages = MagicMock(side_effect=lambda msgs: ["SMTPServerDisconnected: gone"] * len(msgs))
+            outbox = EmailOutbox(db, service)
+            await outbox.enqueue(["a@x.com"], "s", "h", "t")
+
+            batch = await outbox._claim_batch()
+            await outbox._send_batch(batch)
+            first = await db.email_outbox.find_one({}, {"_id": 0})
+
+            # Not due yet: nothing to claim
+            assert await outbox._claim_batch() == []
+
+            # Last attempt fails for good
+            await db.email_outbox.update_one(
+                {}, {"$set": {"attempts": MAX_ATTEMPTS - 1, "nextAttemptAt": "2000-01-01T00:00:00+00:00"}}
+            )
+            await outbox._send_batch(await outbox._claim_batch())
+            last = await db.email_outbox.find_one({}, {"_id": 0})
+            return first, last
+
+        first, last = run(scenario())
+        assert first["status"] == "pending" and first["attempts"] == 1
+        delay = datetime.fromisoformat(first["nextAttemptAt"]) - datetime.now(timezone.utc)
+        assert RETRY_BASE_SECONDS - 5 < delay.total_seconds() <= RETRY_BASE_SECONDS
+        assert last["status"] == "failed" and last["attempts"] == MAX_ATTEMPTS
+        assert "gone" in last["lastError"]
+
+    def test_start_requeues_expired_sends(self):
+        async def scenario():
+            db = InMemoryDB()
+            service = make_email_service()
+            service.send_messages = MagicMock(side_effect=lambda msgs: [None] * len(msgs))
+            outbox = EmailOutbox(db, service)
+            await outbox.enqueue(["a@x.com"], "s", "h", "t")
+            # Claimed by a process that died more than a lease ago
+            expired = (datetime.now(timezone.utc) - timedelta(seconds=SENDING_LEASE_SECONDS + 60)).isoformat()
+            await db.email_outbox.update_one({}, {"$set": {"status": "sending", "claim": "dead", "claimedAt": expired}})
+            await outbox.start()
+            try:
+                await wait_until(lambda: _count(db, "sent", 1))
+            finally:
+                await outbox.stop()
+
+        run(scenario())
+
+    def test_start_leaves_live_sends_alone(self):
+        async def scenario():
+            db = InMemoryDB()
+            service = make_email_service()
+            service.send_messages = MagicMock(side_effect=lambda msgs: [None] * len(msgs))
+            outbox = EmailOutbox(db, service)
+            await outbox.enqueue(["a@x.com"], "s", "h", "t")
+            # Another worker process is sending this one right now
+            claimed = await outbox._claim_batch()
+
+            other = EmailOutbox(db, service)
+            await other.start()
+            try:
+                await asyncio.sleep(0.05)
+            finally:
+                await other.stop()
+            during = await db.email_outbox.find_one({}, {"_id": 0})
+
+            await outbox._send_batch(claimed)
+            return during, await db.email_outbox.find_one({}, {"_id": 0})
+
+        during, after = run(scenario())
+        assert during["status"] == "sending" and during["attempts"] == 1
+        assert after["status"] == "sent"
+
+    def test_result_of_expired_claim_is_dropped(self):
+        async def scenario():
+            db = InMemoryDB()
+            service = make_email_service()
+            service.send_messages = MagicMock(side_effect=lambda msgs: ["SMTPServerDisconnected: gone"] * len(msgs))
+            outbox = EmailOutbox(db, service)
+            await outbox.enqueue(["a@x.com"], "s", "h", "t")
+            stale = await outbox._claim_batch()
+
+            # The lease ran out and another sender reclaimed and delivered it
+            await db.email_outbox.update_one({}, {"$set": {"claimedAt": "2000-01-01T00:00:00+00:00"}})
+            await outbox._recover_stale()
+            await db.email_outbox.update_one({}, {"$set": {"status": "sent", "lastError": None}})
+
+            await outbox._send_batch(stale)
+            return await db.email_outbox.find_one({}, {"_id": 0})
+
+        doc = run(scenario())
+        assert doc["status"] == "sent" and doc["lastError"] is None
+
+
+async def _count(db, status, expected):
+    return await db.email_outbox.count_documents({"status": status}) == expected
@@ -0,0 +1,156 @@
+"""
+Unit tests for EncryptionService credential caching — keys are generated in
+the test, nothing touches the network or the filesystem.
+Run with: python -m pytest tests/test_encryption.py -v
+"""
+from unittest.mock import MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import paramiko
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+from services import encryption
+from services.encryption import EncryptionService
+from services.ssh_connection import SSHConnectionService
+from models import PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def private_key_pem(key, passphrase=None):
+    algorithm = (
+        serialization.BestAvailableEncryption(passphrase.encode()) if passphrase
+        else serialization.NoEncryption()
+    )
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH, algorithm
+    ).decode()
+
+
+def count_ciphers():
+    return patch.object(encryption, "Cipher", wraps=encryption.Cipher)
+
+
+# ---------------------------------------------------------------------------
+# 1. Decryption cache
+# ---------------------------------------------------------------------------
+
+class TestDecryptCache:
+    def test_repeated_decrypt_builds_one_cipher(self):
+        service = EncryptionService()
+        secret = service.encrypt("db-password")
+        with count_ciphers() as cipher:
+            assert service.decrypt(secret) == "db-password"
+            assert service.decrypt(secret) == "db-password"
+        assert cipher.call_count == 1
+
+    def test_new_ciphertext_is_decrypted_again(self):
+        service = EncryptionService()
+        old = service.encrypt("old")
+        service.decrypt(old)
+        assert service.decrypt(service.encrypt("new")) == "new"
+
+    def test_forget_partner_drops_its_credentials(self):
+        service = EncryptionService()
+        partner = {
+            "dbPassword": service.encrypt("db"),
+            "sshConfig": {"password": service.encrypt("ssh")},
+            "s3Config": {"secretAccessKey": service.encrypt("s3")},
+        }
+        other = service.encrypt("other")
+        for value in (partner["dbPassword"], partner["sshConfig"]["password"],
+                      partner["s3Config"]["secretAccessKey"], other):
+            service.decrypt(value)
+
+        service.forget_partner(partner)
+
+        assert list(service._plaintexts) == [other]
+
+    def test_cache_is_bounded(self):
+        service = EncryptionService()
+        with patch.object(encryption, "CREDENTIAL_CACHE_SIZE", 3):
+            for i in range(5):
+                service.decrypt(service.encrypt(str(i)))
+        assert len(service._plaintexts) == 3
+
+
+# ---------------------------------------------------------------------------
+# 2. Parsed SSH keys
+# ---------------------------------------------------------------------------
+
+class TestPrivateKeys:
+    @pytest.mark.parametrize("make_key,key_class", [
+        (lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048), paramiko.RSAKey),
+        (ed25519.Ed25519PrivateKey.generate, paramiko.Ed25519Key),
+    ])
+    def test_key_parsed_once_without_temp_files(self, make_key, key_class):
+        service = EncryptionService()
+        encrypted_key = service.encrypt(private_key_pem(make_key()))
+
+        with patch("tempfile.NamedTemporaryFile", side_effect=AssertionError("wrote key to disk")):
+            first = service.load_private_key(encrypted_key)
+            with count_ciphers() as cipher:
+                second = service.load_private_key(encrypted_key)
+
+        assert isinstance(first, key_class)
+        assert second is first
+        cipher.assert_not_called()
+
+    def test_passphrase_protected_key(self):
+        service = EncryptionService()
+        pem = private_key_pem(ed25519.Ed25519PrivateKey.generate(), passphrase="hunter2")
+        encrypted_key = service.encrypt(pem)
+
+        pkey = service.load_private_key(encrypted_key, service.encrypt("hunter2"))
+        assert isinstance(pkey, paramiko.Ed25519Key)
+        with pytest.raises(Exception, match="passphrase"):
+            service.load_private_key(encrypted_key)
+
+    def test_forget_drops_parsed_key(self):
+        service = EncryptionService()
+        encrypted_key = service.encrypt(private_key_pem(ed25519.Ed25519PrivateKey.generate()))
+        first = service.load_private_key(encrypted_key)
+        service.forget_partner({"sshConfig": {"privateKey": encrypted_key}})
+        assert service.load_private_key(encrypted_key) is not first
+
+    def test_invalid_key_is_rejected(self):
+        service = EncryptionService()
+        with pytest.raises(Exception, match="invalid SSH private key"):
+            service.load_private_key(service.encrypt("not a key"))
+
+
+# ---------------------------------------------------------------------------
+# 3. SSH tunnel credentials
+# ---------------------------------------------------------------------------
+
+class TestSSHCredentials:
+    def _partner(self, **ssh):
+        return PartnerConfig(
+            id="p1", partnerName="P1", dbHost="db", dbName="d", dbUsername="u", dbPassword="x",
+            sshConfig=SSHConfig(enabled=True, host="bastion", username="ops", **ssh),
+        )
+
+    def test_private_key_passed_as_key_object(self):
+        encryption_service = EncryptionService()
+        service = SSHConnectionService(MagicMock(), encryption_service)
+        partner = self._partner(privateKey=encryption_service.encrypt(
+            private_key_pem(ed25519.Ed25519PrivateKey.generate())
+        ))
+
+        pkey, password = service._ssh_credentials(partner)
+
+        assert isinstance(pkey, paramiko.PKey) and password is None
+        assert service._ssh_credentials(partner)[0] is pkey
+
+    def test_password_auth(self):
+        encryption_service = EncryptionService()
+        service = SSHConnectionService(MagicMock(), encryption_service)
+        partner = self._partner(password=encryption_service.encrypt("pw"))
+        assert service._ssh_credentials(partner) == (None, "pw")
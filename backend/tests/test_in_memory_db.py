@@ -0,0 +1,64 @@
+"""
+Tests for the in-memory Motor stand-in used by the simulator, benchmarks and
+unit tests.
+Run with: python -m pytest tests/test_in_memory_db.py -v
+"""
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import ReturnDocument
+
+from services.in_memory_db import InMemoryDB
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class TestInMemoryDB:
+    def test_find_one_sort_and_update(self):
+        async def scenario():
+            db = InMemoryDB()
+            await db.dashboard_snapshots.insert_many([
+                {"partnerId": "a", "snapshotTime": "2026-01-01T00:00:00", "activeCalls": 1},
+                {"partnerId": "a", "snapshotTime": "2026-01-01T00:01:00", "activeCalls": 2},
+                {"partnerId": "b", "snapshotTime": "2026-01-01T00:02:00", "activeCalls": 3},
+            ])
+            latest = await db.dashboard_snapshots.find_one(
+                {"partnerId": "a"}, {"_id": 0, "activeCalls": 1}, sort=[("snapshotTime", -1)]
+            )
+            await db.settings.update_one({"key": "k"}, {"$set": {"value": 1}}, upsert=True)
+            setting = await db.settings.find_one({"key": "k"})
+            return latest, setting
+
+        latest, setting = run(scenario())
+        assert latest == {"activeCalls": 2}
+        assert setting == {"key": "k", "value": 1}
+
+    def test_claim_with_find_one_and_update(self):
+        async def scenario():
+            db = InMemoryDB()
+            await db.jobs.insert_many([
+                {"id": 1, "state": "done", "at": 1},
+                {"id": 2, "state": "pending", "at": 3},
+                {"id": 3, "state": "pending", "at": 2},
+            ])
+            claimed = await db.jobs.find_one_and_update(
+                {"state": {"$nin": ["done", "running"]}},
+                {"$set": {"state": "running"}, "$inc": {"attempts": 1}},
+                projection={"_id": 0},
+                sort=[("at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            await db.jobs.update_many({"state": "pending"}, {"$set": {"state": "done"}})
+            await db.jobs.update_one(
+                {"id": 4}, {"$set": {"state": "new"}, "$setOnInsert": {"at": 9}}, upsert=True
+            )
+            return claimed, await db.jobs.find({}, {"_id": 0, "id": 1, "state": 1}).sort("id", 1).to_list(None)
+
+        claimed, docs = run(scenario())
+        assert claimed == {"id": 3, "state": "running", "at": 2, "attempts": 1}
+        assert [d["state"] for d in docs] == ["done", "done", "running", "new"]
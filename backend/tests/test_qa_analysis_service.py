@@ -0,0 +1,536 @@
+"""
+Unit tests for QAAnalysisService scoring — no LLM, DB or SSH required.
+Run with: python -m pytest tests/test_qa_analysis_service.py -v
+"""
+import asyncio
+import base64
+import json
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from services.audio_cache import AudioCache
+from services.llm_rate_limiter import LLMRateLimiter
+from services.in_memory_db import InMemoryDB
+from services.qa_analysis_service import SAVE_BATCH_SIZE, QAAnalysisService
+from models import PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def make_partner():
+    return PartnerConfig(
+        id="p1",
+        partnerName="Partner",
+        dbHost="localhost",
+        dbName="test",
+        dbUsername="user",
+        dbPassword="pass",
+        sshConfig=SSHConfig(enabled=False),
+    )
+
+
+def make_service(**kwargs):
+    ssh = MagicMock()
+    ssh.execute_batch_updates = AsyncMock()
+    ssh.execute_batch_queries = AsyncMock(return_value=[[]])
+    email = MagicMock()
+    email.send_qa_report_email = AsyncMock()
+    with patch.dict(os.environ, {"OPENROUTER_API_KEY": "test"}):
+        kwargs.setdefault("audio_cache", AudioCache(tempfile.mkdtemp()))
+        service = QAAnalysisService(MagicMock(), ssh, email, **kwargs)
+    service._get_qa_report_recipients = AsyncMock(return_value=None)
+    return service
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# 1. Batched partner DB saves
+# ---------------------------------------------------------------------------
+
+class TestBatchSave:
+    def test_batch_saved_in_one_session(self):
+        service = make_service()
+        saves = [
+            {"callId": i, "tenantId": 1, "scores": {"voiceQuality": 8, "latency": 7, "conversationQuality": 9}}
+            for i in range(SAVE_BATCH_SIZE)
+        ]
+
+        assert run(service.flush_batch_save(make_partner(), saves)) is True
+        service.ssh_service.execute_batch_updates.assert_awaited_once()
+        queries = service.ssh_service.execute_batch_updates.await_args.args[1]
+        assert [q["params"][0] for q in queries] == list(range(SAVE_BATCH_SIZE))
+
+    def test_failed_save_returns_false(self):
+        service = make_service()
+        service.ssh_service.execute_batch_updates = AsyncMock(side_effect=Exception("tunnel down"))
+
+        saves = [{"callId": 1, "tenantId": 1, "scores": {}}]
+        assert run(service.flush_batch_save(make_partner(), saves)) is False
+
+
+# ---------------------------------------------------------------------------
+# 2. Skip scored calls, cache LLM results
+# ---------------------------------------------------------------------------
+
+def llm_response(content):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    return response
+
+
+class TestDedupeAndCache:
+    def test_scored_calls_found_in_chunks(self):
+        from services.qa_analysis_service import DEDUPE_CHUNK_SIZE
+        service = make_service()
+        service.ssh_service.execute_batch_queries = AsyncMock(return_value=[[{"callId": 1}], [{"callId": 600}]])
+
+        scored = run(service.find_scored_call_ids(make_partner(), list(range(1, DEDUPE_CHUNK_SIZE + 2))))
+
+        assert scored == {1, 600}
+        queries = service.ssh_service.execute_batch_queries.await_args.args[1]
+        assert [len(q["params"]) for q in queries] == [DEDUPE_CHUNK_SIZE, 1]
+
+    def test_dedupe_failure_scores_all_calls(self):
+        service = make_service()
+        service.ssh_service.execute_batch_queries = AsyncMock(side_effect=Exception("tunnel down"))
+
+        assert run(service.find_scored_call_ids(make_partner(), [1, 2])) == set()
+
+    def test_identical_inputs_hit_cache(self):
+        service = make_service(scoring_batch_size=1)
+        service.db = InMemoryDB()
+        service._complete = AsyncMock(
+            return_value=llm_response('{"voiceQuality": 8, "latency": 7, "conversationQuality": 9, "notes": "ok"}')
+        )
+
+        first = run(service.analyze_call("bot: hi", "summary", 120, "ended"))
+        second = run(service.analyze_call("bot: hi", "summary", 120, "ended"))
+        changed = run(service.analyze_call("bot: hi", "summary", 121, "ended"))
+
+        assert first == second == changed
+        assert service._complete.await_count == 2
+
+    def test_prompt_version_is_part_of_cache_key(self):
+        key = QAAnalysisService._analysis_cache_key("t", "s", 1, "e")
+        with patch("services.qa_analysis_service.PROMPT_VERSION", "qa-v2"):
+            assert QAAnalysisService._analysis_cache_key("t", "s", 1, "e") != key
+
+
+# ---------------------------------------------------------------------------
+# 3. Requests / tokens per minute limiter
+# ---------------------------------------------------------------------------
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestLLMRateLimiter:
+    def test_requests_per_minute(self):
+        clock = FakeClock()
+        limiter = LLMRateLimiter(requests_per_minute=3, clock=clock)
+
+        async def scenario():
+            with patch("services.llm_rate_limiter.asyncio.sleep", clock.sleep):
+                starts = []
+                for _ in range(7):
+                    await limiter.acquire()
+                    starts.append(clock.now)
+                return starts
+
+        assert run(scenario()) == [0, 0, 0, 60, 60, 60, 120]
+
+    def test_tokens_per_minute(self):
+        clock = FakeClock()
+        limiter = LLMRateLimiter(tokens_per_minute=1000, clock=clock)
+
+        async def scenario():
+            with patch("services.llm_rate_limiter.asyncio.sleep", clock.sleep):
+                await limiter.acquire(600)
+                clock.now = 10
+                await limiter.acquire(300)
+                await limiter.acquire(300)  # must wait for the first 600 to expire
+                first = clock.now
+                await limiter.acquire(5000)  # oversized request waits for an empty window
+                return first, clock.now
+
+        assert run(scenario()) == (60, 120)
+
+    def test_disabled_limiter_never_waits(self):
+        limiter = LLMRateLimiter()
+        run(limiter.acquire(10**9))
+        assert len(limiter._window) == 0
+
+
+# ---------------------------------------------------------------------------
+# 4. Audio / transcript cache
+# ---------------------------------------------------------------------------
+
+class FakeStorage:
+    """Recording server for httpx.MockTransport that counts body downloads."""
+
+    def __init__(self, files, content_length=False):
+        self.files = files  # url path -> (etag, bytes); etag None sends no ETag
+        self.content_length = content_length
+        self.requests = 0
+        self.not_modified = 0
+        self.body_reads = 0
+        self.chunks_sent = 0
+
+    def handler(self, request):
+        self.requests += 1
+        etag, body = self.files[request.url.path]
+        if etag and request.headers.get("if-none-match") == etag:
+            self.not_modified += 1
+            return httpx.Response(304, headers={"etag": etag})
+        headers = {"etag": etag} if etag else {}
+        if self.content_length:
+            headers["content-length"] = str(len(body))
+
+        async def stream():
+            self.body_reads += 1
+            for start in range(0, len(body), 1024):
+                self.chunks_sent += 1
+                yield body[start:start + 1024]
+
+        return httpx.Response(200, headers=headers, content=stream())
+
+    def client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+class TestAudioCache:
+    def transcribe(self, service, storage, url):
+        service._http = storage.client()
+        return run(service.transcribe_audio(url))
+
+    def test_replay_skips_download_and_transcription(self):
+        service = make_service()
+        service._complete = AsyncMock(return_value=llm_response("agent: hello"))
+        storage = FakeStorage({"/a.mp3": ('"v1"', b"audio-a")})
+
+        first = self.transcribe(service, storage, "https://s3.example/a.mp3?sig=1")
+        second = self.transcribe(service, storage, "https://s3.example/a.mp3?sig=2")
+
+        assert first == second == "agent: hello"
+        assert service._complete.await_count == 1
+        assert storage.body_reads == 1
+        assert storage.not_modified == 1  # the replay was revalidated without a body
+
+    def test_url_without_etag_is_served_without_a_request(self):
+        service = make_service()
+        service._complete = AsyncMock(return_value=llm_response("agent: hello"))
+        storage = FakeStorage({"/a.mp3": (None, b"audio-a")})
+
+        self.transcribe(service, storage, "https://s3.example/a.mp3")
+        self.transcribe(service, storage, "https://s3.example/a.mp3")
+
+        assert storage.requests == 1
+        assert service._complete.await_count == 1
+
+    def test_changed_etag_or_model_misses(self):
+        service = make_service()
+        service._complete = AsyncMock(return_value=llm_response("agent: hello"))
+        storage = FakeStorage({"/a.mp3": ('"v1"', b"audio-a")})
+        url = "https://s3.example/a.mp3"
+
+        self.transcribe(service, storage, url)
+        storage.files["/a.mp3"] = ('"v2"', b"audio-a2")
+        self.transcribe(service, storage, url)
+        with patch("services.qa_analysis_service.OPENROUTER_MODEL", "other/model"):
+            self.transcribe(service, storage, url)
+
+        assert service._complete.await_count == 3
+        # the model change re-transcribed from cached audio without downloading it again
+        assert storage.body_reads == 2
+
+    def test_same_content_at_two_urls_stored_once(self):
+        cache = AudioCache(tempfile.mkdtemp())
+        a = run(cache.put_audio("https://x/a.mp3", '"e"', b"same"))
+        b = run(cache.put_audio("https://y/b.mp3", None, b"same"))
+        assert a == b
+        assert len(os.listdir(os.path.join(cache.root, "entries"))) == 1
+        assert run(cache.lookup("https://x/a.mp3?sig=1")) == ('"e"', a)
+        assert run(cache.lookup("https://y/b.mp3")) == (None, a)
+
+    def test_lru_eviction_keeps_recently_used(self):
+        cache = AudioCache(tempfile.mkdtemp(), max_bytes=600)  # ~230 bytes per entry
+        old = run(cache.put_audio("https://x/1", None, b"1" * 100))
+        mid = run(cache.put_audio("https://x/2", None, b"2" * 100))
+        os.utime(os.path.join(cache.root, "entries", old, "audio"), (1, 1))
+        os.utime(os.path.join(cache.root, "entries", mid, "audio"), (2, 2))
+        run(cache.get_transcript(old, "m"))  # miss: no touch
+        run(cache.put_transcript(old, "m", "t"))
+        run(cache.get_transcript(old, "m"))  # touch: now most recently used
+        run(cache.put_audio("https://x/3", None, b"3" * 100))
+
+        assert run(cache.get_audio(old)) is not None
+        assert run(cache.get_audio(mid)) is None
+        # the evicted recording's url record went with it
+        assert run(cache.lookup("https://x/2")) is None
+        assert run(cache.lookup("https://x/1")) == (None, old)
+
+    def test_size_bound_counts_url_records_and_transcripts(self):
+        root = tempfile.mkdtemp()
+        cache = AudioCache(root, max_bytes=1000)
+        for i in range(20):
+            content_hash = run(cache.put_audio(f"https://x/{i}", None, bytes([i]) * 10))
+            run(cache.put_transcript(content_hash, "m", "x" * 50))
+
+        on_disk = sum(
+            os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files
+        )
+        assert cache._bytes == on_disk <= 1000
+        assert len(os.listdir(os.path.join(root, "urls"))) == len(os.listdir(os.path.join(root, "entries")))
+        # a fresh instance measures the same total
+        assert AudioCache(root, max_bytes=1000)._bytes == on_disk
+
+
+# ---------------------------------------------------------------------------
+# 5. Streaming download
+# ---------------------------------------------------------------------------
+
+class TestStreamingDownload:
+    def transcribe(self, service, storage, url="https://s3.example/a.mp3"):
+        service._http = storage.client()
+        return run(service.transcribe_audio(url))
+
+    def test_audio_is_base64_encoded_across_chunk_boundaries(self):
+        service = make_service()
+        service._complete = AsyncMock(return_value=llm_response("ok"))
+        audio = bytes(range(256)) * 20 + b"xy"  # not a multiple of the chunk or of 3
+        self.transcribe(service, FakeStorage({"/a.mp3": ('"e"', audio)}))
+
+        messages = service._complete.await_args.args[0]
+        sent = messages[0]["content"][0]["input_audio"]["data"]
+        assert sent == base64.b64encode(audio).decode()
+
+    def test_declared_oversize_is_rejected_before_reading_body(self):
+        service = make_service()
+        service._complete = AsyncMock()
+        storage = FakeStorage({"/a.mp3": ('"e"', b"x" * 5000)}, content_length=True)
+
+        with patch("services.qa_analysis_service.MAX_AUDIO_SIZE_MB", 4000 / (1024 * 1024)):
+            assert self.transcribe(service, storage) is None
+        assert storage.chunks_sent == 0
+        service._complete.assert_not_awaited()
+
+    def test_undeclared_oversize_aborts_mid_stream(self):
+        service = make_service()
+        service._complete = AsyncMock()
+        storage = FakeStorage({"/a.mp3": ('"e"', b"x" * 10000)})
+
+        with patch("services.qa_analysis_service.MAX_AUDIO_SIZE_MB", 3000 / (1024 * 1024)):
+            assert self.transcribe(service, storage) is None
+        assert storage.chunks_sent <= 4
+        service._complete.assert_not_awaited()
+        # nothing half-written left in the cache
+        assert os.listdir(os.path.join(service.audio_cache.root, "entries")) == []
+
+
+# ---------------------------------------------------------------------------
+# 6. Multi-call scoring requests
+# ---------------------------------------------------------------------------
+
+def scores_json(value):
+    return {"voiceQuality": value, "latency": value, "conversationQuality": value, "notes": ""}
+
+
+class TestBatchedScoring:
+    def score_all(self, service, ids):
+        async def scenario():
+            return await asyncio.gather(*(
+                service.analyze_call(f"bot: call {i}", None, 60, "ended", call_id=i) for i in ids
+            ))
+        return run(scenario())
+
+    def test_concurrent_calls_share_one_request(self):
+        service = make_service(scoring_batch_size=4)
+        service.db = InMemoryDB()
+        service._complete = AsyncMock(return_value=llm_response(json.dumps(
+            {str(i): scores_json(i) for i in range(1, 5)}
+        )))
+
+        results = self.score_all(service, [1, 2, 3, 4])
+
+        assert [r["voiceQuality"] for r in results] == [1, 2, 3, 4]
+        assert service._complete.await_count == 1
+        prompt = service._complete.await_args.args[0][0]["content"]
+        assert all(f"### Call {i}" in prompt for i in range(1, 5))
+
+    def test_unparseable_calls_fall_back_to_single_requests(self):
+        service = make_service(scoring_batch_size=3)
+        service.db = InMemoryDB()
+        service._complete = AsyncMock(side_effect=[
+            # call 2 missing, call 3 malformed
+            llm_response(json.dumps({"1": scores_json(1), "3": {"voiceQuality": "n/a"}})),
+            llm_response(json.dumps(scores_json(7))),
+            llm_response(json.dumps(scores_json(7))),
+        ])
+
+        results = self.score_all(service, [1, 2, 3])
+
+        assert [r["voiceQuality"] for r in results] == [1, 7, 7]
+        assert service._complete.await_count == 3
+        fallback_prompt = service._complete.await_args_list[1].args[0][0]["content"]
+        assert "### Call" not in fallback_prompt
+
+    def test_token_budget_splits_batches(self):
+        service = make_service(scoring_batch_size=10)
+        service.db = InMemoryDB()
+        sizes = []
+
+        async def fake_complete(messages, timeout, est_tokens):
+            prompt = messages[0]["content"]
+            keys = [k for k in map(str, range(6)) if f"### Call {k}\n" in prompt]
+            sizes.append(len(keys) or 1)
+            if keys:
+                return llm_response(json.dumps({k: scores_json(5) for k in keys}))
+            return llm_response(json.dumps(scores_json(5)))
+
+        service._complete = fake_complete
+        per_call = len(service._call_context("bot: call 0", None, 60, "ended")) // 4 + 150
+        with patch.object(service._score_batcher, "max_tokens", per_call * 2):
+            results = self.score_all(service, range(6))
+
+        assert all(r["voiceQuality"] == 5 for r in results)
+        assert sizes == [2, 2, 2]
+
+    def test_duplicate_labels_get_unique_keys(self):
+        batcher_calls = []
+
+        async def send(items):
+            batcher_calls.append([key for key, _ in items])
+            return {key: key for key, _ in items}
+
+        from services.llm_score_batcher import LLMScoreBatcher
+        batcher = LLMScoreBatcher(send, max_items=3, max_tokens=1000)
+
+        async def scenario():
+            return await asyncio.gather(
+                batcher.submit(1, "a", 1), batcher.submit(1, "b", 1), batcher.submit(None, "c", 1)
+            )
+
+        results = run(scenario())
+        assert len(set(results)) == 3
+        assert batcher_calls == [results]
+
+
+# ---------------------------------------------------------------------------
+# 7. Async LLM client
+# ---------------------------------------------------------------------------
+
+class TestAsyncClient:
+    def test_requests_use_async_client_with_per_request_timeout(self):
+        from services.qa_analysis_service import ANALYSIS_TIMEOUT
+        service = make_service(scoring_batch_size=1)
+        service.db = InMemoryDB()
+        service.openrouter.chat.completions.create = AsyncMock(
+            return_value=llm_response(json.dumps(scores_json(6)))
+        )
+
+        scores = run(service.analyze_call("bot: hi", None, 30, "ended"))
+
+        assert scores["voiceQuality"] == 6
+        assert service.openrouter.chat.completions.create.await_args.kwargs["timeout"] == ANALYSIS_TIMEOUT
+
+    def test_cancelling_a_caller_aborts_its_request_and_frees_the_slot(self):
+        service = make_service(llm_concurrency=1, scoring_batch_size=1)
+        service.db = InMemoryDB()
+        started = asyncio.Event()
+        aborted = []
+
+        async def hang(**kwargs):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                aborted.append(True)
+                raise
+
+        service.openrouter.chat.completions.create = hang
+
+        async def scenario():
+            task = asyncio.ensure_future(service.analyze_call("bot: hi", None, 30, "ended"))
+            await started.wait()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return service._llm_slots.locked()
+
+        assert run(scenario()) is False
+        assert aborted == [True]
+
+    def test_abandoned_batch_cancels_its_request(self):
+        from services.llm_score_batcher import LLMScoreBatcher
+        started = asyncio.Event()
+        aborted = []
+
+        async def send(items):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                aborted.append(len(items))
+                raise
+
+        batcher = LLMScoreBatcher(send, max_items=2, max_tokens=1000)
+
+        async def scenario():
+            waiters = [asyncio.ensure_future(batcher.submit(i, "x", 1)) for i in range(2)]
+            await started.wait()
+            waiters[0].cancel()
+            await asyncio.sleep(0)
+            assert not aborted  # one waiter still wants the result
+            waiters[1].cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        run(scenario())
+        assert aborted == [2]
+
+
+# ---------------------------------------------------------------------------
+# 8. Legacy (IDs only) prefetch
+# ---------------------------------------------------------------------------
+
+class TestLegacyPrefetch:
+    def test_prefetches_in_chunks_in_one_session(self):
+        from services.qa_analysis_service import DEDUPE_CHUNK_SIZE
+        service = make_service()
+        call_ids = list(range(1, DEDUPE_CHUNK_SIZE + 21))
+        missing = {7}
+
+        async def batch_queries(partner, queries):
+            return [
+                [{"id": cid, "tenantId": 1, "messages": '[{"role": "bot", "message": "hi"}]'}
+                 for cid in q["params"] if cid not in missing]
+                for q in queries
+            ]
+
+        service.ssh_service.execute_batch_queries = AsyncMock(side_effect=batch_queries)
+        service.ssh_service.execute_query = AsyncMock()
+
+        calls = run(service.fetch_calls_data(make_partner(), call_ids))
+
+        sessions = service.ssh_service.execute_batch_queries.await_args_list
+        assert len(sessions) == 1 and len(sessions[0].args[1]) == 2
+        service.ssh_service.execute_query.assert_not_awaited()
+        assert sorted(calls) == [cid for cid in call_ids if cid not in missing]
+        assert calls[1]["transcript"] == "bot: hi" and "messages" not in calls[1]
@@ -0,0 +1,248 @@
+"""
+Tests for the persistent QA analysis queue — in-memory Mongo, no LLM or SSH.
+Run with: python -m pytest tests/test_qa_job_queue.py -v
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.in_memory_db import InMemoryDB
+from services.qa_job_queue import QAJobQueue
+from models import PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def make_partner():
+    return PartnerConfig(
+        id="p1",
+        partnerName="Partner",
+        dbHost="localhost",
+        dbName="test",
+        dbUsername="user",
+        dbPassword="pass",
+        sshConfig=SSHConfig(enabled=False),
+    )
+
+
+def make_analysis():
+    analysis = MagicMock()
+
+    async def process(call_data):
+        await asyncio.sleep(0)
+        return {"callId": call_data["id"], "status": "completed", "scores": {"voiceQuality": 7}}
+
+    analysis.process_single_call = AsyncMock(side_effect=process)
+    analysis.flush_batch_save = AsyncMock(return_value=True)
+    analysis.find_scored_call_ids = AsyncMock(return_value=set())
+    analysis.fetch_calls_data = AsyncMock(
+        side_effect=lambda partner, ids: {i: {"id": i, "tenantId": 1, "transcript": "hi"} for i in ids if i != 99}
+    )
+    analysis.send_analysis_summary_email = AsyncMock()
+    return analysis
+
+
+async def make_queue(workers=2):
+    db = InMemoryDB()
+    await db.partner_configs.insert_one(make_partner().model_dump(mode="json"))
+    return db, QAJobQueue(db, make_analysis(), workers=workers)
+
+
+async def wait_for_job(queue, job_id):
+    for _ in range(200):
+        progress = await queue.get_progress(job_id)
+        if progress["status"] == "completed":
+            return progress
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not complete")
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def calls(*ids):
+    return [{"id": i, "tenantId": 1, "transcript": "hi"} for i in ids]
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+class TestQAJobQueue:
+    def test_duplicate_submission_skips_active_calls(self):
+        async def scenario():
+            db, queue = await make_queue()
+            first = await queue.enqueue(make_partner(), [1, 2], calls_data=calls(1, 2))
+            second = await queue.enqueue(make_partner(), [2, 3], calls_data=calls(2, 3))
+            return first, second, await db.qa_job_calls.count_documents({})
+
+        first, second, items = run(scenario())
+        assert (first.total, first.skipped) == (2, 0)
+        assert (second.total, second.skipped) == (1, 1)
+        assert items == 3
+
+    def test_already_scored_calls_need_force(self):
+        async def scenario():
+            db, queue = await make_queue()
+            queue.analysis.find_scored_call_ids = AsyncMock(return_value={1})
+            plain = await queue.enqueue(make_partner(), [1, 2], calls_data=calls(1, 2))
+            forced = await queue.enqueue(make_partner(), [1], calls_data=calls(1), force=True)
+            return plain, forced
+
+        plain, forced = run(scenario())
+        assert (plain.total, plain.alreadyScored) == (1, 1)
+        assert (forced.total, forced.alreadyScored) == (1, 0)
+
+    def test_workers_drain_job_and_send_one_summary(self):
+        async def scenario():
+            db, queue = await make_queue()
+            await queue.start()
+            try:
+                job = await queue.enqueue(make_partner(), [1, 2, 3], "2026-01-01", calls(1, 2, 3))
+                progress = await wait_for_job(queue, job.id)
+            finally:
+                await queue.stop()
+            return db, queue, progress
+
+        db, queue, progress = run(scenario())
+        assert progress["done"] == 3 and progress["percent"] == 100.0
+        assert progress["etaSeconds"] == 0
+        saved = [s["callId"] for c in queue.analysis.flush_batch_save.await_args_list for s in c.args[1]]
+        assert sorted(saved) == [1, 2, 3]
+        queue.analysis.send_analysis_summary_email.assert_awaited_once()
+        results, partner_name, report_date = queue.analysis.send_analysis_summary_email.await_args.args
+        assert sorted(r["callId"] for r in results) == [1, 2, 3]
+        assert (partner_name, report_date) == ("Partner", "2026-01-01")
+
+    def test_start_resumes_interrupted_work(self):
+        async def scenario():
+            db, queue = await make_queue(workers=1)
+            job = await queue.enqueue(make_partner(), [1, 2, 3], calls_data=calls(1, 2, 3))
+            # Simulate a crash an hour ago: one call mid-LLM, one scored but not saved
+            expired = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+            await db.qa_job_calls.update_one(
+                {"callId": 1}, {"$set": {"state": "running", "claim": "dead", "startedAt": expired}}
+            )
+            await db.qa_job_calls.update_one(
+                {"callId": 2},
+                {"$set": {"state": "scored", "claim": "dead", "startedAt": expired, "scores": {"voiceQuality": 9}}},
+            )
+            # Claimed a moment ago by another live process: not ours to take back
+            await db.qa_job_calls.update_one(
+                {"callId": 3},
+                {"$set": {"state": "running", "claim": "alive", "startedAt": datetime.now(timezone.utc).isoformat()}},
+            )
+            await queue.start()
+            await asyncio.sleep(0.05)
+            item = await db.qa_job_calls.find_one({"callId": 3}, {"_id": 0})
+            assert (item["state"], item["claim"]) == ("running", "alive")
+            # The other process finishes call 3
+            await db.qa_job_calls.update_one(
+                {"callId": 3}, {"$set": {"state": "completed", "active": False}}
+            )
+            await queue._finalize_job(job.id)
+            try:
+                progress = await wait_for_job(queue, job.id)
+            finally:
+                await queue.stop()
+            return queue, progress
+
+        queue, progress = run(scenario())
+        assert progress["completed"] == 3
+        # call 2 was saved from its stored scores without another LLM request
+        rescored = [c.args[0]["id"] for c in queue.analysis.process_single_call.await_args_list]
+        assert rescored == [1]
+
+    def test_legacy_job_is_prefetched_and_batch_saved(self):
+        async def scenario():
+            db, queue = await make_queue()
+            await queue.start()
+            try:
+                job = await queue.enqueue(make_partner(), [1, 2, 99], "2026-01-01")
+                progress = await wait_for_job(queue, job.id)
+            finally:
+                await queue.stop()
+            return queue, progress
+
+        queue, progress = run(scenario())
+        assert (progress["completed"], progress["failed"]) == (2, 1)
+        # one prefetch for the job, one retry for the call that was missing
+        fetches = [c.args[1] for c in queue.analysis.fetch_calls_data.await_args_list]
+        assert fetches == [[1, 2, 99], [99]]
+        scored = sorted(c.args[0]["id"] for c in queue.analysis.process_single_call.await_args_list)
+        assert scored == [1, 2]
+        saved = [s["callId"] for c in queue.analysis.flush_batch_save.await_args_list for s in c.args[1]]
+        assert sorted(saved) == [1, 2]
+
+    def test_requeued_call_gets_its_own_row(self):
+        async def scenario():
+            db, queue = await make_queue()
+            await queue.start()
+            try:
+                first = await queue.enqueue(make_partner(), [1, 2], calls_data=calls(1, 2))
+                await wait_for_job(queue, first.id)
+                second = await queue.enqueue(make_partner(), [2], calls_data=calls(2), force=True)
+                await wait_for_job(queue, second.id)
+            finally:
+                await queue.stop()
+            rows = await db.qa_job_calls.find({"jobId": first.id}, {"_id": 0}).to_list(None)
+            return rows, await queue.get_progress(first.id), await queue.get_progress(second.id)
+
+        rows, first, second = run(scenario())
+        assert sorted(r["callId"] for r in rows) == [1, 2]
+        assert (first["completed"], first["total"]) == (2, 2)
+        assert (second["completed"], second["total"]) == (1, 1)
+
+    def test_last_call_failing_still_saves_scored_calls(self):
+        async def scenario():
+            db, queue = await make_queue(workers=2)
+
+            async def process(call_data):
+                if call_data["id"] == 2:
+                    # Fails after call 1 is already scored and buffered
+                    await asyncio.sleep(0.05)
+                    return {"callId": 2, "status": "failed", "error": "LLM down"}
+                return {"callId": call_data["id"], "status": "completed", "scores": {"voiceQuality": 7}}
+
+            queue.analysis.process_single_call = AsyncMock(side_effect=process)
+            await queue.start()
+            try:
+                job = await queue.enqueue(make_partner(), [1, 2], calls_data=calls(1, 2))
+                progress = await wait_for_job(queue, job.id)
+            finally:
+                await queue.stop()
+            return queue, progress
+
+        queue, progress = run(scenario())
+        assert (progress["completed"], progress["failed"]) == (1, 1)
+        saved = [s["callId"] for c in queue.analysis.flush_batch_save.await_args_list for s in c.args[1]]
+        assert saved == [1]
+        queue.analysis.send_analysis_summary_email.assert_awaited_once()
+
+    def test_failed_save_leaves_calls_scored(self):
+        async def scenario():
+            db, queue = await make_queue(workers=1)
+            queue.analysis.flush_batch_save = AsyncMock(return_value=False)
+            await queue.start()
+            try:
+                job = await queue.enqueue(make_partner(), [1, 2], calls_data=calls(1, 2))
+                for _ in range(100):
+                    if queue.analysis.flush_batch_save.await_count:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                await queue.stop()
+            items = await db.qa_job_calls.find({}, {"_id": 0, "state": 1}).to_list(None)
+            return await queue.get_progress(job.id), items
+
+        progress, items = run(scenario())
+        assert [i["state"] for i in items] == ["scored", "scored"]
+        assert progress["status"] != "completed"
+        assert progress["counts"] == {"scored": 2} and progress["done"] == 0
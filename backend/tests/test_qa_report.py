@@ -0,0 +1,174 @@
+"""
+Unit tests for QA report files — building in each compression format and the
+S3 link fallback for oversized reports.
+Run with: python -m pytest tests/test_qa_report.py -v
+"""
+import asyncio
+import csv
+import gzip
+import io
+import zipfile
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from services.email_outbox import EmailOutbox
+from services.email_service import EmailService
+from services.in_memory_db import InMemoryDB
+from services.qa_report import REPORT_HEADER, build_qa_report, upload_qa_report
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def make_calls(n):
+    return [
+        {
+            "id": i,
+            "contactFirstName": "Ana",
+            "contactLastName": "Diaz",
+            "campaignName": "Drivers",
+            "duration": 125,
+            "qaAnalysis": {"aiVoiceQuality": 7, "aiLatency": 8, "aiNotes": "said \"hi\", then, left"},
+        }
+        for i in range(n)
+    ]
+
+
+def read_rows(filename, report):
+    data = report.read()
+    if filename.endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            (name,) = archive.namelist()
+            assert name == "report.csv"
+            data = archive.read(name)
+    elif filename.endswith(".gz"):
+        data = gzip.decompress(data)
+    return list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# 1. Building
+# ---------------------------------------------------------------------------
+
+class TestBuildReport:
+    @pytest.mark.parametrize("compression,extension", [("none", ".csv"), ("gzip", ".csv.gz"), ("zip", ".zip")])
+    def test_round_trip(self, compression, extension):
+        filename, report, _, size = build_qa_report(make_calls(3), "report", compression)
+        try:
+            assert filename == f"report{extension}"
+            rows = read_rows(filename, report)
+            assert report.tell() == size
+        finally:
+            report.close()
+        assert rows[0] == REPORT_HEADER
+        assert len(rows) == 4
+        assert rows[1][:5] == ["0", "Ana Diaz", "", "Drivers", "2:05"]
+        assert rows[1][-1] == 'said "hi", then, left'
+
+    def test_compression_shrinks_large_reports(self):
+        calls = make_calls(2000)
+        sizes = {}
+        for compression in ("none", "zip"):
+            _, report, _, sizes[compression] = build_qa_report(calls, "report", compression)
+            report.close()
+        assert sizes["zip"] * 5 < sizes["none"]
+
+
+# ---------------------------------------------------------------------------
+# 2. Email delivery
+# ---------------------------------------------------------------------------
+
+class TestReportEmail:
+    def _send(self, upload_result, limit, sent=True):
+        service = EmailService()
+        service._deliver = AsyncMock(return_value=True)
+        upload = AsyncMock(return_value=upload_result)
+        with patch("services.email_service.MAX_ATTACHMENT_BYTES", limit), \
+                patch("services.email_service.upload_qa_report", upload):
+            result = run(service.send_qa_report_email(make_calls(50), "2026-03-02", ["a@x.com"], "Acme Co"))
+        assert result is sent
+        return service._deliver.call_args, upload
+
+    def test_small_report_is_attached(self):
+        call, upload = self._send("https://unused", limit=10 * 1024 * 1024)
+        upload.assert_not_called()
+        (filename, content, mime_type), = call.kwargs["attachments"]
+        assert filename == "qa_report_acme_co_2026-03-02.csv"
+        assert mime_type == "text/csv"
+        assert read_rows(filename, io.BytesIO(content))[0] == REPORT_HEADER
+
+    def test_oversized_report_is_linked(self):
+        call, upload = self._send("https://bucket/qa-reports/r.zip?sig", limit=10)
+        upload.assert_called_once()
+        assert upload.call_args.args[3] == "qa_report_acme_co_2026-03-02.csv"
+        assert call.kwargs["attachments"] is None
+        assert "https://bucket/qa-reports/r.zip?sig" in call.args[2]
+        assert "https://bucket/qa-reports/r.zip?sig" in call.args[3]
+
+    def test_oversized_report_zipped_when_upload_unavailable(self):
+        _, report, _, zip_size = build_qa_report(make_calls(50), "qa_report_acme_co_2026-03-02", "zip")
+        report.close()
+        call, upload = self._send(None, limit=zip_size)
+        upload.assert_called_once()
+        (filename, content, mime_type), = call.kwargs["attachments"]
+        assert filename == "qa_report_acme_co_2026-03-02.zip"
+        assert mime_type == "application/zip"
+        assert len(content) == zip_size
+
+    def test_report_too_large_to_attach_is_not_sent(self):
+        call, upload = self._send(None, limit=10, sent=False)
+        upload.assert_called_once()
+        assert call is None
+
+    def test_outbox_reads_report_into_message(self):
+        async def scenario():
+            db = InMemoryDB()
+            service = EmailService()
+            service.outbox = EmailOutbox(db, service)
+            assert await service.send_qa_report_email(make_calls(5), "2026-03-02", ["a@x.com"], "Acme Co")
+            return await db.email_outbox.find_one({}, {"_id": 0})
+
+        with patch("services.email_service.MAX_ATTACHMENT_BYTES", 10 * 1024 * 1024):
+            doc = run(scenario())
+        (attachment,) = doc["attachments"]
+        assert attachment["filename"] == "qa_report_acme_co_2026-03-02.csv"
+        assert len(read_rows(attachment["filename"], io.BytesIO(attachment["content"]))) == 6
+
+
+# ---------------------------------------------------------------------------
+# 3. Upload
+# ---------------------------------------------------------------------------
+
+class TestReportUpload:
+    def test_upload_goes_through_s3_service(self):
+        s3_service = MagicMock()
+        s3_service.upload_fileobj = AsyncMock(return_value={"presignedUrl": "https://r?sig"})
+        config = {"enabled": True, "bucket": "reports"}
+        fileobj = io.BytesIO(b"abc")
+        fileobj.read()
+        with patch("services.qa_report.REPORT_S3_ENDPOINT", "https://eu-central-1.linodeobjects.com"):
+            url = run(upload_qa_report(s3_service, config, fileobj, "r.csv", "text/csv"))
+
+        assert url == "https://r?sig"
+        assert fileobj.tell() == 0
+        args, kwargs = s3_service.upload_fileobj.call_args
+        assert args == (config, fileobj, "qa-reports/r.csv", "text/csv")
+        assert kwargs["endpoint_url"] == "https://eu-central-1.linodeobjects.com"
+        assert kwargs["decrypted"] is True
+
+    def test_no_link_without_bucket_or_on_error(self):
+        s3_service = MagicMock()
+        s3_service.upload_fileobj = AsyncMock(return_value={"error": "S3 client error: denied"})
+        assert run(upload_qa_report(s3_service, {"enabled": False}, io.BytesIO(), "r.csv", "text/csv")) is None
+        s3_service.upload_fileobj.assert_not_called()
+        assert run(upload_qa_report(s3_service, {"enabled": True}, io.BytesIO(), "r.csv", "text/csv")) is None
@@ -0,0 +1,163 @@
+"""
+Unit tests for QAService call listing — the partner DB is an in-memory SQLite
+stand-in, so the generated SQL (filters, keyset conditions) really runs.
+Run with: python -m pytest tests/test_qa_service.py -v
+"""
+import asyncio
+import json
+import sqlite3
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from services.qa_service import QAService, decode_qa_cursor, encode_qa_cursor
+from models import PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE calls (
+    id INTEGER PRIMARY KEY, tenantId INTEGER, duration INTEGER, status TEXT, endReason TEXT,
+    recordingUrl TEXT, messages TEXT, summary TEXT, createdAt TEXT, vmBeepAt TEXT,
+    campaignId INTEGER, contactId INTEGER
+);
+CREATE TABLE campaigns (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE contacts (id INTEGER PRIMARY KEY, firstName TEXT, lastName TEXT, phone TEXT);
+CREATE TABLE qa_analysis (
+    callId INTEGER PRIMARY KEY, aiVoiceQuality INTEGER, aiLatency INTEGER,
+    aiConversationQuality INTEGER, aiNotes TEXT, humanVoiceQuality INTEGER,
+    humanLatency INTEGER, humanConversationQuality INTEGER, humanNotes TEXT
+);
+"""
+
+
+class FakePartnerDB:
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.conn.execute("INSERT INTO campaigns VALUES (1, 'Drivers'), (2, 'Nurses')")
+        self.queries = []
+
+    def add_call(self, call_id, created_at, duration=300, campaign_id=1, score=None):
+        messages = json.dumps([{"role": "bot", "message": f"hello {call_id}"}])
+        self.conn.execute(
+            "INSERT INTO calls (id, tenantId, duration, messages, createdAt, campaignId) VALUES (?, 1, ?, ?, ?, ?)",
+            (call_id, duration, messages, created_at, campaign_id),
+        )
+        if score is not None:
+            self.conn.execute(
+                "INSERT INTO qa_analysis (callId, aiVoiceQuality, aiLatency, aiConversationQuality) VALUES (?, ?, 9, 9)",
+                (call_id, score),
+            )
+
+    async def execute_query(self, partner, query, params=None):
+        self.queries.append(query)
+        rows = self.conn.execute(query.replace("%s", "?"), params or ()).fetchall()
+        return [dict(row) for row in rows]
+
+
+def make_partner():
+    return PartnerConfig(
+        id="p1",
+        partnerName="Partner",
+        dbHost="localhost",
+        dbName="test",
+        dbUsername="user",
+        dbPassword="pass",
+        sshConfig=SSHConfig(enabled=False),
+    )
+
+
+def make_service(db):
+    ssh = MagicMock()
+    ssh.execute_query = db.execute_query
+    return QAService(ssh)
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+class TestGetQACalls:
+    def test_pages_walk_all_calls_in_order_without_gaps(self):
+        db = FakePartnerDB()
+        # two calls share a timestamp: the id tie-break keeps them on distinct pages
+        db.add_call(1, "2026-03-02 09:00:00")
+        db.add_call(2, "2026-03-02 10:00:00")
+        db.add_call(3, "2026-03-02 10:00:00")
+        db.add_call(4, "2026-03-02 11:00:00")
+        db.add_call(5, "2026-03-02 12:00:00")
+        db.add_call(6, "2026-03-03 00:00:00")  # next day
+        service = make_service(db)
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = run(service.get_qa_calls(make_partner(), "2026-03-02", limit=2, cursor=cursor))
+            seen += [c.id for c in page.calls]
+            pages += 1
+            cursor = page.nextCursor
+            if not cursor:
+                break
+
+        assert seen == [5, 4, 3, 2, 1]
+        assert pages == 3
+
+    def test_unpaged_call_returns_everything_with_transcripts(self):
+        db = FakePartnerDB()
+        db.add_call(1, "2026-03-02 09:00:00")
+        db.add_call(2, "2026-03-02 10:00:00")
+
+        page = run(make_service(db).get_qa_calls(make_partner(), "2026-03-02"))
+
+        assert [c.id for c in page.calls] == [2, 1]
+        assert page.calls[0].transcript == "bot: hello 2"
+        assert page.nextCursor is None
+
+    def test_list_mode_does_not_select_messages(self):
+        db = FakePartnerDB()
+        db.add_call(1, "2026-03-02 09:00:00")
+
+        page = run(make_service(db).get_qa_calls(make_partner(), "2026-03-02", include_transcript=False))
+
+        assert page.calls[0].transcript is None
+        assert "messages" not in db.queries[-1]
+
+    def test_duration_campaign_and_score_filters(self):
+        db = FakePartnerDB()
+        db.add_call(1, "2026-03-02 09:00:00", duration=60)  # under minMinutes
+        db.add_call(2, "2026-03-02 09:01:00", duration=900)
+        db.add_call(3, "2026-03-02 09:02:00", campaign_id=2)
+        db.add_call(4, "2026-03-02 09:03:00", score=3)
+        db.add_call(5, "2026-03-02 09:04:00", score=8)
+        db.add_call(6, "2026-03-02 09:05:00")
+        service = make_service(db)
+
+        def ids(**filters):
+            return [c.id for c in run(service.get_qa_calls(make_partner(), "2026-03-02", **filters)).calls]
+
+        assert ids() == [6, 5, 4, 3, 2]
+        assert ids(max_minutes=10) == [6, 5, 4, 3]
+        assert ids(campaign_id=2) == [3]
+        assert ids(max_score=5) == [4]
+
+    def test_bad_cursor_or_date_is_a_value_error(self):
+        service = make_service(FakePartnerDB())
+        with pytest.raises(ValueError):
+            run(service.get_qa_calls(make_partner(), "2026-03-02", cursor="not-a-cursor"))
+        with pytest.raises(ValueError):
+            run(service.get_qa_calls(make_partner(), "03/02/2026"))
+
+    def test_cursor_round_trip(self):
+        assert decode_qa_cursor(encode_qa_cursor("2026-03-02 10:00:00", 42)) == ("2026-03-02 10:00:00", 42)
@@ -0,0 +1,142 @@
+"""
+Unit tests for S3Service client and presigned URL caching — presigning is
+local, so no network or real credentials are needed.
+Run with: python -m pytest tests/test_s3_service.py -v
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.s3_service import S3Service
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+PRIVATE_URL = "https://us-east-1.linodeobjects.com/recordings/2026/call-1.mp3"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_service(clock=None):
+    encryption = MagicMock()
+    encryption.decrypt = MagicMock(side_effect=lambda value: value.replace("enc:", ""))
+    return S3Service(encryption, clock=clock or FakeClock())
+
+
+def s3_config(access="enc:AKIAEXAMPLE", secret="enc:secret"):
+    return {"enabled": True, "accessKeyId": access, "secretAccessKey": secret, "region": "us-east-1"}
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+class TestS3Caching:
+    def test_client_built_once_per_credentials(self):
+        service = make_service()
+        config = s3_config()
+
+        first = run(service.get_playable_url(config, PRIVATE_URL))
+        second = run(service.get_playable_url(config, PRIVATE_URL.replace("call-1", "call-2")))
+
+        assert "presignedUrl" in first and "presignedUrl" in second
+        assert service.encryption_service.decrypt.call_count == 2  # key + secret, once
+        assert len(service._clients) == 1
+
+    def test_changed_credentials_get_a_new_client(self):
+        service = make_service()
+        run(service.get_playable_url(s3_config(), PRIVATE_URL))
+        run(service.get_playable_url(s3_config(secret="enc:rotated"), PRIVATE_URL))
+        assert len(service._clients) == 2
+
+    def test_presigned_url_reused_until_close_to_expiry(self):
+        clock = FakeClock()
+        service = make_service(clock)
+        config = s3_config()
+
+        with patch("services.s3_service.PRESIGNED_URL_MIN_REMAINING_SECONDS", 900):
+            first = run(service.get_playable_url(config, PRIVATE_URL))["presignedUrl"]
+            clock.now += 3600 - 901
+            reused = run(service.get_playable_url(config, PRIVATE_URL))["presignedUrl"]
+            clock.now += 2
+            client = next(iter(service._clients.values()))
+            with patch.object(client, "generate_presigned_url", return_value="https://fresh") as sign:
+                fresh = run(service.get_playable_url(config, PRIVATE_URL))["presignedUrl"]
+
+        assert reused == first
+        assert fresh == "https://fresh"
+        sign.assert_called_once()
+
+    def test_missing_credentials_are_not_cached(self):
+        service = make_service()
+        result = run(service.get_playable_url(s3_config(access=""), PRIVATE_URL))
+        assert "error" in result
+        assert not service._clients
+
+    def test_public_url_needs_no_client(self):
+        service = make_service()
+        url = "https://bucket.s3.us-east-1.amazonaws.com/call.wav"
+        result = run(service.get_playable_url(s3_config(), url))
+        assert result == {"presignedUrl": url, "contentType": "audio/wav"}
+        service.encryption_service.decrypt.assert_not_called()
+
+
+class TestS3Upload:
+    def test_upload_uses_configured_bucket_and_cached_client(self):
+        service = make_service()
+        config = dict(s3_config(), bucket="reports")
+
+        with patch("boto3.session.Session.client") as make_client:
+            client = make_client.return_value
+            client.generate_presigned_url.return_value = "https://reports/r.csv?sig"
+            fileobj = MagicMock()
+            result = run(service.upload_fileobj(
+                config, fileobj, "qa-reports/r.csv", "text/csv",
+                endpoint_url="https://eu-central-1.linodeobjects.com", expiry=600,
+            ))
+            again = run(service.upload_fileobj(
+                config, fileobj, "qa-reports/r.csv", "text/csv",
+                endpoint_url="https://eu-central-1.linodeobjects.com", expiry=600,
+            ))
+
+        assert result == {"presignedUrl": "https://reports/r.csv?sig", "contentType": "text/csv"}
+        assert again == result
+        make_client.assert_called_once()
+        assert make_client.call_args.kwargs["endpoint_url"] == "https://eu-central-1.linodeobjects.com"
+        assert make_client.call_args.kwargs["aws_access_key_id"] == "AKIAEXAMPLE"
+        client.upload_fileobj.assert_called_with(
+            fileobj, "reports", "qa-reports/r.csv", ExtraArgs={"ContentType": "text/csv"}
+        )
+
+    def test_upload_with_plain_credentials_skips_decryption(self):
+        service = make_service()
+        config = dict(s3_config(access="AKIAPLAIN", secret="plain"), bucket="reports")
+
+        with patch("boto3.session.Session.client") as make_client:
+            make_client.return_value.generate_presigned_url.return_value = "https://reports/r.csv?sig"
+            result = run(service.upload_fileobj(config, MagicMock(), "r.csv", "text/csv", decrypted=True))
+
+        assert "presignedUrl" in result
+        service.encryption_service.decrypt.assert_not_called()
+        assert make_client.call_args.kwargs["aws_access_key_id"] == "AKIAPLAIN"
+
+    def test_upload_without_bucket_is_an_error(self):
+        service = make_service()
+        result = run(service.upload_fileobj(s3_config(), MagicMock(), "k", "text/csv"))
+        assert "error" in result
+        assert not service._clients
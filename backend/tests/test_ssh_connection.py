@@ -0,0 +1,167 @@
+"""
+Unit tests for SSHConnectionService transactional helpers — no real DB or SSH required.
+The partner connection is replaced by an in-memory fake.
+Run with: python -m pytest tests/test_ssh_connection.py -v
+"""
+import asyncio
+import threading
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ssh_connection import SSHConnectionService
+from models import PartnerConfig, SSHConfig
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._row = None
+
+    def execute(self, query, params=None):
+        self.conn.statements.append(query.split()[0].upper())
+        if query.startswith("SELECT"):
+            self._name = params[0]
+            value = self.conn.settings.get(params[0])
+            self._row = (value,) if value is not None else None
+        elif query.startswith("UPDATE"):
+            self.conn.pending[params[1]] = str(params[0])
+        elif query.startswith("INSERT") and self.conn.fail_audit:
+            raise Exception("Unknown column 'userid'")
+
+    def fetchone(self):
+        return self._row
+
+    def fetchall(self):
+        self.conn.threads.add(threading.get_ident())
+        return [{"value": self.conn.settings.get(self._name)}]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, settings, fail_audit=False):
+        self.settings = dict(settings)
+        self.pending = {}
+        self.fail_audit = fail_audit
+        self.statements = []
+        self.commits = 0
+        self.threads = set()
+
+    def begin(self):
+        self.pending = {}
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.settings.update(self.pending)
+        self.commits += 1
+
+    def rollback(self):
+        self.pending = {}
+
+
+def make_service(conn):
+    service = SSHConnectionService(MagicMock(), MagicMock())
+    service.connections_opened = 0
+
+    @contextmanager
+    def fake_connect(partner, cursorclass=None):
+        service.connections_opened += 1
+        yield conn
+
+    service._connect = fake_connect
+    return service
+
+
+def make_partner():
+    return PartnerConfig(
+        id="p1",
+        partnerName="Partner",
+        dbHost="localhost",
+        dbName="test",
+        dbUsername="user",
+        dbPassword="pass",
+        sshConfig=SSHConfig(enabled=False),
+    )
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ---------------------------------------------------------------------------
+# update_setting_with_audit
+# ---------------------------------------------------------------------------
+
+class TestUpdateSettingWithAudit:
+    def test_update_and_audit_in_one_connection_and_transaction(self):
+        conn = FakeConnection({"callConcurrency": "10"})
+        service = make_service(conn)
+
+        result = run(service.update_setting_with_audit(make_partner(), "callConcurrency", 25))
+
+        assert result == {"exists": True, "oldValue": "10", "updated": True, "auditError": None}
+        assert conn.settings["callConcurrency"] == "25"
+        assert service.connections_opened == 1
+        assert conn.commits == 1
+        assert conn.statements == ["SELECT", "UPDATE", "SAVEPOINT", "INSERT"]
+
+    def test_unchanged_value_skips_update(self):
+        conn = FakeConnection({"callConcurrency": "25"})
+        service = make_service(conn)
+
+        result = run(service.update_setting_with_audit(make_partner(), "callConcurrency", 25))
+
+        assert result["exists"] and not result["updated"]
+        assert conn.statements == ["SELECT"]
+        assert conn.commits == 0
+
+    def test_missing_setting_reports_not_exists(self):
+        conn = FakeConnection({})
+        service = make_service(conn)
+
+        result = run(service.update_setting_with_audit(make_partner(), "callConcurrency", 25))
+
+        assert result["exists"] is False
+        assert "callConcurrency" not in conn.settings
+
+    def test_audit_failure_keeps_setting_change(self):
+        conn = FakeConnection({"callConcurrency": "10"}, fail_audit=True)
+        service = make_service(conn)
+
+        result = run(service.update_setting_with_audit(make_partner(), "callConcurrency", 25))
+
+        assert result["updated"] is True
+        assert "userid" in result["auditError"]
+        assert conn.settings["callConcurrency"] == "25"
+        assert conn.statements[-1] == "ROLLBACK"
+
+
+# ---------------------------------------------------------------------------
+# execute_batch_queries
+# ---------------------------------------------------------------------------
+
+class TestBatchQueries:
+    def test_batch_runs_in_one_connection_off_the_event_loop(self):
+        conn = FakeConnection({"a": "1", "b": "2"})
+        service = make_service(conn)
+        queries = [
+            {"query": "SELECT value FROM settings WHERE name = %s", "params": (name,)}
+            for name in ("a", "b")
+        ]
+
+        results = run(service.execute_batch_queries(make_partner(), queries))
+
+        assert results == [[{"value": "1"}], [{"value": "2"}]]
+        assert service.connections_opened == 1
+        assert threading.get_ident() not in conn.threads